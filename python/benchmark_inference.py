@@ -0,0 +1,312 @@
+"""
+Per-call latency of TrajectoryPredictor inference modes
+"""
+import argparse
+import time
+import numpy as np
+import torch
+from typing import Dict, List
+from ml_model import TrajectoryPredictor
+
+
+def synthetic_states(num_steps: int, dt: float = 0.1, seed: int = 0) -> List[dict]:
+    """Smooth random-walk states for driving the predictor"""
+    rng = np.random.default_rng(seed)
+    acc = rng.normal(0.0, 0.5, size=(num_steps, 3)).cumsum(axis=0) * 0.05
+    vel = acc.cumsum(axis=0) * dt
+    pos = vel.cumsum(axis=0) * dt
+    return [{'position': pos[i], 'velocity': vel[i], 'acceleration': acc[i]}
+            for i in range(num_steps)]
+
+
+def _latency_stats(seconds: List[float]) -> Dict[str, float]:
+    micros = np.asarray(seconds) * 1e6
+    return {
+        'mean_us': float(micros.mean()),
+        'p50_us': float(np.percentile(micros, 50)),
+        'p99_us': float(np.percentile(micros, 99))
+    }
+
+
+def benchmark_streaming(predictor: TrajectoryPredictor, num_steps: int = 2000,
+                        warmup_steps: int = 50) -> Dict[str, Dict[str, float]]:
+    """
+    Compare predict() over the full window with streaming predict_step()
+
+    Both modes see the same 10 Hz state sequence. Also reports the largest
+    position difference between the two, i.e. the drift the streaming state
+    accumulates between re-syncs.
+
+    Args:
+        predictor: Predictor to benchmark
+        num_steps: Timed calls per mode
+        warmup_steps: Untimed calls before measuring
+
+    Returns:
+        Latency statistics per mode, plus the streaming drift
+    """
+    states = synthetic_states(warmup_steps + num_steps)
+    target = np.array([20.1, -10.3, 8.7])
+    window = predictor.sequence_length
+
+    full_times, full_positions = [], []
+    for i, state in enumerate(states):
+        history = states[max(0, i + 1 - window):i + 1]
+        start = time.perf_counter()
+        prediction = predictor.predict(history, target)
+        if i >= warmup_steps:
+            full_times.append(time.perf_counter() - start)
+            full_positions.append(prediction['position'])
+
+    predictor.reset_stream()
+    stream_times, stream_positions = [], []
+    for i, state in enumerate(states):
+        start = time.perf_counter()
+        prediction = predictor.predict_step(state, target)
+        if i >= warmup_steps:
+            stream_times.append(time.perf_counter() - start)
+            stream_positions.append(prediction['position'])
+
+    drift = np.abs(np.array(full_positions) - np.array(stream_positions)).max()
+    return {
+        'full_window': _latency_stats(full_times),
+        'streaming': _latency_stats(stream_times),
+        'max_position_drift': float(drift)
+    }
+
+
+def benchmark_input_preparation(predictor: TrajectoryPredictor, num_steps: int = 5000,
+                                warmup_steps: int = 50) -> Dict[str, Dict[str, float]]:
+    """
+    Compare building the model input from a history list with the ring buffer
+
+    Args:
+        predictor: Predictor to benchmark
+        num_steps: Timed calls per mode
+        warmup_steps: Untimed calls before measuring
+
+    Returns:
+        Latency statistics per mode
+    """
+    states = synthetic_states(warmup_steps + num_steps)
+    target = np.array([20.1, -10.3, 8.7])
+    window = predictor.sequence_length
+
+    list_times = []
+    for i in range(len(states)):
+        history = states[max(0, i + 1 - window):i + 1]
+        start = time.perf_counter()
+        predictor.prepare_input(history, target)
+        if i >= warmup_steps:
+            list_times.append(time.perf_counter() - start)
+
+    predictor.history.clear()
+    buffer_times = []
+    for i, state in enumerate(states):
+        start = time.perf_counter()
+        predictor.push_state(state)
+        predictor.latest_input(target)
+        if i >= warmup_steps:
+            buffer_times.append(time.perf_counter() - start)
+
+    return {
+        'prepare_input': _latency_stats(list_times),
+        'ring_buffer': _latency_stats(buffer_times)
+    }
+
+
+def benchmark_batch_throughput(predictor: TrajectoryPredictor,
+                               batch_sizes: List[int] = (1, 4, 16, 64, 256, 1024),
+                               repeats: int = 20) -> List[Dict[str, float]]:
+    """
+    Throughput of predict_batch() over the number of drones
+
+    Args:
+        predictor: Predictor to benchmark
+        batch_sizes: Numbers of drones per call
+        repeats: Timed calls per batch size
+
+    Returns:
+        One row per batch size with latency, predictions per second and the
+        speedup over calling predict() once per drone
+    """
+    rng = np.random.default_rng(0)
+    window = predictor.sequence_length
+    states = synthetic_states(window)
+    target = np.array([20.1, -10.3, 8.7])
+
+    # Serial baseline: one predict() per drone
+    for _ in range(10):
+        predictor.predict(states, target)
+    start = time.perf_counter()
+    for _ in range(repeats * 5):
+        predictor.predict(states, target)
+    serial_seconds = (time.perf_counter() - start) / (repeats * 5)
+
+    rows = []
+    for batch_size in batch_sizes:
+        histories = rng.normal(0.0, 5.0, size=(batch_size, window, 9)).astype(np.float32)
+        targets = rng.uniform(-20.0, 20.0, size=(batch_size, 3)).astype(np.float32)
+        predictor.predict_batch(histories, targets)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            predictor.predict_batch(histories, targets)
+        seconds = (time.perf_counter() - start) / repeats
+        rows.append({
+            'batch_size': batch_size,
+            'latency_ms': seconds * 1e3,
+            'predictions_per_second': batch_size / seconds,
+            'speedup_vs_serial': batch_size * serial_seconds / seconds
+        })
+    return rows
+
+
+def benchmark_rollout(predictor: TrajectoryPredictor, horizon: int = 50,
+                      batch_sizes: List[int] = (1, 16, 64), repeats: int = 5) -> List[Dict[str, float]]:
+    """
+    Time rollout() against a Python loop of predict() calls
+
+    The loop baseline appends each prediction to the history and calls
+    predict() again, which is what a 5 s look-ahead took before rollout().
+
+    Args:
+        predictor: Predictor to benchmark
+        horizon: Predicted steps per drone
+        batch_sizes: Numbers of drones per rollout
+        repeats: Timed calls per batch size
+
+    Returns:
+        One row per batch size with rollout latency and the speedup over
+        looping predict() for every drone
+    """
+    states = synthetic_states(predictor.sequence_length)
+    route = np.array([[20.0, -10.0, 8.0], [0.0, 15.0, 5.0]], dtype=np.float32)
+
+    predictor.predict(states, route[0])
+    start = time.perf_counter()
+    history = list(states)
+    for _ in range(horizon):
+        prediction = predictor.predict(history, route[0])
+        history.append({'position': prediction['position'], 'velocity': prediction['velocity'],
+                        'acceleration': np.zeros(3)})
+    loop_seconds = time.perf_counter() - start
+
+    rows = []
+    for batch_size in batch_sizes:
+        histories = [states] * batch_size
+        waypoints = np.repeat(route[None], batch_size, axis=0)
+        predictor.rollout(histories, waypoints, horizon)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            predictor.rollout(histories, waypoints, horizon)
+        seconds = (time.perf_counter() - start) / repeats
+        rows.append({
+            'batch_size': batch_size,
+            'horizon': horizon,
+            'latency_ms': seconds * 1e3,
+            'speedup_vs_predict_loop': batch_size * loop_seconds / seconds
+        })
+    return rows
+
+
+def benchmark_backends(predictors: Dict[str, TrajectoryPredictor], num_steps: int = 2000,
+                       batch_size: int = 64) -> Dict[str, Dict[str, Dict[str, float]]]:
+    """
+    Compare inference backends on single-drone and batched prediction
+
+    Args:
+        predictors: Predictors by backend name, loaded from the same model
+        num_steps: Timed calls per backend and mode
+        batch_size: Drones per predict_batch call
+
+    Returns:
+        Latency statistics per backend and mode
+    """
+    states = synthetic_states(num_steps)
+    window = next(iter(predictors.values())).sequence_length
+    target = np.array([20.1, -10.3, 8.7])
+    histories = np.random.default_rng(0).normal(0.0, 5.0, size=(batch_size, window, 9))
+    targets = np.repeat(target[None], batch_size, axis=0)
+
+    results = {}
+    for name, predictor in predictors.items():
+        single, batched = [], []
+        for i in range(window, num_steps):
+            start = time.perf_counter()
+            predictor.predict(states[i - window:i], target)
+            single.append(time.perf_counter() - start)
+        for _ in range(max(1, num_steps // 20)):
+            start = time.perf_counter()
+            predictor.predict_batch(histories, targets)
+            batched.append(time.perf_counter() - start)
+        results[name] = {
+            'predict': _latency_stats(single),
+            f'predict_batch_{batch_size}': _latency_stats(batched)
+        }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark TrajectoryPredictor inference latency')
+    parser.add_argument('--model_path', type=str, default=None,
+                       help='Checkpoint to load (default: untrained weights)')
+    parser.add_argument('--num_steps', type=int, default=2000,
+                       help='Timed calls per mode')
+    parser.add_argument('--resync_interval', type=int, default=None,
+                       help='Streaming steps between full-window re-syncs')
+    parser.add_argument('--num_threads', type=int, default=1,
+                       help='PyTorch intra-op threads')
+    parser.add_argument('--onnx_path', type=str, default=None,
+                       help='Exported model to compare with the PyTorch backend '
+                            '(export --model_path first)')
+    parser.add_argument('--horizon', type=int, default=50,
+                       help='Rollout horizon in steps')
+    parser.add_argument('--batch_sizes', type=int, nargs='+', default=[1, 4, 16, 64, 256, 1024],
+                       help='Drones per predict_batch call')
+
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.num_threads)
+    predictor = TrajectoryPredictor(args.model_path, device='cpu',
+                                    resync_interval=args.resync_interval)
+    results = benchmark_streaming(predictor, args.num_steps)
+
+    print(f"Sequence length {predictor.sequence_length}, "
+          f"re-sync every {predictor.resync_interval} steps, {args.num_threads} thread(s)")
+    print("Inference")
+    for mode in ('full_window', 'streaming'):
+        stats = results[mode]
+        print(f"  {mode:<12} mean {stats['mean_us']:8.1f} us  "
+              f"p50 {stats['p50_us']:8.1f} us  p99 {stats['p99_us']:8.1f} us")
+    speedup = results['full_window']['mean_us'] / results['streaming']['mean_us']
+    print(f"  Streaming speedup: {speedup:.2f}x")
+    print(f"  Max position drift vs full window: {results['max_position_drift']:.4f} m")
+
+    print("Input preparation")
+    results = benchmark_input_preparation(predictor, args.num_steps)
+    for mode in ('prepare_input', 'ring_buffer'):
+        stats = results[mode]
+        print(f"  {mode:<13} mean {stats['mean_us']:8.1f} us  "
+              f"p50 {stats['p50_us']:8.1f} us  p99 {stats['p99_us']:8.1f} us")
+
+    print("Batched inference (predict_batch)")
+    print(f"  {'drones':>7} {'latency ms':>11} {'predictions/s':>14} {'vs serial':>10}")
+    for row in benchmark_batch_throughput(predictor, args.batch_sizes):
+        print(f"  {row['batch_size']:>7} {row['latency_ms']:>11.2f} "
+              f"{row['predictions_per_second']:>14.0f} {row['speedup_vs_serial']:>9.1f}x")
+
+    print(f"Rollout (horizon {args.horizon})")
+    print(f"  {'drones':>7} {'latency ms':>11} {'vs predict loop':>16}")
+    for row in benchmark_rollout(predictor, args.horizon):
+        print(f"  {row['batch_size']:>7} {row['latency_ms']:>11.2f} "
+              f"{row['speedup_vs_predict_loop']:>15.1f}x")
+
+    if args.onnx_path:
+        print("Backends")
+        onnx_predictor = TrajectoryPredictor(args.onnx_path, backend='onnx',
+                                             num_threads=args.num_threads)
+        results = benchmark_backends({'torch': predictor, 'onnx': onnx_predictor}, args.num_steps)
+        for name, modes in results.items():
+            for mode, stats in modes.items():
+                print(f"  {name:<6} {mode:<17} mean {stats['mean_us']:8.1f} us  "
+                      f"p50 {stats['p50_us']:8.1f} us  p99 {stats['p99_us']:8.1f} us")
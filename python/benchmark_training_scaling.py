@@ -0,0 +1,139 @@
+"""
+Throughput of data-parallel CPU training at different process counts
+"""
+import argparse
+import json
+import os
+import socket
+import time
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+import torch.optim as optim
+from torch.nn.parallel import DistributedDataParallel
+from typing import Dict, List
+from dataset_shards import load_manifest, load_split
+from ml_model import DroneTrajectoryLSTM, FeatureNormalization
+from train_model import TensorBatchLoader
+
+
+def _free_port() -> int:
+    """Find an unused local TCP port for the process group rendezvous"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _benchmark_worker(rank: int, world_size: int, port: int, data_dir: str,
+                      batch_size: int, num_steps: int, warmup_steps: int, results):
+    """Run timed DDP training steps as one process of the group"""
+    os.environ['MASTER_ADDR'] = '127.0.0.1'
+    os.environ['MASTER_PORT'] = str(port)
+    dist.init_process_group('gloo', rank=rank, world_size=world_size)
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // world_size))
+    torch.manual_seed(0)
+
+    normalization = FeatureNormalization.from_dict(load_manifest(data_dir)['normalization'])
+    loader = TensorBatchLoader(load_split(data_dir, 'train'), normalization, batch_size,
+                               shuffle=True, rank=rank, num_replicas=world_size)
+    model = DistributedDataParallel(DroneTrajectoryLSTM())
+    criterion = nn.MSELoss()
+    optimizer = optim.Adam(model.parameters(), lr=0.001)
+
+    def batches():
+        while True:
+            yield from loader
+
+    batch_iter = batches()
+    start = None
+    for step in range(warmup_steps + num_steps):
+        if step == warmup_steps:
+            dist.barrier()
+            start = time.perf_counter()
+        batch_x, batch_y = next(batch_iter)
+        optimizer.zero_grad()
+        output, _ = model(batch_x)
+        loss = criterion(output, batch_y)
+        loss.backward()
+        optimizer.step()
+    dist.barrier()
+    elapsed = time.perf_counter() - start
+
+    if rank == 0:
+        results.put({'elapsed_seconds': elapsed, 'threads_per_process': torch.get_num_threads()})
+    dist.destroy_process_group()
+
+
+def run_scaling_benchmark(data_dir: str = '../data', process_counts: List[int] = (1, 2, 4, 8),
+                          batch_size: int = 64, num_steps: int = 50, warmup_steps: int = 5,
+                          output_path: str = None) -> List[Dict]:
+    """
+    Measure DDP training throughput for each process count
+
+    Every run uses the same per-process batch size, so the global batch grows
+    with the number of processes. The node's CPUs are divided evenly among
+    the processes of a run.
+
+    Args:
+        data_dir: Dataset directory
+        process_counts: Numbers of processes to benchmark
+        batch_size: Per-process batch size
+        num_steps: Timed optimizer steps
+        warmup_steps: Untimed steps before measuring
+        output_path: Optional JSON lines file for the results
+
+    Returns:
+        One result dict per process count
+    """
+    context = mp.get_context('spawn')
+    rows = []
+    for world_size in process_counts:
+        results = context.SimpleQueue()
+        mp.spawn(_benchmark_worker, nprocs=world_size, join=True,
+                 args=(world_size, _free_port(), data_dir, batch_size,
+                       num_steps, warmup_steps, results))
+        result = results.get()
+
+        samples_per_second = world_size * batch_size * num_steps / result['elapsed_seconds']
+        row = {
+            'processes': world_size,
+            'threads_per_process': result['threads_per_process'],
+            'batch_size': batch_size,
+            'steps': num_steps,
+            'elapsed_seconds': result['elapsed_seconds'],
+            'samples_per_second': samples_per_second
+        }
+        rows.append(row)
+        # Relative to the per-process throughput of the first run
+        baseline = rows[0]['samples_per_second'] / rows[0]['processes']
+        row['speedup'] = samples_per_second / baseline
+        row['efficiency'] = row['speedup'] / world_size
+        print(f"{world_size:>3} processes: {samples_per_second:10.0f} samples/s, "
+              f"speedup {row['speedup']:.2f}x, efficiency {row['efficiency']:.0%}")
+
+    if output_path:
+        with open(output_path, 'w') as f:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark data-parallel CPU training throughput')
+    parser.add_argument('--data_dir', type=str, default='../data',
+                       help='Dataset directory')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4, 8],
+                       help='Process counts to benchmark')
+    parser.add_argument('--batch_size', type=int, default=64,
+                       help='Per-process batch size')
+    parser.add_argument('--num_steps', type=int, default=50,
+                       help='Timed optimizer steps per run')
+    parser.add_argument('--output', type=str, default=None,
+                       help='JSON lines results file')
+
+    args = parser.parse_args()
+
+    print(f"Benchmarking on {os.cpu_count()} CPUs...")
+    run_scaling_benchmark(args.data_dir, args.processes, args.batch_size,
+                          args.num_steps, output_path=args.output)
@@ -0,0 +1,150 @@
+"""
+Asynchronous, atomic training checkpoints
+"""
+import glob
+import os
+import queue
+import random
+import re
+import threading
+import numpy as np
+import torch
+from typing import Dict, Optional
+
+
+CHECKPOINT_PATTERN = 'checkpoint_epoch{epoch:04d}.pth'
+_CHECKPOINT_RE = re.compile(r'checkpoint_epoch(\d+)\.pth$')
+
+
+def snapshot(obj):
+    """
+    Copy a (nested) state dict so training can keep updating the original
+
+    Tensors are detached and cloned to the CPU; containers are rebuilt and
+    everything else is shared.
+    """
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to('cpu', copy=True)
+    if isinstance(obj, dict):
+        return {key: snapshot(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(snapshot(value) for value in obj)
+    return obj
+
+
+def rng_states() -> Dict:
+    """Random number generator states of Python, NumPy and PyTorch"""
+    states = {
+        'python': random.getstate(),
+        'numpy': np.random.get_state(),
+        'torch': torch.get_rng_state()
+    }
+    if torch.cuda.is_available():
+        states['cuda'] = torch.cuda.get_rng_state_all()
+    return states
+
+
+def set_rng_states(states: Dict):
+    """Restore generator states saved by rng_states()"""
+    random.setstate(states['python'])
+    np.random.set_state(states['numpy'])
+    torch.set_rng_state(states['torch'])
+    if 'cuda' in states and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(states['cuda'])
+
+
+def atomic_save(state: Dict, path: str):
+    """Write a checkpoint so that path never holds a partial file"""
+    tmp_path = path + '.tmp'
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def rolling_checkpoints(model_dir: str):
+    """Paths of the rolling checkpoints in model_dir, oldest first"""
+    paths = [path for path in glob.glob(os.path.join(model_dir, 'checkpoint_epoch*.pth'))
+             if _CHECKPOINT_RE.search(path)]
+    return sorted(paths, key=lambda path: int(_CHECKPOINT_RE.search(path).group(1)))
+
+
+def latest_checkpoint(model_dir: str) -> Optional[str]:
+    """Path of the most recent rolling checkpoint in model_dir, if any"""
+    paths = rolling_checkpoints(model_dir)
+    return paths[-1] if paths else None
+
+
+class CheckpointWriter:
+    """
+    Writes checkpoints from a background thread
+
+    save() snapshots the state on the calling thread (a copy of every tensor,
+    so training can continue immediately) and queues the write. Writes
+    happen in order, each through a temporary file and a rename. Rolling
+    checkpoints keep only the newest `keep` files. An error in the writer
+    thread is raised from the next save(), wait() or close().
+    """
+
+    def __init__(self, model_dir: str, keep: int = 3):
+        """
+        Args:
+            model_dir: Directory receiving the checkpoints
+            keep: Rolling checkpoints to retain (0 keeps all)
+        """
+        self.model_dir = model_dir
+        self.keep = keep
+        self.error = None
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='checkpoint-writer', daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                state, path, rolling = item
+                atomic_save(state, path)
+                if rolling:
+                    self._prune()
+            except Exception as e:
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _prune(self):
+        if self.keep <= 0:
+            return
+        for path in rolling_checkpoints(self.model_dir)[:-self.keep]:
+            os.remove(path)
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise RuntimeError(f"Checkpoint write failed: {error}") from error
+
+    def save(self, state: Dict, filename: str = None, epoch: int = None):
+        """
+        Queue a checkpoint write
+
+        Args:
+            state: Checkpoint contents (state dicts are snapshotted)
+            filename: File name within model_dir, e.g. 'best_model.pth'
+            epoch: Write the rolling checkpoint of this epoch instead
+        """
+        self._raise_error()
+        rolling = filename is None
+        if rolling:
+            filename = CHECKPOINT_PATTERN.format(epoch=epoch)
+        self.queue.put((snapshot(state), os.path.join(self.model_dir, filename), rolling))
+
+    def wait(self):
+        """Block until every queued checkpoint is on disk"""
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Flush the queue and stop the writer thread"""
+        self.queue.put(None)
+        self.thread.join()
+        self._raise_error()
@@ -2,175 +2,363 @@
 Generate training data for trajectory prediction model
 """
 import numpy as np
-import pickle
 import os
-from typing import List, Dict
+import multiprocessing as mp
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import List, Dict, Tuple
 from trajectory_generator import TrajectoryGenerator
+from dataset_shards import (ShardWriter, TrajectoryShardWriter, RunningStats, SPLITS, LAYOUTS,
+                            load_manifest, load_split)
+from utils import row_norms
 from tqdm import tqdm
 
 
 def generate_random_waypoints(num_waypoints: int = 5, 
                               area_size: float = 50.0,
                               min_height: float = 2.0,
-                              max_height: float = 20.0) -> List[np.ndarray]:
-    """Generate random waypoints in 3D space"""
+                              max_height: float = 20.0,
+                              rng: np.random.Generator = None) -> List[np.ndarray]:
+    """Generate random waypoints in 3D space (rng defaults to the global np.random state)"""
+    if rng is None:
+        rng = np.random
     waypoints = []
     for _ in range(num_waypoints):
-        x = np.random.uniform(-area_size, area_size)
-        y = np.random.uniform(-area_size, area_size)
-        z = np.random.uniform(min_height, max_height)
+        x = rng.uniform(-area_size, area_size)
+        y = rng.uniform(-area_size, area_size)
+        z = rng.uniform(min_height, max_height)
         waypoints.append(np.array([x, y, z]))
     return waypoints
 
 
-def create_training_sequences(trajectory: Dict, sequence_length: int = 10) -> List[Dict]:
+def featurize_trajectory(trajectory: Dict) -> np.ndarray:
+    """
+    Compute the per-timestep model input features of a trajectory
+    
+    Args:
+        trajectory: Trajectory dict from TrajectoryGenerator
+        
+    Returns:
+        (T, 13) float32 array: position(3), velocity(3), acceleration(3),
+        target waypoint(3), distance to waypoint(1)
+    """
+    positions = trajectory['positions']
+    waypoints = np.asarray(trajectory['waypoints']).reshape(-1, 3)
+    
+    wp_idx = np.minimum(trajectory['waypoint_indices'], len(waypoints) - 1)
+    target_wp = waypoints[wp_idx]
+    
+    features = np.empty((len(positions), 13), dtype=np.float32)
+    features[:, 0:3] = positions
+    features[:, 3:6] = trajectory['velocities']
+    features[:, 6:9] = trajectory['accelerations']
+    features[:, 9:12] = target_wp
+    features[:, 12] = row_norms(positions - target_wp)
+    return features
+
+
+def create_training_sequences(trajectory: Dict, 
+                              sequence_length: int = 10) -> Tuple[np.ndarray, np.ndarray]:
     """
     Create training sequences from trajectory data
     
+    Each trajectory is featurized once; input windows are strided views
+    into the feature array rather than copies.
+    
     Args:
         trajectory: Trajectory dict from TrajectoryGenerator
         sequence_length: Length of input sequence
         
     Returns:
-        List of training samples, each with 'input_sequence' and 'target'
+        inputs: (S, sequence_length, 13) float32 input sequences
+        targets: (S, 6) float32 next position and velocity
+    """
+    return windows_from_features(featurize_trajectory(trajectory), sequence_length)
+
+
+def windows_from_features(features: np.ndarray,
+                          sequence_length: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Input windows and targets of a featurized trajectory (see create_training_sequences)
     """
-    samples = []
+    num_samples = len(features) - sequence_length
     
-    positions = trajectory['positions']
-    velocities = trajectory['velocities']
-    accelerations = trajectory['accelerations']
-    waypoint_indices = trajectory['waypoint_indices']
-    waypoints = trajectory['waypoints']
-    
-    for i in range(sequence_length, len(positions)):
-        # Input sequence
-        input_seq = []
-        for j in range(i - sequence_length, i):
-            wp_idx = min(waypoint_indices[j], len(waypoints) - 1)
-            target_wp = waypoints[wp_idx]
-            dist_to_wp = np.linalg.norm(positions[j] - target_wp)
-            
-            features = np.concatenate([
-                positions[j],
-                velocities[j],
-                accelerations[j],
-                target_wp,
-                [dist_to_wp]
-            ])
-            input_seq.append(features)
+    if num_samples <= 0:
+        return (np.empty((0, sequence_length, 13), dtype=np.float32),
+                np.empty((0, 6), dtype=np.float32))
+    
+    # Window i covers timesteps [i, i + sequence_length) and predicts i + sequence_length
+    inputs = sliding_window_view(features[:-1], sequence_length, axis=0).transpose(0, 2, 1)
+    targets = features[sequence_length:, :6]
+    
+    return inputs, targets
+
+
+# Generator reused by every chunk that runs in a worker process
+_worker_generator = None
+
+
+def _init_worker(dt: float):
+    """Create the generator once per worker process"""
+    global _worker_generator
+    _worker_generator = TrajectoryGenerator(dt=dt)
+
+
+def _generate_chunk(task: Tuple) -> Dict:
+    """
+    Generate one chunk of trajectories and their training sequences
+    
+    All randomness comes from the chunk's own SeedSequence, so the result
+    does not depend on which process runs it. Each trajectory is assigned
+    to the train (70%), val (15%) or test (15%) split as a whole.
+    
+    Returns:
+        Dict with 'splits', mapping split name to (inputs, targets) arrays for
+        the 'windows' layout or to a list of featurized (T, 13) trajectories
+        for the 'trajectories' layout, and the chunk's 'feature_stats' and
+        'target_stats' over the training split
+    """
+    num_batch, seed_sequence, sequence_length, max_waypoints, layout = task
+    generator = _worker_generator
+    rng = np.random.default_rng(seed_sequence)
+    
+    initial_positions = np.zeros((num_batch, 3))
+    initial_velocities = np.zeros((num_batch, 3))
+    waypoints = np.zeros((num_batch, max_waypoints, 3))
+    num_waypoints = np.zeros(num_batch, dtype=np.int64)
+    
+    for i in range(num_batch):
+        # Random initial conditions
+        initial_positions[i] = [
+            rng.uniform(-5, 5),
+            rng.uniform(-5, 5),
+            rng.uniform(2, 5)
+        ]
+        initial_velocities[i] = rng.uniform(-2, 2, 3)
+        
+        # Random waypoints
+        num_waypoints[i] = rng.integers(3, max_waypoints + 1)
+        waypoints[i, :num_waypoints[i]] = generate_random_waypoints(num_waypoints[i], rng=rng)
+    
+    # Generate the whole chunk in lockstep
+    batch = generator.generate_batch(initial_positions, initial_velocities,
+                                     waypoints, num_waypoints=num_waypoints)
+    
+    chunk = {split: ([], []) for split in SPLITS}
+    feature_stats = RunningStats(13)
+    target_stats = RunningStats(6)
+    for trajectory in generator.split_batch(batch):
+        # Add noise for data augmentation
+        if rng.random() < 0.3:  # 30% with noise
+            trajectory = generator.add_noise(trajectory, 0.1, 0.05, rng=rng)
         
-        # Target (next position and velocity)
-        target = np.concatenate([
-            positions[i],
-            velocities[i]
-        ])
+        draw = rng.random()
+        split = 'train' if draw < 0.7 else 'val' if draw < 0.85 else 'test'
         
-        samples.append({
-            'input_sequence': np.array(input_seq, dtype=np.float32),
-            'target': np.array(target, dtype=np.float32)
-        })
+        features = featurize_trajectory(trajectory)
+        if split == 'train':
+            feature_stats.update(features)
+            target_stats.update(features[sequence_length:, :6])
+        
+        if layout == 'trajectories':
+            chunk[split][0].append(features)
+            continue
+        
+        # Create training sequences
+        inputs, targets = windows_from_features(features, sequence_length)
+        chunk[split][0].append(inputs)
+        chunk[split][1].append(targets)
     
-    return samples
+    if layout == 'trajectories':
+        splits = {split: features for split, (features, _) in chunk.items()}
+    else:
+        splits = {split: (np.concatenate(inputs) if inputs else
+                          np.empty((0, sequence_length, 13), dtype=np.float32),
+                          np.concatenate(targets) if targets else
+                          np.empty((0, 6), dtype=np.float32))
+                  for split, (inputs, targets) in chunk.items()}
+    return {'splits': splits, 'feature_stats': feature_stats, 'target_stats': target_stats}
+
+
+def normalization_from_stats(feature_stats: RunningStats, target_stats: RunningStats) -> Dict:
+    """Per-feature normalization entry of the manifest (see ml_model.FeatureNormalization)"""
+    return {
+        'input_mean': feature_stats.mean.tolist(),
+        'input_std': feature_stats.std.tolist(),
+        'target_mean': target_stats.mean.tolist(),
+        'target_std': target_stats.std.tolist()
+    }
 
 
 def generate_dataset(num_trajectories: int = 1000, 
                      output_dir: str = '../data',
-                     sequence_length: int = 10) -> Dict:
+                     sequence_length: int = 10,
+                     batch_size: int = 256,
+                     num_workers: int = None,
+                     seed: int = 0,
+                     shard_size: int = 65536,
+                     layout: str = 'windows',
+                     resume: bool = False,
+                     append: bool = False) -> Dict:
     """
     Generate complete training dataset
     
+    Trajectories are generated in chunks of batch_size. Chunk i draws from
+    its own np.random.Generator, spawned as child i of a master SeedSequence,
+    and chunks are collected in order, so the dataset depends only on seed
+    and batch_size, not on the number of workers.
+    
+    Samples are written incrementally as sharded .npy files with a JSON
+    manifest (see dataset_shards) rather than held in memory; training
+    shuffles them when reading. The 'trajectories' layout stores each
+    featurized trajectory once instead of every window, roughly
+    sequence_length times smaller, and lets training pick the window length.
+    
+    Whenever a full shard has been written, all pending data is flushed and
+    the manifest is rewritten with the chunks and trajectories completed and
+    the running normalization statistics. Per-feature mean and std of the
+    13 input features and 6 targets over the training split are accumulated
+    in one streaming pass, merged from the workers' chunks, and stored as
+    the manifest's 'normalization' entry. An interrupted run continues from
+    that point with resume=True; append=True adds num_trajectories more to
+    a finished dataset. Both take seed, batch_size, sequence_length and
+    layout from the existing manifest.
+    
     Args:
-        num_trajectories: Number of trajectories to generate
+        num_trajectories: Number of trajectories to generate (to add, with append)
         output_dir: Directory to save data
         sequence_length: Length of input sequences
+        batch_size: Number of trajectories integrated together with
+                    TrajectoryGenerator.generate_batch
+        num_workers: Worker processes (default: all CPUs, 0 runs in-process)
+        seed: Master random seed
+        shard_size: Samples (windows layout) or timesteps (trajectories
+                    layout) per shard file
+        layout: 'windows' (materialized samples) or 'trajectories'
+        resume: Continue an interrupted generation in output_dir
+        append: Extend the finished dataset in output_dir
         
     Returns:
         Dataset statistics
     """
-    os.makedirs(output_dir, exist_ok=True)
+    if resume and append:
+        raise ValueError("resume and append are mutually exclusive")
     
-    generator = TrajectoryGenerator(dt=0.1)
-    all_samples = []
+    if resume or append:
+        manifest = load_manifest(output_dir)
+        if resume and manifest['complete']:
+            print(f"Dataset in {output_dir} is already complete")
+        if append and not manifest['complete']:
+            raise ValueError(f"Dataset in {output_dir} is incomplete; resume it before appending")
+        seed = manifest['seed']
+        batch_size = manifest['batch_size']
+        sequence_length = manifest['sequence_length']
+        layout = manifest['layout']
+        shard_size = manifest['shard_size']
+        chunks_done = manifest['num_chunks']
+        trajectories_done = manifest['num_trajectories']
+        target_trajectories = (trajectories_done + num_trajectories if append
+                               else manifest['target_trajectories'])
+        feature_stats = RunningStats.from_dict(manifest['feature_stats'])
+        target_stats = RunningStats.from_dict(manifest['target_stats'])
+    else:
+        chunks_done = 0
+        trajectories_done = 0
+        target_trajectories = num_trajectories
+        feature_stats = RunningStats(13)
+        target_stats = RunningStats(6)
     
-    print(f"Generating {num_trajectories} trajectories...")
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown dataset layout: {layout}")
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    max_waypoints = 7
     
-    for i in tqdm(range(num_trajectories)):
-        # Random initial conditions
-        initial_pos = np.array([
-            np.random.uniform(-5, 5),
-            np.random.uniform(-5, 5),
-            np.random.uniform(2, 5)
-        ])
-        initial_vel = np.random.uniform(-2, 2, 3)
-        
-        # Random waypoints
-        num_waypoints = np.random.randint(3, 8)
-        waypoints = generate_random_waypoints(num_waypoints)
-        
-        # Generate trajectory
-        trajectory = generator.generate(initial_pos, initial_vel, waypoints)
-        
-        # Add noise for data augmentation
-        if np.random.random() < 0.3:  # 30% with noise
-            trajectory = generator.add_noise(trajectory, 0.1, 0.05)
-        
-        # Create training sequences
-        samples = create_training_sequences(trajectory, sequence_length)
-        all_samples.extend(samples)
-    
-    # Shuffle samples
-    np.random.shuffle(all_samples)
-    
-    # Split into train/val/test
-    n_total = len(all_samples)
-    n_train = int(0.7 * n_total)
-    n_val = int(0.15 * n_total)
-    
-    train_samples = all_samples[:n_train]
-    val_samples = all_samples[n_train:n_train+n_val]
-    test_samples = all_samples[n_train+n_val:]
-    
-    # Calculate normalization statistics from training data
-    all_positions = np.array([s['target'][:3] for s in train_samples])
-    all_velocities = np.array([s['target'][3:6] for s in train_samples])
-    
-    pos_mean = np.mean(all_positions, axis=0)
-    pos_std = np.std(all_positions, axis=0)
-    vel_mean = np.mean(all_velocities, axis=0)
-    vel_std = np.std(all_velocities, axis=0)
-    
-    normalization = {
-        'pos_mean': pos_mean,
-        'pos_std': pos_std,
-        'vel_mean': vel_mean,
-        'vel_std': vel_std
-    }
+    remaining = target_trajectories - trajectories_done
+    chunk_sizes = [min(batch_size, remaining - start) for start in range(0, remaining, batch_size)]
+    # Child i of SeedSequence(seed), as returned by SeedSequence(seed).spawn(n)[i]
+    chunk_seeds = [np.random.SeedSequence(seed, spawn_key=(chunks_done + i,))
+                   for i in range(len(chunk_sizes))]
+    tasks = [(num_batch, chunk_seed, sequence_length, max_waypoints, layout)
+             for num_batch, chunk_seed in zip(chunk_sizes, chunk_seeds)]
+    
+    if layout == 'trajectories':
+        writer = TrajectoryShardWriter(output_dir, sequence_length, shard_size=shard_size)
+    else:
+        writer = ShardWriter(output_dir, sequence_length, shard_size=shard_size)
+    if resume or append:
+        writer.resume(manifest)
+    
+    def checkpoint(complete: bool) -> Dict:
+        return writer.commit({
+            'seed': seed,
+            'batch_size': batch_size,
+            'num_chunks': chunks_done,
+            'num_trajectories': trajectories_done,
+            'target_trajectories': target_trajectories,
+            'complete': complete,
+            'feature_stats': feature_stats.to_dict(),
+            'target_stats': target_stats.to_dict(),
+            'normalization': normalization_from_stats(feature_stats, target_stats)
+        })
     
-    # Save datasets
-    print(f"\nSaving datasets...")
-    print(f"  Training samples: {len(train_samples)}")
-    print(f"  Validation samples: {len(val_samples)}")
-    print(f"  Test samples: {len(test_samples)}")
+    # Record the run before any work so that it can be resumed
+    checkpoint(complete=False)
     
-    with open(os.path.join(output_dir, 'train_data.pkl'), 'wb') as f:
-        pickle.dump(train_samples, f)
+    print(f"Generating {remaining} trajectories on {max(num_workers, 1)} process(es)...")
     
-    with open(os.path.join(output_dir, 'val_data.pkl'), 'wb') as f:
-        pickle.dump(val_samples, f)
+    if num_workers == 0:
+        _init_worker(0.1)
+        results = map(_generate_chunk, tasks)
+        pool = None
+    else:
+        pool = mp.Pool(min(num_workers, max(len(tasks), 1)),
+                       initializer=_init_worker, initargs=(0.1,))
+        results = pool.imap(_generate_chunk, tasks)
     
-    with open(os.path.join(output_dir, 'test_data.pkl'), 'wb') as f:
-        pickle.dump(test_samples, f)
+    try:
+        with tqdm(total=target_trajectories, initial=trajectories_done) as progress:
+            for num_batch, chunk in zip(chunk_sizes, results):
+                if layout == 'trajectories':
+                    for split, trajectories in chunk['splits'].items():
+                        for features in trajectories:
+                            writer.append(split, features)
+                else:
+                    for split, (inputs, targets) in chunk['splits'].items():
+                        writer.append(split, inputs, targets)
+                feature_stats.merge(chunk['feature_stats'])
+                target_stats.merge(chunk['target_stats'])
+                
+                chunks_done += 1
+                trajectories_done += num_batch
+                if writer.needs_commit:
+                    checkpoint(complete=False)
+                progress.update(num_batch)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted after {trajectories_done} trajectories; "
+              f"completed shards are kept, run with --resume to continue")
+        raise
+    finally:
+        if pool is not None:
+            # All results have been consumed unless generation was interrupted
+            pool.terminate()
+            pool.join()
     
-    with open(os.path.join(output_dir, 'normalization.pkl'), 'wb') as f:
-        pickle.dump(normalization, f)
+    manifest = checkpoint(complete=True)
+    
+    split_counts = {split: len(load_split(output_dir, split)) for split in SPLITS}
+    print(f"\nSaved datasets:")
+    print(f"  Training samples: {split_counts['train']}")
+    print(f"  Validation samples: {split_counts['val']}")
+    print(f"  Test samples: {split_counts['test']}")
     
     stats = {
-        'num_trajectories': num_trajectories,
-        'total_samples': n_total,
-        'train_samples': len(train_samples),
-        'val_samples': len(val_samples),
-        'test_samples': len(test_samples),
-        'sequence_length': sequence_length
+        'num_trajectories': manifest['num_trajectories'],
+        'total_samples': sum(split_counts.values()),
+        'train_samples': split_counts['train'],
+        'val_samples': split_counts['val'],
+        'test_samples': split_counts['test'],
+        'sequence_length': sequence_length,
+        'seed': seed
     }
     
     print(f"\nDataset generation complete!")
@@ -180,8 +368,31 @@ def generate_dataset(num_trajectories: int = 1000,
 
 
 if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Generate trajectory prediction training data')
+    parser.add_argument('--num_trajectories', type=int, default=1000,
+                       help='Number of trajectories to generate')
+    parser.add_argument('--output_dir', type=str, default='../data',
+                       help='Directory to save data')
+    parser.add_argument('--num_workers', type=int, default=None,
+                       help='Worker processes (default: all CPUs, 0 runs in-process)')
+    parser.add_argument('--seed', type=int, default=0,
+                       help='Master random seed')
+    parser.add_argument('--layout', type=str, default='windows', choices=['windows', 'trajectories'],
+                       help='Store materialized windows or each featurized trajectory once')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue an interrupted generation in output_dir')
+    parser.add_argument('--append', type=int, default=0, metavar='N',
+                       help='Add N trajectories to the finished dataset in output_dir')
+    
+    args = parser.parse_args()
+    
     # Generate dataset
-    stats = generate_dataset(num_trajectories=1000, output_dir='../data')
+    stats = generate_dataset(num_trajectories=args.append or args.num_trajectories,
+                             output_dir=args.output_dir, num_workers=args.num_workers,
+                             seed=args.seed, layout=args.layout,
+                             resume=args.resume, append=args.append > 0)
     print(f"\nDataset statistics:")
     for key, value in stats.items():
         print(f"  {key}: {value}")
@@ -0,0 +1,518 @@
+"""
+Sharded, memory-mapped on-disk format for training datasets
+
+A dataset directory holds fixed-dtype .npy shards per split and a JSON
+manifest with counts, shapes and the range covered by every shard. Two
+layouts are supported:
+
+- 'windows': materialized samples (train_inputs_00000.npy,
+  train_targets_00000.npy, ...)
+- 'trajectories': the featurized (T, 13) arrays of whole trajectories
+  (train_features_00000.npy plus train_lengths_00000.npy); windows are
+  sliced on the fly, so the sequence length can be chosen when reading
+
+Shards are written incrementally while data is generated and opened with
+np.load(mmap_mode='r') for training.
+"""
+import json
+import os
+import numpy as np
+from typing import Dict, Tuple
+
+
+MANIFEST_NAME = 'manifest.json'
+FORMAT_VERSION = 1
+SPLITS = ('train', 'val', 'test')
+LAYOUTS = ('windows', 'trajectories')
+
+
+def write_manifest(output_dir: str, manifest: Dict):
+    """Write a manifest atomically so readers never see a partial file"""
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(data_dir: str) -> Dict:
+    """Read the manifest of a sharded dataset"""
+    with open(os.path.join(data_dir, MANIFEST_NAME), 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported dataset format version: {manifest.get('format_version')}")
+    return manifest
+
+
+class RunningStats:
+    """
+    Streaming per-feature mean and variance (Welford), mergeable across chunks
+
+    Partial accumulators from different workers or generation runs combine
+    exactly with merge() (Chan et al. parallel update).
+    """
+
+    def __init__(self, num_features: int):
+        self.count = 0
+        self.mean = np.zeros(num_features)
+        self.m2 = np.zeros(num_features)
+
+    def update(self, values: np.ndarray):
+        """Add a (N, num_features) batch of observations"""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        batch = RunningStats(values.shape[1])
+        batch.count = len(values)
+        batch.mean = values.mean(axis=0)
+        batch.m2 = ((values - batch.mean) ** 2).sum(axis=0)
+        self.merge(batch)
+
+    def merge(self, other: 'RunningStats'):
+        """Fold another accumulator into this one"""
+        if other.count == 0:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * (other.count / count)
+        self.m2 = self.m2 + other.m2 + delta ** 2 * (self.count * other.count / count)
+        self.count = count
+
+    @property
+    def std(self) -> np.ndarray:
+        """Population standard deviation"""
+        if self.count == 0:
+            return np.zeros_like(self.m2)
+        return np.sqrt(self.m2 / self.count)
+
+    def to_dict(self) -> Dict:
+        """JSON-serializable state"""
+        return {'count': self.count, 'mean': self.mean.tolist(), 'm2': self.m2.tolist()}
+
+    @classmethod
+    def from_dict(cls, state: Dict) -> 'RunningStats':
+        """Restore an accumulator saved with to_dict"""
+        stats = cls(len(state['mean']))
+        stats.count = state['count']
+        stats.mean = np.array(state['mean'], dtype=np.float64)
+        stats.m2 = np.array(state['m2'], dtype=np.float64)
+        return stats
+
+
+class _ShardWriterBase:
+    """Shared manifest, commit and resume handling of the shard writers"""
+
+    layout = None
+
+    def __init__(self, output_dir: str, sequence_length: int, num_features: int,
+                 target_size: int, shard_size: int):
+        self.output_dir = output_dir
+        self.sequence_length = sequence_length
+        self.num_features = num_features
+        self.target_size = target_size
+        self.shard_size = shard_size
+
+        self.splits = {split: self._empty_split() for split in SPLITS}
+        self.needs_commit = False  # A full shard was written since the last commit
+
+        os.makedirs(output_dir, exist_ok=True)
+
+    def resume(self, manifest: Dict):
+        """
+        Continue an existing dataset: new shards are numbered after the committed ones
+
+        Args:
+            manifest: Manifest of the dataset in output_dir
+        """
+        if manifest.get('layout', 'windows') != self.layout:
+            raise ValueError(f"Cannot append {self.layout} shards to a "
+                             f"{manifest.get('layout', 'windows')} dataset")
+        self.splits = json.loads(json.dumps(manifest['splits']))
+
+    def commit(self, metadata: Dict = None) -> Dict:
+        """
+        Write all pending data and the manifest
+
+        Everything appended so far is on disk once this returns. Shard files
+        written after the last commit are not referenced by the manifest and
+        are overwritten when generation resumes.
+
+        Args:
+            metadata: Extra entries stored in the manifest
+
+        Returns:
+            The manifest
+        """
+        for split in SPLITS:
+            self._flush(split, full_only=False)
+
+        manifest = {
+            'format_version': FORMAT_VERSION,
+            'layout': self.layout,
+            'dtype': 'float32',
+            'sequence_length': self.sequence_length,
+            'input_shape': [self.sequence_length, self.num_features],
+            'target_shape': [self.target_size],
+            'shard_size': self.shard_size,
+            'splits': self.splits
+        }
+        if metadata:
+            manifest.update(metadata)
+        write_manifest(self.output_dir, manifest)
+        self.needs_commit = False
+        return manifest
+
+    def close(self, metadata: Dict = None) -> Dict:
+        """Write remaining data and the manifest (same as commit)"""
+        return self.commit(metadata)
+
+    def _empty_split(self) -> Dict:
+        raise NotImplementedError
+
+    def _flush(self, split: str, full_only: bool):
+        raise NotImplementedError
+
+
+class ShardWriter(_ShardWriterBase):
+    """Append samples to a sharded dataset, flushing full shards to disk"""
+
+    layout = 'windows'
+
+    def __init__(self, output_dir: str, sequence_length: int, num_features: int = 13,
+                 target_size: int = 6, shard_size: int = 65536):
+        """
+        Initialize shard writer
+
+        Args:
+            output_dir: Dataset directory
+            sequence_length: Length of input sequences
+            num_features: Features per input timestep
+            target_size: Features per target
+            shard_size: Samples per shard file
+        """
+        super().__init__(output_dir, sequence_length, num_features, target_size, shard_size)
+        self._pending = {split: ([], [], 0) for split in SPLITS}  # inputs, targets, count
+
+    def append(self, split: str, inputs: np.ndarray, targets: np.ndarray):
+        """
+        Add samples to a split
+
+        Args:
+            split: One of 'train', 'val', 'test'
+            inputs: (S, sequence_length, num_features) input sequences
+            targets: (S, target_size) targets
+        """
+        if len(inputs) == 0:
+            return
+        pending_inputs, pending_targets, count = self._pending[split]
+        pending_inputs.append(np.asarray(inputs, dtype=np.float32))
+        pending_targets.append(np.asarray(targets, dtype=np.float32))
+        count += len(inputs)
+        self._pending[split] = (pending_inputs, pending_targets, count)
+
+        if count >= self.shard_size:
+            self._flush(split, full_only=True)
+            self.needs_commit = True
+
+    def _empty_split(self) -> Dict:
+        return {'num_samples': 0, 'shards': []}
+
+    def _flush(self, split: str, full_only: bool):
+        """Write pending samples of a split as shards"""
+        pending_inputs, pending_targets, count = self._pending[split]
+        if count == 0:
+            return
+        inputs = np.concatenate(pending_inputs)
+        targets = np.concatenate(pending_targets)
+
+        start = 0
+        while count - start >= self.shard_size or (not full_only and start < count):
+            end = min(start + self.shard_size, count)
+            self._write_shard(split, inputs[start:end], targets[start:end])
+            start = end
+
+        if start < count:
+            self._pending[split] = ([inputs[start:]], [targets[start:]], count - start)
+        else:
+            self._pending[split] = ([], [], 0)
+
+    def _write_shard(self, split: str, inputs: np.ndarray, targets: np.ndarray):
+        """Save one shard and record it in the split index"""
+        info = self.splits[split]
+        index = len(info['shards'])
+        inputs_name = f'{split}_inputs_{index:05d}.npy'
+        targets_name = f'{split}_targets_{index:05d}.npy'
+        np.save(os.path.join(self.output_dir, inputs_name), np.ascontiguousarray(inputs))
+        np.save(os.path.join(self.output_dir, targets_name), np.ascontiguousarray(targets))
+
+        info['shards'].append({
+            'inputs': inputs_name,
+            'targets': targets_name,
+            'start': info['num_samples'],
+            'num_samples': len(inputs)
+        })
+        info['num_samples'] += len(inputs)
+
+
+class TrajectoryShardWriter(_ShardWriterBase):
+    """Append featurized trajectories to a sharded dataset in the 'trajectories' layout"""
+
+    layout = 'trajectories'
+
+    def __init__(self, output_dir: str, sequence_length: int, num_features: int = 13,
+                 target_size: int = 6, shard_size: int = 65536):
+        """
+        Initialize trajectory shard writer
+
+        Args:
+            output_dir: Dataset directory
+            sequence_length: Default length of input sequences when reading
+            num_features: Features per timestep
+            target_size: Leading features used as the target
+            shard_size: Timesteps per shard file (trajectories are never split)
+        """
+        super().__init__(output_dir, sequence_length, num_features, target_size, shard_size)
+        self._pending = {split: ([], 0) for split in SPLITS}  # features, timesteps
+
+    def append(self, split: str, features: np.ndarray):
+        """
+        Add one trajectory to a split
+
+        Args:
+            split: One of 'train', 'val', 'test'
+            features: (T, num_features) featurized trajectory
+        """
+        pending_features, count = self._pending[split]
+        pending_features.append(np.asarray(features, dtype=np.float32))
+        count += len(features)
+        self._pending[split] = (pending_features, count)
+
+        if count >= self.shard_size:
+            self._flush(split, full_only=True)
+            self.needs_commit = True
+
+    def _empty_split(self) -> Dict:
+        return {'num_trajectories': 0, 'num_timesteps': 0, 'shards': []}
+
+    def _flush(self, split: str, full_only: bool):
+        """Write all pending trajectories of a split as one shard"""
+        pending_features, count = self._pending[split]
+        if not pending_features:
+            return
+
+        info = self.splits[split]
+        index = len(info['shards'])
+        features_name = f'{split}_features_{index:05d}.npy'
+        lengths_name = f'{split}_lengths_{index:05d}.npy'
+        lengths = np.array([len(features) for features in pending_features], dtype=np.int64)
+        np.save(os.path.join(self.output_dir, features_name), np.concatenate(pending_features))
+        np.save(os.path.join(self.output_dir, lengths_name), lengths)
+
+        info['shards'].append({
+            'features': features_name,
+            'lengths': lengths_name,
+            'num_trajectories': len(lengths),
+            'num_timesteps': count
+        })
+        info['num_trajectories'] += len(lengths)
+        info['num_timesteps'] += count
+        self._pending[split] = ([], 0)
+
+
+class ShardedSplit:
+    """Read-only, memory-mapped view of one split of a sharded dataset"""
+
+    def __init__(self, data_dir: str, split: str, manifest: Dict = None):
+        """
+        Args:
+            data_dir: Dataset directory
+            split: One of 'train', 'val', 'test'
+            manifest: Already loaded manifest (read from data_dir if None)
+        """
+        if manifest is None:
+            manifest = load_manifest(data_dir)
+        self.data_dir = data_dir
+        self.split = split
+        self.sequence_length = manifest['sequence_length']
+        self.input_shape = tuple(manifest['input_shape'])
+        self.target_shape = tuple(manifest['target_shape'])
+
+        self.shards = manifest['splits'][split]['shards']
+        self.num_samples = manifest['splits'][split]['num_samples']
+        self._ends = np.array([shard['start'] + shard['num_samples'] for shard in self.shards],
+                              dtype=np.int64)
+        self._inputs = None
+        self._targets = None
+
+    def __len__(self) -> int:
+        return self.num_samples
+
+    def __getitem__(self, idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Input sequence and target of one sample (read-only views)"""
+        if idx < 0:
+            idx += self.num_samples
+        if not 0 <= idx < self.num_samples:
+            raise IndexError(f"Sample index {idx} out of range for {self.num_samples} samples")
+        self._open()
+        shard = int(np.searchsorted(self._ends, idx, side='right'))
+        local = idx - self.shards[shard]['start']
+        return self._inputs[shard][local], self._targets[shard][local]
+
+    def __getstate__(self) -> Dict:
+        # Memory maps are reopened in the receiving process instead of being pickled
+        state = self.__dict__.copy()
+        state['_inputs'] = None
+        state['_targets'] = None
+        return state
+
+    def load_arrays(self) -> Dict[str, np.ndarray]:
+        """Read the whole split into memory as {'inputs', 'targets'} arrays"""
+        self._open()
+        if not self.shards:
+            return {'inputs': np.empty((0,) + self.input_shape, dtype=np.float32),
+                    'targets': np.empty((0,) + self.target_shape, dtype=np.float32)}
+        return {'inputs': np.concatenate(self._inputs),
+                'targets': np.concatenate(self._targets)}
+
+    def _open(self):
+        """Memory-map the shard files on first access"""
+        if self._inputs is not None:
+            return
+        self._inputs = [np.load(os.path.join(self.data_dir, shard['inputs']), mmap_mode='r')
+                        for shard in self.shards]
+        self._targets = [np.load(os.path.join(self.data_dir, shard['targets']), mmap_mode='r')
+                         for shard in self.shards]
+
+
+class TrajectorySplit:
+    """
+    Read-only view of one split stored in the 'trajectories' layout
+
+    Samples are addressed through an index of (trajectory_id, start_offset)
+    pairs; each sample is sliced out of the memory-mapped feature shards on
+    access, so no timestep is stored more than once.
+    """
+
+    def __init__(self, data_dir: str, split: str, sequence_length: int = None,
+                 manifest: Dict = None):
+        """
+        Args:
+            data_dir: Dataset directory
+            split: One of 'train', 'val', 'test'
+            sequence_length: Window length (default: the manifest's)
+            manifest: Already loaded manifest (read from data_dir if None)
+        """
+        if manifest is None:
+            manifest = load_manifest(data_dir)
+        if sequence_length is None:
+            sequence_length = manifest['sequence_length']
+        self.data_dir = data_dir
+        self.split = split
+        self.sequence_length = sequence_length
+        self.num_features = manifest['input_shape'][1]
+        self.target_size = manifest['target_shape'][0]
+        self.input_shape = (sequence_length, self.num_features)
+        self.target_shape = (self.target_size,)
+        self.shards = manifest['splits'][split]['shards']
+
+        # Shard and first row of every trajectory
+        lengths = [np.load(os.path.join(data_dir, shard['lengths'])) for shard in self.shards]
+        self.trajectory_shards = np.concatenate(
+            [np.full(len(shard_lengths), i, dtype=np.int64) for i, shard_lengths in enumerate(lengths)]
+            + [np.empty(0, dtype=np.int64)])
+        self.trajectory_rows = np.concatenate(
+            [np.cumsum(shard_lengths) - shard_lengths for shard_lengths in lengths]
+            + [np.empty(0, dtype=np.int64)])
+        self.trajectory_lengths = np.concatenate(lengths + [np.empty(0, dtype=np.int64)])
+
+        # Window i of a trajectory covers rows [i, i + sequence_length) and predicts the next row
+        windows = np.maximum(self.trajectory_lengths - sequence_length, 0)
+        self.num_samples = int(windows.sum())
+        self.trajectory_ids = np.repeat(np.arange(len(windows)), windows)
+        first_sample = np.cumsum(windows) - windows
+        self.start_offsets = np.arange(self.num_samples) - np.repeat(first_sample, windows)
+        self._features = None
+
+    def __len__(self) -> int:
+        return self.num_samples
+
+    def __getitem__(self, idx: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Input sequence and target of one sample (read-only views)"""
+        if idx < 0:
+            idx += self.num_samples
+        if not 0 <= idx < self.num_samples:
+            raise IndexError(f"Sample index {idx} out of range for {self.num_samples} samples")
+        self._open()
+        trajectory = self.trajectory_ids[idx]
+        features = self._features[self.trajectory_shards[trajectory]]
+        row = self.trajectory_rows[trajectory] + self.start_offsets[idx]
+        return (features[row:row + self.sequence_length],
+                features[row + self.sequence_length, :self.target_size])
+
+    def __getstate__(self) -> Dict:
+        # Memory maps are reopened in the receiving process instead of being pickled
+        state = self.__dict__.copy()
+        state['_features'] = None
+        return state
+
+    def trajectory(self, trajectory_id: int) -> np.ndarray:
+        """Featurized (T, num_features) array of one stored trajectory"""
+        self._open()
+        row = self.trajectory_rows[trajectory_id]
+        features = self._features[self.trajectory_shards[trajectory_id]]
+        return features[row:row + self.trajectory_lengths[trajectory_id]]
+
+    def load_features(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Read all stored timesteps into memory
+
+        Returns:
+            features: (rows, num_features) array of every trajectory in the split
+            window_rows: (num_samples,) first row of every window in features
+        """
+        self._open()
+        if not self.shards:
+            return (np.empty((0, self.num_features), dtype=np.float32),
+                    np.empty(0, dtype=np.int64))
+        shard_rows = np.array([shard['num_timesteps'] for shard in self.shards], dtype=np.int64)
+        shard_starts = np.cumsum(shard_rows) - shard_rows
+        trajectory_starts = shard_starts[self.trajectory_shards] + self.trajectory_rows
+        window_rows = trajectory_starts[self.trajectory_ids] + self.start_offsets
+        return np.concatenate(self._features), window_rows
+
+    def load_arrays(self) -> Dict[str, np.ndarray]:
+        """Materialize every window into memory as {'inputs', 'targets'} arrays"""
+        features, window_rows = self.load_features()
+        inputs = features[window_rows[:, None] + np.arange(self.sequence_length)]
+        targets = features[window_rows + self.sequence_length, :self.target_size]
+        return {'inputs': inputs, 'targets': targets}
+
+    def _open(self):
+        """Memory-map the feature shards on first access"""
+        if self._features is not None:
+            return
+        self._features = [np.load(os.path.join(self.data_dir, shard['features']), mmap_mode='r')
+                          for shard in self.shards]
+
+
+def load_split(data_dir: str, split: str, sequence_length: int = None):
+    """
+    Open one split of a sharded dataset
+
+    Args:
+        data_dir: Dataset directory
+        split: One of 'train', 'val', 'test'
+        sequence_length: Window length; only the 'trajectories' layout can
+                         differ from the length the dataset was generated with
+
+    Returns:
+        ShardedSplit or TrajectorySplit depending on the dataset layout
+    """
+    manifest = load_manifest(data_dir)
+    if manifest.get('layout', 'windows') == 'trajectories':
+        return TrajectorySplit(data_dir, split, sequence_length, manifest)
+    if sequence_length is not None and sequence_length != manifest['sequence_length']:
+        raise ValueError(f"Dataset in {data_dir} stores windows of length "
+                         f"{manifest['sequence_length']}, not {sequence_length}; "
+                         f"regenerate it or use the 'trajectories' layout")
+    return ShardedSplit(data_dir, split, manifest)
@@ -1,5 +1,5 @@
 """
-Export trajectory dataset from pickle format to CSV
+Export trajectory dataset from the sharded format to CSV
 """
 import numpy as np
 import pandas as pd
@@ -7,108 +7,98 @@ import pickle
 import os
 from typing import Dict, List
 import argparse
+from dataset_shards import MANIFEST_NAME, load_manifest, load_split
 
 
-def flatten_sample(sample: Dict, sequence_length: int = 10) -> Dict:
+# Each timestep has 13 features: pos(3), vel(3), acc(3), target_wp(3), dist(1)
+FEATURE_NAMES = ['pos_x', 'pos_y', 'pos_z', 
+                 'vel_x', 'vel_y', 'vel_z',
+                 'acc_x', 'acc_y', 'acc_z',
+                 'target_wp_x', 'target_wp_y', 'target_wp_z',
+                 'dist_to_wp']
+
+# Target features: next position(3) and velocity(3)
+TARGET_NAMES = ['target_pos_x', 'target_pos_y', 'target_pos_z',
+                'target_vel_x', 'target_vel_y', 'target_vel_z']
+
+
+def flatten_samples(samples: Dict[str, np.ndarray], sequence_length: int = None) -> pd.DataFrame:
     """
-    Flatten a single sample into a dictionary suitable for DataFrame
+    Flatten samples into a DataFrame with one row per sample
     
     Args:
-        sample: Sample dict with 'input_sequence' and 'target'
-        sequence_length: Length of input sequence
+        samples: Dict with 'inputs' (S, sequence_length, 13) and 'targets' (S, 6)
+        sequence_length: Expected length of input sequence (default: the inputs')
         
     Returns:
-        Flattened dict with all features
+        DataFrame with all features
     """
-    flattened = {}
-    
-    # Flatten input sequence
-    # Each timestep has 13 features: pos(3), vel(3), acc(3), target_wp(3), dist(1)
-    feature_names = ['pos_x', 'pos_y', 'pos_z', 
-                     'vel_x', 'vel_y', 'vel_z',
-                     'acc_x', 'acc_y', 'acc_z',
-                     'target_wp_x', 'target_wp_y', 'target_wp_z',
-                     'dist_to_wp']
-    
-    input_seq = sample['input_sequence']
-    for t in range(sequence_length):
-        for i, feature_name in enumerate(feature_names):
-            flattened[f't{t}_{feature_name}'] = input_seq[t, i]
-    
-    # Target features: next position(3) and velocity(3)
-    target = sample['target']
-    flattened['target_pos_x'] = target[0]
-    flattened['target_pos_y'] = target[1]
-    flattened['target_pos_z'] = target[2]
-    flattened['target_vel_x'] = target[3]
-    flattened['target_vel_y'] = target[4]
-    flattened['target_vel_z'] = target[5]
-    
-    return flattened
+    inputs = samples['inputs']
+    if sequence_length is None:
+        sequence_length = inputs.shape[1]
+    elif inputs.shape[1] != sequence_length:
+        raise ValueError(f"Samples hold sequences of length {inputs.shape[1]}, "
+                         f"not {sequence_length}")
+    columns = [f't{t}_{name}' for t in range(sequence_length) for name in FEATURE_NAMES]
+    
+    flattened = np.concatenate([inputs.reshape(len(inputs), len(columns)), samples['targets']], axis=1)
+    return pd.DataFrame(flattened, columns=columns + TARGET_NAMES)
 
 
 def export_dataset_to_csv(data_dir: str = '../data', 
                           output_dir: str = '../data/csv',
-                          sequence_length: int = 10):
+                          sequence_length: int = None):
     """
-    Export dataset from pickle to CSV format
+    Export dataset from sharded .npy files to CSV format
     
     Args:
-        data_dir: Directory containing pickle files
+        data_dir: Directory containing the dataset manifest and shards
         output_dir: Directory to save CSV files
-        sequence_length: Length of input sequences
+        sequence_length: Length of input sequences (default: the manifest's;
+                         other lengths need the 'trajectories' layout)
     """
+    if sequence_length is None:
+        sequence_length = load_manifest(data_dir)['sequence_length']
     os.makedirs(output_dir, exist_ok=True)
     
     # Load and export train data
     print("Exporting training data...")
-    with open(os.path.join(data_dir, 'train_data.pkl'), 'rb') as f:
-        train_samples = pickle.load(f)
+    train_samples = load_split(data_dir, 'train', sequence_length).load_arrays()
     
-    train_flattened = [flatten_sample(s, sequence_length) for s in train_samples]
-    train_df = pd.DataFrame(train_flattened)
+    train_df = flatten_samples(train_samples, sequence_length)
     train_csv_path = os.path.join(output_dir, 'train_data.csv')
     train_df.to_csv(train_csv_path, index=False)
     print(f"  Saved {len(train_df)} samples to {train_csv_path}")
     
     # Load and export validation data
     print("Exporting validation data...")
-    with open(os.path.join(data_dir, 'val_data.pkl'), 'rb') as f:
-        val_samples = pickle.load(f)
+    val_samples = load_split(data_dir, 'val', sequence_length).load_arrays()
     
-    val_flattened = [flatten_sample(s, sequence_length) for s in val_samples]
-    val_df = pd.DataFrame(val_flattened)
+    val_df = flatten_samples(val_samples, sequence_length)
     val_csv_path = os.path.join(output_dir, 'val_data.csv')
     val_df.to_csv(val_csv_path, index=False)
     print(f"  Saved {len(val_df)} samples to {val_csv_path}")
     
     # Load and export test data
     print("Exporting test data...")
-    with open(os.path.join(data_dir, 'test_data.pkl'), 'rb') as f:
-        test_samples = pickle.load(f)
+    test_samples = load_split(data_dir, 'test', sequence_length).load_arrays()
     
-    test_flattened = [flatten_sample(s, sequence_length) for s in test_samples]
-    test_df = pd.DataFrame(test_flattened)
+    test_df = flatten_samples(test_samples, sequence_length)
     test_csv_path = os.path.join(output_dir, 'test_data.csv')
     test_df.to_csv(test_csv_path, index=False)
     print(f"  Saved {len(test_df)} samples to {test_csv_path}")
     
     # Export normalization statistics
     print("Exporting normalization statistics...")
-    with open(os.path.join(data_dir, 'normalization.pkl'), 'rb') as f:
-        normalization = pickle.load(f)
-    
-    norm_data = {
-        'statistic': ['pos_mean_x', 'pos_mean_y', 'pos_mean_z',
-                     'pos_std_x', 'pos_std_y', 'pos_std_z',
-                     'vel_mean_x', 'vel_mean_y', 'vel_mean_z',
-                     'vel_std_x', 'vel_std_y', 'vel_std_z'],
-        'value': list(normalization['pos_mean']) + 
-                list(normalization['pos_std']) +
-                list(normalization['vel_mean']) + 
-                list(normalization['vel_std'])
-    }
-    norm_df = pd.DataFrame(norm_data)
+    normalization = load_manifest(data_dir)['normalization']
+    
+    statistics = []
+    values = []
+    for prefix, names in (('input', FEATURE_NAMES), ('target', TARGET_NAMES)):
+        for stat in ('mean', 'std'):
+            statistics.extend(f'{name}_{stat}' for name in names)
+            values.extend(normalization[f'{prefix}_{stat}'])
+    norm_df = pd.DataFrame({'statistic': statistics, 'value': values})
     norm_csv_path = os.path.join(output_dir, 'normalization.csv')
     norm_df.to_csv(norm_csv_path, index=False)
     print(f"  Saved normalization statistics to {norm_csv_path}")
@@ -192,11 +182,11 @@ def export_trajectories_to_csv(data_dir: str = '../data',
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Export trajectory dataset to CSV')
     parser.add_argument('--data_dir', type=str, default='../data',
-                       help='Directory containing pickle files')
+                       help='Directory containing the dataset')
     parser.add_argument('--output_dir', type=str, default='../data/csv',
                        help='Directory to save CSV files')
-    parser.add_argument('--sequence_length', type=int, default=10,
-                       help='Length of input sequences')
+    parser.add_argument('--sequence_length', type=int, default=None,
+                       help="Length of input sequences (default: the dataset's)")
     parser.add_argument('--export_trajectories', action='store_true',
                        help='Also export raw trajectory data if available')
     
@@ -209,7 +199,7 @@ if __name__ == '__main__':
         exit(1)
     
     # Check if required files exist
-    required_files = ['train_data.pkl', 'val_data.pkl', 'test_data.pkl', 'normalization.pkl']
+    required_files = [MANIFEST_NAME]
     for filename in required_files:
         filepath = os.path.join(args.data_dir, filename)
         if not os.path.exists(filepath):
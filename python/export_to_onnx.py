@@ -3,20 +3,23 @@ Export trained PyTorch model to ONNX format for C++ inference
 """
 import torch
 import numpy as np
-from ml_model import DroneTrajectoryLSTM
+from ml_model import DroneTrajectoryLSTM, FeatureNormalization, NormalizedTrajectoryModel
 import os
 
 
 def export_to_onnx(model_path: str = '../models/best_model.pth',
                    output_path: str = '../models/drone_trajectory.onnx',
-                   sequence_length: int = 10):
+                   sequence_length: int = None):
     """
     Export PyTorch model to ONNX format
     
+    The checkpoint's feature normalization is part of the exported graph:
+    it takes raw features and outputs raw position and velocity.
+    
     Args:
         model_path: Path to trained PyTorch model
         output_path: Path to save ONNX model
-        sequence_length: Input sequence length
+        sequence_length: Input sequence length (default: the checkpoint's)
     """
     print("Loading PyTorch model...")
     
@@ -31,6 +34,14 @@ def export_to_onnx(model_path: str = '../models/best_model.pth',
     
     checkpoint = torch.load(model_path, map_location=device, weights_only=False)
     model.load_state_dict(checkpoint['model_state_dict'])
+    if sequence_length is None:
+        sequence_length = checkpoint.get('sequence_length', 10)
+    
+    if 'normalization' in checkpoint:
+        normalization = FeatureNormalization.from_dict(checkpoint['normalization'])
+    else:
+        normalization = FeatureNormalization.identity()
+    model = NormalizedTrajectoryModel(model, normalization).to(device)
     model.eval()
     
     print(f"Model loaded from {model_path}")
@@ -99,24 +110,23 @@ def export_to_onnx(model_path: str = '../models/best_model.pth',
     else:
         print("⚠ Warning: ONNX model differs from PyTorch model")
     
-    # Save normalization parameters separately
-    normalization = checkpoint['normalization']
+    # The C++ predictor normalizes position and velocity itself; the graph
+    # already does, so give it unit parameters
     normalization_path = output_path.replace('.onnx', '_normalization.txt')
     
     with open(normalization_path, 'w') as f:
         f.write("# Normalization parameters for drone trajectory model\n")
-        f.write("# Format: pos_mean_x pos_mean_y pos_mean_z pos_std_x pos_std_y pos_std_z\n")
-        f.write("# vel_mean_x vel_mean_y vel_mean_z vel_std_x vel_std_y vel_std_z\n\n")
+        f.write("# Feature normalization is built into the ONNX graph, which takes raw\n")
+        f.write("# features and outputs raw position and velocity; these are unit values\n\n")
         
-        pos_mean = normalization['pos_mean']
-        pos_std = normalization['pos_std']
-        vel_mean = normalization['vel_mean']
-        vel_std = normalization['vel_std']
+        f.write("pos_mean: 0 0 0\n")
+        f.write("pos_std: 1 1 1\n")
+        f.write("vel_mean: 0 0 0\n")
+        f.write("vel_std: 1 1 1\n")
         
-        f.write(f"pos_mean: {pos_mean[0]} {pos_mean[1]} {pos_mean[2]}\n")
-        f.write(f"pos_std: {pos_std[0]} {pos_std[1]} {pos_std[2]}\n")
-        f.write(f"vel_mean: {vel_mean[0]} {vel_mean[1]} {vel_mean[2]}\n")
-        f.write(f"vel_std: {vel_std[0]} {vel_std[1]} {vel_std[2]}\n")
+        f.write("\n# Normalization applied inside the graph: x_norm = (x - mean) / (std + 1e-6)\n")
+        for name, values in normalization.to_dict().items():
+            f.write(f"# {name}: {' '.join(str(v) for v in values)}\n")
     
     print(f"\nNormalization parameters saved to {normalization_path}")
     
@@ -134,6 +144,5 @@ if __name__ == '__main__':
     
     export_to_onnx(
         model_path='../models/best_model.pth',
-        output_path='../models/drone_trajectory.onnx',
-        sequence_length=10
+        output_path='../models/drone_trajectory.onnx'
     )
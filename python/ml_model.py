@@ -1,13 +1,92 @@
 """
 LSTM-based trajectory prediction model
 """
-import torch
-import torch.nn as nn
+from __future__ import annotations
+
+import os
 import numpy as np
-from typing import Tuple, List
+from typing import Dict, Hashable, Tuple, List, Sequence, Union
+
+try:
+    import torch
+    import torch.nn as nn
+    _Module = nn.Module
+except ImportError:  # ONNX Runtime deployments: only TrajectoryPredictor(backend='onnx') works
+    torch = nn = None
+    _Module = object
 
 
-class DroneTrajectoryLSTM(nn.Module):
+class FeatureNormalization:
+    """
+    Per-feature normalization of the 13 input features and 6 targets
+    
+    The same object drives training, TrajectoryPredictor and the ONNX export,
+    so all three see identical inputs: x_norm = (x - mean) / (std + eps).
+    """
+    
+    eps = 1e-6
+    
+    def __init__(self, input_mean: np.ndarray, input_std: np.ndarray,
+                 target_mean: np.ndarray, target_std: np.ndarray):
+        self.input_mean = np.asarray(input_mean, dtype=np.float32)
+        self.input_std = np.asarray(input_std, dtype=np.float32)
+        self.target_mean = np.asarray(target_mean, dtype=np.float32)
+        self.target_std = np.asarray(target_std, dtype=np.float32)
+        self.input_scale = self.input_std + np.float32(self.eps)
+    
+    @classmethod
+    def identity(cls) -> 'FeatureNormalization':
+        """Normalization that leaves features unchanged (up to eps)"""
+        return cls(np.zeros(13), np.ones(13), np.zeros(6), np.ones(6))
+    
+    @classmethod
+    def from_dict(cls, norm: Dict) -> 'FeatureNormalization':
+        """
+        Build from a dataset manifest or checkpoint entry
+        
+        Older checkpoints and ONNX exports only carry pos_mean/pos_std/
+        vel_mean/vel_std. Those models were trained on raw features and
+        targets (the old predictor never applied the stored values), so any
+        entry without input_mean maps to identity().
+        """
+        if 'input_mean' not in norm:
+            return cls.identity()
+        return cls(norm['input_mean'], norm['input_std'],
+                   norm['target_mean'], norm['target_std'])
+    
+    def to_dict(self) -> Dict:
+        """Plain lists, suitable for JSON manifests and checkpoints"""
+        return {
+            'input_mean': self.input_mean.tolist(),
+            'input_std': self.input_std.tolist(),
+            'target_mean': self.target_mean.tolist(),
+            'target_std': self.target_std.tolist()
+        }
+    
+    def normalize_inputs(self, x: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+        """
+        Normalize (..., 13) input features
+        
+        Args:
+            x: Raw features
+            out: Optional float32 array of x's shape to write into
+        """
+        if out is None:
+            return ((x - self.input_mean) / (self.input_std + self.eps)).astype(np.float32)
+        np.subtract(x, self.input_mean, out=out)
+        np.divide(out, self.input_scale, out=out)
+        return out
+    
+    def normalize_targets(self, y: np.ndarray) -> np.ndarray:
+        """Normalize (..., 6) position and velocity targets"""
+        return ((y - self.target_mean) / (self.target_std + self.eps)).astype(np.float32)
+    
+    def denormalize_targets(self, y: np.ndarray) -> np.ndarray:
+        """Map (..., 6) model outputs back to position and velocity"""
+        return y * (self.target_std + self.eps) + self.target_mean
+
+
+class DroneTrajectoryLSTM(_Module):
     """
     LSTM model for drone trajectory prediction
     
@@ -79,6 +158,39 @@ class DroneTrajectoryLSTM(nn.Module):
         
         return out, hidden
     
+    def step(self, x: torch.Tensor, hidden: Tuple) -> Tuple[torch.Tensor, Tuple]:
+        """
+        Advance one timestep from a carried hidden state (inference only)
+        
+        Matches forward(x.unsqueeze(1), hidden) in eval mode, but runs the
+        LSTM layers as individual cells. That skips nn.LSTM's per-call setup,
+        which on CPU costs more than the timestep itself.
+        
+        Args:
+            x: Input tensor of shape (batch_size, input_size)
+            hidden: Hidden state tuple (h, c), each (num_layers, batch_size, hidden_size)
+            
+        Returns:
+            output: Predicted next state (batch_size, output_size)
+            hidden: Updated hidden state
+        """
+        h, c = hidden
+        h_out, c_out = [], []
+        layer_input = x
+        for layer in range(self.num_layers):
+            h_layer, c_layer = torch.lstm_cell(
+                layer_input, (h[layer], c[layer]),
+                getattr(self.lstm, f'weight_ih_l{layer}'),
+                getattr(self.lstm, f'weight_hh_l{layer}'),
+                getattr(self.lstm, f'bias_ih_l{layer}'),
+                getattr(self.lstm, f'bias_hh_l{layer}'))
+            h_out.append(h_layer)
+            c_out.append(c_layer)
+            layer_input = h_layer
+        
+        out = self.fc2(self.relu(self.fc1(layer_input)))
+        return out, (torch.stack(h_out), torch.stack(c_out))
+    
     def init_hidden(self, batch_size: int, device: str = 'cpu') -> Tuple:
         """Initialize hidden state"""
         h0 = torch.zeros(self.num_layers, batch_size, self.hidden_size).to(device)
@@ -86,45 +198,203 @@ class DroneTrajectoryLSTM(nn.Module):
         return (h0, c0)
 
 
+class NormalizedTrajectoryModel(_Module):
+    """
+    DroneTrajectoryLSTM with its FeatureNormalization folded in
+    
+    Takes raw (batch, sequence_length, 13) features and returns raw position
+    and velocity, so exported graphs need no separate normalization step.
+    """
+    
+    def __init__(self, model: DroneTrajectoryLSTM, normalization: FeatureNormalization):
+        super().__init__()
+        self.model = model
+        eps = FeatureNormalization.eps
+        self.register_buffer('input_mean', torch.from_numpy(normalization.input_mean))
+        self.register_buffer('input_scale', torch.from_numpy(normalization.input_std + eps))
+        self.register_buffer('target_mean', torch.from_numpy(normalization.target_mean))
+        self.register_buffer('target_scale', torch.from_numpy(normalization.target_std + eps))
+    
+    def forward(self, x: torch.Tensor, hidden: Tuple = None) -> Tuple[torch.Tensor, Tuple]:
+        out, hidden = self.model((x - self.input_mean) / self.input_scale, hidden)
+        return out * self.target_scale + self.target_mean, hidden
+
+
+class FeatureHistory:
+    """
+    Ring buffer of the raw input features of the last sequence_length states
+    
+    Each row is written twice, at i and i + sequence_length, so the window in
+    chronological order is always the contiguous slice
+    data[head:head + sequence_length] and never has to be rolled or copied.
+    The first state pushed fills the whole buffer, which pads a short history
+    with its oldest state like TrajectoryPredictor.prepare_input. Pushing
+    allocates no arrays.
+    """
+    
+    def __init__(self, sequence_length: int):
+        self.sequence_length = sequence_length
+        self.data = np.zeros((2 * sequence_length, 13), dtype=np.float32)
+        self.target_waypoint = np.zeros(3, dtype=np.float32)
+        self.offset = np.zeros(3, dtype=np.float32)
+        self.head = 0
+        self.count = 0
+    
+    def __len__(self) -> int:
+        """Number of real (unpadded) states in the window"""
+        return min(self.count, self.sequence_length)
+    
+    def clear(self):
+        self.head = 0
+        self.count = 0
+    
+    def set_target(self, target_waypoint: np.ndarray):
+        """Recompute the waypoint and distance features of the stored states"""
+        self.target_waypoint[:] = target_waypoint
+        self.data[:, 9:12] = self.target_waypoint
+        self.data[:, 12] = np.linalg.norm(self.data[:, 9:12] - self.data[:, :3], axis=1)
+    
+    def push(self, state: dict):
+        """Append the features of a state (dict or DroneState) against the current target"""
+        row = self.data[self.head]
+        row[0:3] = state['position']
+        row[3:6] = state['velocity']
+        row[6:9] = state['acceleration']
+        row[9:12] = self.target_waypoint
+        np.subtract(self.target_waypoint, row[0:3], out=self.offset)
+        row[12] = np.sqrt(self.offset.dot(self.offset))
+        
+        if self.count == 0:
+            self.data[:] = row
+        else:
+            self.data[self.head + self.sequence_length] = row
+        self.head = (self.head + 1) % self.sequence_length
+        self.count += 1
+    
+    def window(self) -> np.ndarray:
+        """(sequence_length, 13) view of the features, oldest first"""
+        return self.data[self.head:self.head + self.sequence_length]
+    
+    def latest(self) -> np.ndarray:
+        """(13,) view of the newest state's features"""
+        return self.data[self.head + self.sequence_length - 1]
+
+
+class DroneStream:
+    """Streaming inference state of one drone (see TrajectoryPredictor.predict_step)"""
+    
+    def __init__(self, sequence_length: int):
+        self.history = FeatureHistory(sequence_length)
+        self.hidden = None
+        self.steps_since_sync = 0
+
+
 class TrajectoryPredictor:
     """Wrapper class for trajectory prediction"""
     
-    def __init__(self, model_path: str = None, device: str = None):
+    def __init__(self, model_path: str = None, device: str = None,
+                 resync_interval: int = None, backend: str = 'torch',
+                 num_threads: int = None):
         """
         Args:
-            model_path: Path to saved model weights
+            model_path: Path to saved model weights (a .pth checkpoint, or the
+                        exported .onnx file for the ONNX backend)
             device: Device to run on ('cpu' or 'cuda')
+            resync_interval: Streaming steps between full-window re-syncs in
+                             predict_step (default: sequence_length)
+            backend: 'torch', or 'onnx' to run an export_to_onnx.py model with
+                     ONNX Runtime on the CPU. The ONNX backend needs no
+                     PyTorch; it carries no LSTM state, so predict_step runs
+                     the full window on every call and rollout is unavailable.
+            num_threads: ONNX Runtime intra-op threads (default: its own choice)
         """
-        if device is None:
-            self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        else:
-            self.device = device
-            
-        self.model = DroneTrajectoryLSTM().to(self.device)
+        self.backend = backend
         self.sequence_length = 10  # 1 second of history at 100ms intervals
         
-        if model_path:
-            self.load_model(model_path)
+        # Normalization parameters (replaced by the checkpoint's in load_model)
+        self.normalization = FeatureNormalization.identity()
+        
+        if backend == 'onnx':
+            self.device = 'cpu'
+            self.load_onnx_model(model_path, num_threads)
+        elif backend == 'torch':
+            if device is None:
+                self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+            else:
+                self.device = device
+                
+            self.model = DroneTrajectoryLSTM().to(self.device)
             
-        self.model.eval()
+            if model_path:
+                self.load_model(model_path)
+                
+            self.model.eval()
+        else:
+            raise ValueError(f"Unknown inference backend: {backend}")
         
-        # Normalization parameters (will be set during training)
-        self.pos_mean = np.zeros(3)
-        self.pos_std = np.ones(3)
-        self.vel_mean = np.zeros(3)
-        self.vel_std = np.ones(3)
+        self.resync_interval = resync_interval if resync_interval is not None else self.sequence_length
+        self.streams: Dict[Hashable, DroneStream] = {}
+        self._allocate_buffers()
+    
+    def _allocate_buffers(self):
+        """Preallocate the model inputs; the tensors share memory with the arrays"""
+        self.history = FeatureHistory(self.sequence_length)
+        self.raw_buffer = np.zeros((self.sequence_length, 13), dtype=np.float32)
+        self.input_buffer = np.zeros((self.sequence_length, 13), dtype=np.float32)
+        self.step_buffer = np.zeros((1, 13), dtype=np.float32)
+        if self.backend == 'torch':
+            self.input_tensor = torch.from_numpy(self.input_buffer).unsqueeze(0)
+            self.step_tensor = torch.from_numpy(self.step_buffer)
         
     def load_model(self, model_path: str):
         """Load model weights"""
         checkpoint = torch.load(model_path, map_location=self.device, weights_only=False)
         self.model.load_state_dict(checkpoint['model_state_dict'])
+        self.sequence_length = checkpoint.get('sequence_length', self.sequence_length)
+        self._allocate_buffers()
         
         if 'normalization' in checkpoint:
-            norm = checkpoint['normalization']
-            self.pos_mean = norm['pos_mean']
-            self.pos_std = norm['pos_std']
-            self.vel_mean = norm['vel_mean']
-            self.vel_std = norm['vel_std']
+            self.normalization = FeatureNormalization.from_dict(checkpoint['normalization'])
+    
+    def load_onnx_model(self, model_path: str, num_threads: int = None):
+        """
+        Load a model exported by export_to_onnx.py into ONNX Runtime
+        
+        The sequence length comes from the graph's input shape and the
+        normalization from the _normalization.txt written next to it. Current
+        exports normalize inside the graph and write unit values there; older
+        exports were trained on raw features, and their position and velocity
+        statistics are ignored (see FeatureNormalization.from_dict).
+        """
+        from onnx_backend import OnnxTrajectoryModel, load_normalization_file
+        
+        self.model = OnnxTrajectoryModel(model_path, intra_op_threads=num_threads)
+        self.sequence_length = self.model.sequence_length
+        
+        normalization_path = model_path.replace('.onnx', '_normalization.txt')
+        if os.path.exists(normalization_path):
+            self.normalization = FeatureNormalization.from_dict(
+                load_normalization_file(normalization_path))
+        self._allocate_buffers()
+    
+    def state_features(self, state: dict, target_waypoint: np.ndarray) -> np.ndarray:
+        """Normalized (13,) input features of one state"""
+        pos = state['position']
+        vel = state['velocity']
+        acc = state['acceleration']
+        
+        # Calculate distance to waypoint
+        dist = np.linalg.norm(target_waypoint - pos)
+        
+        # Combine features
+        feature = np.concatenate([
+            pos,
+            vel,
+            acc,
+            target_waypoint,
+            [dist]
+        ])
+        return self.normalization.normalize_inputs(feature)
     
     def prepare_input(self, history: List[dict], target_waypoint: np.ndarray) -> torch.Tensor:
         """
@@ -132,45 +402,250 @@ class TrajectoryPredictor:
         
         Args:
             history: List of state dicts with 'position', 'velocity', 'acceleration'
+                     (DroneState objects can be passed directly)
             target_waypoint: Current target waypoint
             
         Returns:
-            Input tensor of shape (1, sequence_length, input_size)
+            Input tensor of shape (1, sequence_length, input_size). On the
+            CPU it shares memory with input_buffer, so it is only valid
+            until the next call.
+        """
+        # Take last sequence_length frames, right-aligned in the buffer
+        history = history[-self.sequence_length:]
+        first = self.sequence_length - len(history)
+        raw = self.raw_buffer
+        raw[first:, 0:3] = [state['position'] for state in history]
+        raw[first:, 3:6] = [state['velocity'] for state in history]
+        raw[first:, 6:9] = [state['acceleration'] for state in history]
+        raw[first:, 9:12] = target_waypoint
+        raw[first:, 12] = np.linalg.norm(raw[first:, 9:12] - raw[first:, 0:3], axis=1)
+        
+        # Pad with the oldest state if necessary
+        raw[:first] = raw[first]
+        return self._window_input(raw)
+    
+    def _window_input(self, window: np.ndarray) -> torch.Tensor:
+        """Normalize a (sequence_length, 13) raw window into the model input"""
+        self.normalization.normalize_inputs(window, out=self.input_buffer)
+        if self.backend == 'onnx':
+            return self.input_buffer[None]
+        return self.input_tensor.to(self.device)
+    
+    def _forward(self, x: torch.Tensor) -> np.ndarray:
+        """(N, 6) normalized model outputs for prepared input windows"""
+        if self.backend == 'onnx':
+            return self.model.run(x)
+        with torch.no_grad():
+            output, _ = self.model(x)
+        return output.cpu().numpy()
+    
+    def push_state(self, state: dict):
+        """
+        Append the newest state to the predictor's own history buffer
+        
+        Together with predict_latest() this replaces building a history list
+        on every call: each state is featurized once, in place.
+        """
+        self.history.push(state)
+    
+    def latest_input(self, target_waypoint: np.ndarray) -> torch.Tensor:
+        """
+        Model input for the states given to push_state()
+        
+        Same result as prepare_input() on the last sequence_length pushed
+        states, computed from the ring buffer without allocating.
+        """
+        # The history stores the target at float32; compare at that precision
+        target_waypoint = np.asarray(target_waypoint, dtype=np.float32)
+        if not np.array_equal(target_waypoint, self.history.target_waypoint):
+            self.history.set_target(target_waypoint)
+        return self._window_input(self.history.window())
+    
+    def predict_latest(self, target_waypoint: np.ndarray) -> dict:
+        """Predict the next state from the states given to push_state()"""
+        return self._predict_input(self.latest_input(target_waypoint))
+    
+    def prepare_batch(self, histories: Union[np.ndarray, Sequence], target_waypoints: np.ndarray,
+                      lengths: np.ndarray = None) -> torch.Tensor:
+        """
+        Prepare the input windows of several drones at once
+        
+        Args:
+            histories: One of
+                - array (N, T, >=9) of position, velocity and acceleration
+                  per timestep, oldest first (further columns are ignored)
+                - list of N FeatureHistory buffers
+                - list of N state lists, as taken by predict(); they may
+                  differ in length
+            target_waypoints: (N, 3) current target waypoint of each drone
+            lengths: For arrays, the number of valid leading timesteps of
+                     each drone (default: all T)
+            
+        Returns:
+            Input tensor of shape (N, sequence_length, input_size). Drones
+            with fewer than sequence_length states are padded with their
+            oldest state, exactly as in prepare_input().
         """
-        features = []
+        raw = self._raw_batch(histories, target_waypoints, lengths)
+        x = self.normalization.normalize_inputs(raw, out=raw)
+        if self.backend == 'onnx':
+            return x
+        return torch.from_numpy(x).to(self.device)
+    
+    def _raw_batch(self, histories: Union[np.ndarray, Sequence], target_waypoints: np.ndarray,
+                   lengths: np.ndarray = None) -> np.ndarray:
+        """Unnormalized (N, sequence_length, 13) windows for prepare_batch"""
+        window = self.sequence_length
+        target_waypoints = np.asarray(target_waypoints, dtype=np.float32).reshape(-1, 3)
         
-        for state in history:
-            pos = state['position']
-            vel = state['velocity']
-            acc = state['acceleration']
+        if len(histories) and isinstance(histories[0], FeatureHistory):
+            raw = np.stack([history.window() for history in histories])
+        else:
+            if not isinstance(histories, np.ndarray):
+                histories = [history[-window:] for history in histories]
+                lengths = np.array([len(history) for history in histories])
+                states = np.zeros((len(histories), lengths.max(), 9), dtype=np.float32)
+                for i, history in enumerate(histories):
+                    states[i, :lengths[i], 0:3] = [state['position'] for state in history]
+                    states[i, :lengths[i], 3:6] = [state['velocity'] for state in history]
+                    states[i, :lengths[i], 6:9] = [state['acceleration'] for state in history]
+                histories = states
+            num_drones, num_steps = histories.shape[:2]
+            if lengths is None:
+                lengths = np.full(num_drones, num_steps)
             
-            # Normalize
-            pos_norm = (pos - self.pos_mean) / (self.pos_std + 1e-6)
-            vel_norm = (vel - self.vel_mean) / (self.vel_std + 1e-6)
+            # Right-align the last valid states; earlier slots repeat the oldest
+            source = np.clip(np.asarray(lengths)[:, None] - window + np.arange(window), 0, None)
+            raw = np.empty((num_drones, window, 13), dtype=np.float32)
+            raw[:, :, :9] = np.take_along_axis(histories[:, :, :9], source[:, :, None], axis=1)
+        
+        raw[:, :, 9:12] = target_waypoints[:, None, :]
+        raw[:, :, 12] = np.linalg.norm(raw[:, :, 9:12] - raw[:, :, 0:3], axis=2)
+        return raw
+    
+    def predict_batch(self, histories: Union[np.ndarray, Sequence], target_waypoints: np.ndarray,
+                      lengths: np.ndarray = None) -> dict:
+        """
+        Predict the next state of several drones in one forward pass
+        
+        Args:
+            histories: Recent states per drone (see prepare_batch)
+            target_waypoints: (N, 3) current target waypoint of each drone
+            lengths: Valid timesteps per drone for array histories
             
-            # Calculate distance to waypoint
-            dist = np.linalg.norm(target_waypoint - pos)
+        Returns:
+            Dict with (N, 3) 'position' and 'velocity' predictions
+        """
+        x = self.prepare_batch(histories, target_waypoints, lengths)
+        prediction = self.normalization.denormalize_targets(self._forward(x))
+        return {
+            'position': prediction[:, :3],
+            'velocity': prediction[:, 3:6]
+        }
+    
+    def rollout(self, histories: Union[np.ndarray, Sequence], waypoints: np.ndarray,
+                horizon: int, waypoint_indices: np.ndarray = None, lengths: np.ndarray = None,
+                dt: float = 0.1, arrival_radius: float = 0.5) -> dict:
+        """
+        Predict the next horizon states by feeding predictions back in
+        
+        The history windows run through the LSTM once. Every later step feeds
+        one predicted state with the carried (h, c) state
+        (DroneTrajectoryLSTM.step), so a rollout costs one window plus
+        horizon - 1 single steps for the whole batch. The derived features of
+        each predicted state follow TrajectoryGenerator.generate:
+        acceleration is the finite difference of velocity over dt, and a
+        drone moves on to its next waypoint once the state it steps from is
+        within arrival_radius of the current one (staying on the last).
+        All of this runs as tensor ops over the batch.
+        
+        Args:
+            histories: Recent states per drone (see prepare_batch), or a
+                       single drone's state list when waypoints is (W, 3)
+            waypoints: (N, W, 3) remaining waypoints of each drone; pad
+                       shorter routes by repeating their last waypoint
+            horizon: Number of future states to predict
+            waypoint_indices: (N,) index of each drone's current target
+                              waypoint (default: 0)
+            lengths: Valid timesteps per drone for array histories
+            dt: Time between states in seconds
+            arrival_radius: Distance at which a waypoint counts as reached
             
-            # Combine features
-            feature = np.concatenate([
-                pos_norm,
-                vel_norm,
-                acc,
-                target_waypoint,
-                [dist]
-            ])
-            features.append(feature)
-        
-        # Pad if necessary
-        while len(features) < self.sequence_length:
-            features.insert(0, features[0])
-        
-        # Take last sequence_length frames
-        features = features[-self.sequence_length:]
-        
-        # Convert to tensor
-        x = torch.FloatTensor(features).unsqueeze(0).to(self.device)
-        return x
+        Returns:
+            Dict with (N, horizon, 3) 'positions', 'velocities' and
+            'accelerations' and (N, horizon) 'waypoint_indices', the target
+            waypoint of each predicted step (without the N axis for a
+            single drone)
+        """
+        if self.backend != 'torch':
+            raise NotImplementedError("rollout needs the PyTorch backend: the exported "
+                                      "ONNX graph takes no LSTM state")
+        waypoints = np.asarray(waypoints, dtype=np.float32)
+        single = waypoints.ndim == 2
+        if single:
+            histories = [histories]
+            waypoints = waypoints[None]
+        num_drones, num_waypoints = waypoints.shape[:2]
+        if waypoint_indices is None:
+            waypoint_indices = np.zeros(num_drones, dtype=np.int64)
+        
+        device = self.device
+        drones = torch.arange(num_drones, device=device)
+        route = torch.from_numpy(waypoints).to(device)
+        index = torch.as_tensor(waypoint_indices, dtype=torch.long, device=device)
+        input_mean = torch.from_numpy(self.normalization.input_mean).to(device)
+        input_scale = torch.from_numpy(self.normalization.input_scale).to(device)
+        target_mean = torch.from_numpy(self.normalization.target_mean).to(device)
+        target_scale = torch.from_numpy(
+            self.normalization.target_std + np.float32(FeatureNormalization.eps)).to(device)
+        
+        raw = self._raw_batch(histories, waypoints[np.arange(num_drones), waypoint_indices],
+                              lengths)
+        raw = torch.from_numpy(raw).to(device)
+        position, velocity = raw[:, -1, 0:3], raw[:, -1, 3:6]
+        
+        positions = torch.empty(num_drones, horizon, 3, device=device)
+        velocities = torch.empty(num_drones, horizon, 3, device=device)
+        accelerations = torch.empty(num_drones, horizon, 3, device=device)
+        indices = torch.empty(num_drones, horizon, dtype=torch.long, device=device)
+        features = torch.empty(num_drones, 13, device=device)
+        
+        with torch.no_grad():
+            output, hidden = self.model((raw - input_mean) / input_scale)
+            target = route[drones, index]
+            for step in range(horizon):
+                # Waypoint switch checked on the state the step starts from
+                arrived = (target - position).norm(dim=1) < arrival_radius
+                index = torch.clamp(index + arrived.long(), max=num_waypoints - 1)
+                target = route[drones, index]
+                
+                if step > 0:
+                    output, hidden = self.model.step((features - input_mean) / input_scale, hidden)
+                prediction = output * target_scale + target_mean
+                acceleration = (prediction[:, 3:6] - velocity) / dt
+                position, velocity = prediction[:, 0:3], prediction[:, 3:6]
+                
+                positions[:, step] = position
+                velocities[:, step] = velocity
+                accelerations[:, step] = acceleration
+                indices[:, step] = index
+                
+                # Input features of the predicted state
+                features[:, 0:3] = position
+                features[:, 3:6] = velocity
+                features[:, 6:9] = acceleration
+                features[:, 9:12] = target
+                features[:, 12] = (target - position).norm(dim=1)
+        
+        result = {
+            'positions': positions.cpu().numpy(),
+            'velocities': velocities.cpu().numpy(),
+            'accelerations': accelerations.cpu().numpy(),
+            'waypoint_indices': indices.cpu().numpy()
+        }
+        if single:
+            result = {key: value[0] for key, value in result.items()}
+        return result
     
     def predict(self, history: List[dict], target_waypoint: np.ndarray) -> dict:
         """
@@ -183,16 +658,79 @@ class TrajectoryPredictor:
         Returns:
             Dict with 'position' and 'velocity' predictions
         """
+        return self._predict_input(self.prepare_input(history, target_waypoint))
+    
+    def _predict_input(self, x: torch.Tensor) -> dict:
+        """Run the model from a zero state on a prepared input window"""
+        output = self._forward(x)[0]
+        
+        # Denormalize
+        prediction = self.normalization.denormalize_targets(output)
+        
+        return {
+            'position': prediction[:3],
+            'velocity': prediction[3:6]
+        }
+    
+    def predict_step(self, state: dict, target_waypoint: np.ndarray, drone_id: Hashable = 0) -> dict:
+        """
+        Predict the next state from the newest state only (streaming mode)
+        
+        Keeps the LSTM (h, c) state of each drone between calls, so a call
+        runs one timestep (DroneTrajectoryLSTM.step) instead of the whole
+        window. Every resync_interval steps, and whenever the target waypoint
+        changes, the state is rebuilt from the last sequence_length states
+        exactly as predict() would, which bounds the drift of the carried
+        state from the windowed input the model was trained on. Until the
+        window is full every call re-syncs, matching predict() on the padded
+        history.
+        
+        Args:
+            state: Newest state dict with 'position', 'velocity', 'acceleration'
+            target_waypoint: Current target waypoint
+            drone_id: Key of the drone's stream
+            
+        Returns:
+            Dict with 'position' and 'velocity' predictions
+        """
+        stream = self.streams.get(drone_id)
+        if stream is None:
+            stream = self.streams[drone_id] = DroneStream(self.sequence_length)
+        history = stream.history
+        
+        target_waypoint = np.asarray(target_waypoint, dtype=np.float32)
+        waypoint_changed = not np.array_equal(target_waypoint, history.target_waypoint)
+        if waypoint_changed:
+            history.set_target(target_waypoint)
+        resync = (waypoint_changed
+                  or len(history) < self.sequence_length
+                  or stream.steps_since_sync >= self.resync_interval)
+        history.push(state)
+        
+        if self.backend == 'onnx':
+            return self._predict_input(self._window_input(history.window()))
+        
         with torch.no_grad():
-            x = self.prepare_input(history, target_waypoint)
-            output, _ = self.model(x)
+            if resync:
+                x = self._window_input(history.window())
+                output, stream.hidden = self.model(x)
+                stream.steps_since_sync = 0
+            else:
+                self.normalization.normalize_inputs(history.latest(), out=self.step_buffer[0])
+                x = self.step_tensor.to(self.device)
+                output, stream.hidden = self.model.step(x, stream.hidden)
+                stream.steps_since_sync += 1
             output = output.cpu().numpy()[0]
-            
-            # Denormalize
-            pred_pos = output[:3] * (self.pos_std + 1e-6) + self.pos_mean
-            pred_vel = output[3:6] * (self.vel_std + 1e-6) + self.vel_mean
-            
-            return {
-                'position': pred_pos,
-                'velocity': pred_vel
-            }
+        
+        prediction = self.normalization.denormalize_targets(output)
+        return {
+            'position': prediction[:3],
+            'velocity': prediction[3:6]
+        }
+    
+    def reset_stream(self, drone_id: Hashable = None):
+        """Forget the streaming state of one drone (default: all drones)"""
+        if drone_id is None:
+            self.streams.clear()
+        else:
+            self.streams.pop(drone_id, None)
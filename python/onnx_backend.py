@@ -0,0 +1,107 @@
+"""
+ONNX Runtime execution of the exported trajectory model
+
+Only needs numpy and onnxruntime, so it runs on machines without PyTorch.
+"""
+import numpy as np
+import onnxruntime as ort
+from typing import Dict, List
+
+
+def load_normalization_file(path: str) -> Dict[str, List[float]]:
+    """
+    Read the normalization parameters written next to an ONNX export
+
+    Args:
+        path: The export's _normalization.txt ('key: values' lines; '#'
+              comments and blank lines are skipped)
+
+    Returns:
+        Dict of parameter name to values, e.g. pos_mean, pos_std, vel_mean,
+        vel_std (see FeatureNormalization.from_dict)
+    """
+    params = {}
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            name, values = line.split(':', 1)
+            params[name.strip()] = [float(v) for v in values.split()]
+    return params
+
+
+class OnnxTrajectoryModel:
+    """
+    ONNX Runtime session for the exported DroneTrajectoryLSTM
+
+    The session runs sequentially with full graph optimization. Inputs
+    and outputs go through IO binding. Outputs are written into buffers
+    preallocated per batch size, so a call allocates nothing once a batch
+    size has been seen. The returned array is one of those buffers and is
+    overwritten by the next call with the same batch size.
+    """
+
+    max_cached_batch_sizes = 16
+
+    def __init__(self, model_path: str, intra_op_threads: int = None,
+                 inter_op_threads: int = 1):
+        """
+        Args:
+            model_path: Exported .onnx file (see export_to_onnx.py)
+            intra_op_threads: Threads per operator (default: ONNX Runtime's choice)
+            inter_op_threads: Threads across operators (sequential execution
+                              uses one)
+        """
+        options = ort.SessionOptions()
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads is not None:
+            options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        self.session = ort.InferenceSession(model_path, options,
+                                            providers=['CPUExecutionProvider'])
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.sequence_length = model_input.shape[1]
+        self.input_size = model_input.shape[2]
+        self.outputs = self.session.get_outputs()
+
+        self.binding = self.session.io_binding()
+        self.output_buffers = {}
+        self.bound_batch_size = None
+
+    def _bind_outputs(self, batch_size: int) -> List[np.ndarray]:
+        buffers = self.output_buffers.get(batch_size)
+        if buffers is None:
+            if len(self.output_buffers) >= self.max_cached_batch_sizes:
+                self.output_buffers.clear()
+            # The symbolic dimensions of every output are the batch size
+            buffers = [np.empty([d if isinstance(d, int) else batch_size for d in output.shape],
+                                dtype=np.float32)
+                       for output in self.outputs]
+            self.output_buffers[batch_size] = buffers
+            self.bound_batch_size = None
+        if batch_size != self.bound_batch_size:
+            for output, buffer in zip(self.outputs, buffers):
+                self.binding.bind_output(output.name, 'cpu', 0, np.float32,
+                                         buffer.shape, buffer.ctypes.data)
+            self.bound_batch_size = batch_size
+        return buffers
+
+    def run(self, x: np.ndarray) -> np.ndarray:
+        """
+        Run the graph on a batch of input windows
+
+        Args:
+            x: (N, sequence_length, 13) float32 input features
+
+        Returns:
+            (N, 6) outputs, valid until the next call with the same N
+        """
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        self.binding.bind_input(self.input_name, 'cpu', 0, np.float32, x.shape, x.ctypes.data)
+        buffers = self._bind_outputs(len(x))
+        self.session.run_with_iobinding(self.binding)
+        return buffers[0]
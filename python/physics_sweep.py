@@ -0,0 +1,272 @@
+"""
+Process-parallel Monte Carlo sweeps of drone physics parameters over a mission set
+"""
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import time
+import numpy as np
+from typing import Dict, List, Tuple
+from tqdm import tqdm
+from trajectory_generator import TrajectoryGenerator, DronePhysics
+
+
+PHYSICS_PARAMETERS = ('max_speed', 'max_acceleration', 'max_vertical_speed', 'drag_coefficient')
+
+# Warm generator reused by every task that runs in a worker process
+_worker_generator = None
+_default_physics = DronePhysics()
+
+
+def parameter_grid(grid: Dict[str, List[float]]) -> List[Dict]:
+    """
+    Expand a parameter grid into a list of parameter sets
+
+    Args:
+        grid: Dict mapping DronePhysics parameter names to candidate values
+
+    Returns:
+        List of dicts, one per combination
+    """
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def sample_parameters(ranges: Dict[str, Tuple[float, float]], num_samples: int,
+                      seed: int = 0) -> List[Dict]:
+    """
+    Draw parameter sets uniformly from ranges
+
+    Args:
+        ranges: Dict mapping DronePhysics parameter names to (low, high)
+        num_samples: Number of parameter sets
+        seed: Random seed
+
+    Returns:
+        List of parameter dicts
+    """
+    rng = np.random.default_rng(seed)
+    samples = {name: rng.uniform(low, high, num_samples) for name, (low, high) in ranges.items()}
+    return [{name: float(values[i]) for name, values in samples.items()}
+            for i in range(num_samples)]
+
+
+def random_missions(num_missions: int, seed: int = 0, area_size: float = 50.0) -> List[Dict]:
+    """
+    Create random missions in the same style as data_generator
+
+    Returns:
+        List of dicts with 'initial_position', 'initial_velocity' and 'waypoints'
+    """
+    rng = np.random.default_rng(seed)
+    missions = []
+    for _ in range(num_missions):
+        num_waypoints = rng.integers(3, 8)
+        waypoints = np.column_stack([
+            rng.uniform(-area_size, area_size, num_waypoints),
+            rng.uniform(-area_size, area_size, num_waypoints),
+            rng.uniform(2.0, 20.0, num_waypoints)
+        ])
+        missions.append({
+            'initial_position': [rng.uniform(-5, 5), rng.uniform(-5, 5), rng.uniform(2, 5)],
+            'initial_velocity': rng.uniform(-2, 2, 3).tolist(),
+            'waypoints': [{'position': wp.tolist(), 'speed': 10.0} for wp in waypoints]
+        })
+    return missions
+
+
+def trajectory_metrics(trajectory: Dict) -> Dict:
+    """
+    Summary metrics of one generated trajectory
+
+    Returns:
+        Dict with completion flag, time to complete, peak acceleration and speed,
+        and arrival errors (closest approach to each waypoint)
+    """
+    positions = trajectory['positions']
+    waypoints = trajectory['waypoints'].reshape(-1, 3)
+
+    # Closest approach of the whole path to every waypoint
+    distances = np.linalg.norm(positions[:, None, :] - waypoints[None, :, :], axis=2)
+    arrival_errors = distances.min(axis=0)
+
+    completed = bool(len(waypoints) > 0 and np.linalg.norm(positions[-1] - waypoints[-1]) < 0.5)
+    return {
+        'completed': completed,
+        'time_to_complete': float(trajectory['times'][-1]) if completed else None,
+        'max_acceleration': float(np.linalg.norm(trajectory['accelerations'], axis=1).max()),
+        'max_speed': float(np.linalg.norm(trajectory['velocities'], axis=1).max()),
+        'mean_arrival_error': float(arrival_errors.mean()) if len(waypoints) else 0.0,
+        'max_arrival_error': float(arrival_errors.max()) if len(waypoints) else 0.0,
+        'num_steps': int(len(positions))
+    }
+
+
+def _init_worker(dt: float):
+    """Create the warm generator once per worker process"""
+    global _worker_generator
+    _worker_generator = TrajectoryGenerator(dt=dt)
+
+
+def _run_task(task: Tuple) -> Dict:
+    """Run one (parameter set, mission) pair on the worker's generator"""
+    task_id, params, mission_index, mission, seed, perturbation, max_time = task
+
+    generator = _worker_generator
+    for name in PHYSICS_PARAMETERS:
+        setattr(generator.physics, name, params.get(name, getattr(_default_physics, name)))
+
+    initial_position = np.array(mission['initial_position'], dtype=np.float64)
+    initial_velocity = np.array(mission['initial_velocity'], dtype=np.float64)
+    if perturbation > 0:
+        rng = np.random.default_rng(seed)
+        initial_position += rng.normal(0, perturbation, 3)
+        initial_velocity += rng.normal(0, perturbation, 3)
+
+    start = time.perf_counter()
+    trajectory = generator.generate(initial_position, initial_velocity,
+                                    mission['waypoints'], max_time)
+    elapsed = time.perf_counter() - start
+
+    record = {
+        'task_id': task_id,
+        'mission': mission_index,
+        'seed': seed,
+        'params': params
+    }
+    record.update(trajectory_metrics(trajectory))
+    record['generate_seconds'] = elapsed
+    return record
+
+
+def run_sweep(parameter_sets: List[Dict], missions: List[Dict],
+              output_path: str = '../data/sweep_results.jsonl',
+              num_workers: int = None, seed: int = 0, perturbation: float = 0.0,
+              dt: float = 0.1, max_time: float = 60.0, chunksize: int = 16) -> Dict:
+    """
+    Run every mission under every parameter set and stream metrics to a file
+
+    Each (parameter set, mission) task gets its own seed spawned from a master
+    SeedSequence, so results do not depend on the number of workers or on
+    which worker runs a task. Results are written as JSON lines as soon as
+    they arrive, in completion order.
+
+    Args:
+        parameter_sets: List of DronePhysics parameter dicts
+        missions: List of mission dicts (see random_missions)
+        output_path: JSON lines results file
+        num_workers: Worker processes (default: all CPUs, 0 runs in-process)
+        seed: Master seed for per-task seeds
+        perturbation: Std of Gaussian noise added to each task's initial state
+        dt: Time step in seconds
+        max_time: Maximum simulation time per mission in seconds
+        chunksize: Tasks sent to a worker at a time
+
+    Returns:
+        Sweep summary
+    """
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    num_tasks = len(parameter_sets) * len(missions)
+    task_seeds = [int(child.generate_state(1)[0])
+                  for child in np.random.SeedSequence(seed).spawn(num_tasks)]
+    tasks = (
+        (task_id, params, mission_index, missions[mission_index],
+         task_seeds[task_id], perturbation, max_time)
+        for task_id, (params, mission_index) in enumerate(
+            itertools.product(parameter_sets, range(len(missions))))
+    )
+
+    print(f"Running {num_tasks} tasks on {max(num_workers, 1)} process(es)...")
+    start = time.perf_counter()
+    num_completed = 0
+
+    with open(output_path, 'w') as f:
+        if num_workers == 0:
+            _init_worker(dt)
+            results = map(_run_task, tasks)
+            pool = None
+        else:
+            pool = mp.Pool(num_workers, initializer=_init_worker, initargs=(dt,))
+            results = pool.imap_unordered(_run_task, tasks, chunksize=chunksize)
+
+        try:
+            for record in tqdm(results, total=num_tasks):
+                f.write(json.dumps(record) + '\n')
+                num_completed += record['completed']
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        'num_tasks': num_tasks,
+        'completed_fraction': num_completed / num_tasks if num_tasks else 0.0,
+        'elapsed_seconds': elapsed,
+        'tasks_per_second': num_tasks / elapsed if elapsed > 0 else 0.0,
+        'output_path': output_path
+    }
+
+    print(f"\nSweep complete!")
+    print(f"Results saved to: {output_path}")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monte Carlo sweep over drone physics parameters')
+    parser.add_argument('--max_speed', type=float, nargs='+', default=[15.0],
+                       help='Candidate maximum speeds (m/s)')
+    parser.add_argument('--max_acceleration', type=float, nargs='+', default=[5.0],
+                       help='Candidate maximum accelerations (m/s^2)')
+    parser.add_argument('--max_vertical_speed', type=float, nargs='+', default=[5.0],
+                       help='Candidate maximum vertical speeds (m/s)')
+    parser.add_argument('--drag_coefficient', type=float, nargs='+', default=[0.1],
+                       help='Candidate drag coefficients')
+    parser.add_argument('--num_samples', type=int, default=0,
+                       help='Sample this many parameter sets uniformly between the min and '
+                            'max of each candidate list instead of using the full grid')
+    parser.add_argument('--missions', type=str, default=None,
+                       help='JSON file with a list of missions (default: random missions)')
+    parser.add_argument('--num_missions', type=int, default=20,
+                       help='Number of random missions when --missions is not given')
+    parser.add_argument('--output', type=str, default='../data/sweep_results.jsonl',
+                       help='JSON lines results file')
+    parser.add_argument('--num_workers', type=int, default=None,
+                       help='Worker processes (default: all CPUs, 0 runs in-process)')
+    parser.add_argument('--seed', type=int, default=0,
+                       help='Master random seed')
+    parser.add_argument('--perturbation', type=float, default=0.0,
+                       help='Std of noise added to each task\'s initial state')
+    parser.add_argument('--max_time', type=float, default=60.0,
+                       help='Maximum simulation time per mission (s)')
+
+    args = parser.parse_args()
+
+    candidates = {name: getattr(args, name) for name in PHYSICS_PARAMETERS}
+    if args.num_samples > 0:
+        parameter_sets = sample_parameters(
+            {name: (min(values), max(values)) for name, values in candidates.items()},
+            args.num_samples, args.seed
+        )
+    else:
+        parameter_sets = parameter_grid(candidates)
+
+    if args.missions:
+        with open(args.missions, 'r') as f:
+            missions = json.load(f)
+    else:
+        missions = random_missions(args.num_missions, args.seed)
+
+    summary = run_sweep(parameter_sets, missions, args.output,
+                        num_workers=args.num_workers, seed=args.seed,
+                        perturbation=args.perturbation, max_time=args.max_time)
+    print(f"\nSweep summary:")
+    for key, value in summary.items():
+        print(f"  {key}: {value}")
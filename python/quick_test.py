@@ -128,21 +128,19 @@ def test_data_format():
     """Test data generation format"""
     print("\nTesting data format...")
     
-    if not os.path.exists('../data/train_data.pkl'):
+    if not os.path.exists('../data/manifest.json'):
         print("  ⚠ Training data not found - run data_generator.py first")
         return
     
-    import pickle
+    from dataset_shards import load_split
     
-    with open('../data/train_data.pkl', 'rb') as f:
-        train_samples = pickle.load(f)
+    train_samples = load_split('../data', 'train')
     
-    print(f"  ✓ Loaded {len(train_samples)} training samples")
+    print(f"  ✓ Opened {len(train_samples)} training samples")
     
     # Check sample format
-    sample = train_samples[0]
-    print(f"  ✓ Input shape: {sample['input_sequence'].shape}")
-    print(f"  ✓ Target shape: {sample['target'].shape}")
+    print(f"  ✓ Input shape: {train_samples.input_shape}")
+    print(f"  ✓ Target shape: {train_samples.target_shape}")
     print(f"    Expected input: (10, 13) [sequence_length, features]")
     print(f"    Expected target: (6,) [position + velocity]")
 
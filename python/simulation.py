@@ -16,6 +16,7 @@ import pyqtgraph as pg
 import pyqtgraph.opengl as gl
 import cv2
 from trajectory_generator import TrajectoryGenerator
+from trajectory_cache import TrajectoryCache
 from ml_model import TrajectoryPredictor
 from trajectory_storage import TrajectoryStorage
 from trajectory_templates import TrajectoryTemplates
@@ -895,6 +896,7 @@ class DroneSimulationWindow(QMainWindow):
         
         # Initialize components
         self.trajectory_generator = TrajectoryGenerator(dt=0.1)
+        self.trajectory_cache = TrajectoryCache()  # Reuses trajectories for repeated waypoint sets
         self.trajectory_storage = TrajectoryStorage()  # For saving/loading trajectories
         # Camera disabled - uncomment below to re-enable
         # self.camera_sim = CameraSimulator()
@@ -3361,9 +3363,9 @@ class DroneSimulationWindow(QMainWindow):
         initial_pos = np.array([0, 0, 5])
         initial_vel = np.array([0, 0, 0])
         
-        # Generate trajectory
-        self.current_trajectory = self.trajectory_generator.generate(
-            initial_pos, initial_vel, self.user_waypoints.copy()
+        # Generate trajectory (templates, loaded files and repeated clicks hit the cache)
+        self.current_trajectory = self.trajectory_cache.generate(
+            self.trajectory_generator, initial_pos, initial_vel, self.user_waypoints.copy()
         )
         
         # Reset visited waypoints for new trajectory
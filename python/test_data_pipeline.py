@@ -0,0 +1,372 @@
+"""
+Test script for training data generation
+"""
+import numpy as np
+import os
+import sys
+import tempfile
+from trajectory_generator import TrajectoryGenerator
+from data_generator import featurize_trajectory, create_training_sequences, generate_dataset
+from dataset_shards import (ShardWriter, TrajectoryShardWriter, RunningStats, load_manifest,
+                            load_split, write_manifest)
+
+
+def reference_sequences(trajectory, sequence_length):
+    """Per-sample reference implementation of create_training_sequences"""
+    positions = trajectory['positions']
+    waypoints = trajectory['waypoints']
+    inputs, targets = [], []
+    for i in range(sequence_length, len(positions)):
+        window = []
+        for j in range(i - sequence_length, i):
+            target_wp = waypoints[min(trajectory['waypoint_indices'][j], len(waypoints) - 1)]
+            window.append(np.concatenate([
+                positions[j], trajectory['velocities'][j], trajectory['accelerations'][j],
+                target_wp, [np.linalg.norm(positions[j] - target_wp)]
+            ]))
+        inputs.append(np.array(window, dtype=np.float32))
+        targets.append(np.concatenate([positions[i], trajectory['velocities'][i]]).astype(np.float32))
+    return np.array(inputs), np.array(targets)
+
+
+def sample_trajectory(max_time=60.0):
+    """Generate a short mission"""
+    generator = TrajectoryGenerator(dt=0.1)
+    waypoints = [np.array([10, 10, 10]), np.array([20, 5, 15]), np.array([30, 20, 12])]
+    return generator.generate(np.array([0, 0, 5]), np.array([1, 0, 0]), waypoints, max_time)
+
+
+def test_create_training_sequences():
+    """Test vectorized window construction against the per-sample loop"""
+    print("=" * 60)
+    print("TEST: Vectorized Training Sequences")
+    print("=" * 60)
+
+    trajectory = sample_trajectory()
+    features = featurize_trajectory(trajectory)
+    assert features.shape == (len(trajectory['positions']), 13)
+    assert features.dtype == np.float32
+    print(f"✓ Featurized {features.shape[0]} timesteps once")
+
+    inputs, targets = create_training_sequences(trajectory, sequence_length=10)
+    expected_inputs, expected_targets = reference_sequences(trajectory, 10)
+    assert inputs.shape == expected_inputs.shape and targets.shape == expected_targets.shape
+    assert np.array_equal(inputs, expected_inputs)
+    assert np.array_equal(targets, expected_targets)
+    print(f"✓ {len(inputs)} windows identical to the per-sample loop")
+
+    # Windows are views into one feature array
+    assert inputs.base is not None and not inputs.flags['OWNDATA']
+    assert np.shares_memory(inputs[0], inputs[1])
+    print("✓ Windows are strided views, not copies")
+
+    # Trajectories shorter than the window produce no samples
+    short = sample_trajectory(max_time=0.5)
+    inputs, targets = create_training_sequences(short, sequence_length=10)
+    assert inputs.shape == (0, 10, 13) and targets.shape == (0, 6)
+    print("✓ Short trajectory yields empty arrays")
+    print()
+
+
+def test_generate_dataset_worker_invariance():
+    """Test that the dataset does not depend on the number of workers"""
+    print("=" * 60)
+    print("TEST: Deterministic Multi-Process Generation")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as serial_dir, \
+            tempfile.TemporaryDirectory() as parallel_dir:
+        generate_dataset(num_trajectories=6, output_dir=serial_dir, batch_size=2,
+                         num_workers=0, seed=7)
+        generate_dataset(num_trajectories=6, output_dir=parallel_dir, batch_size=2,
+                         num_workers=3, seed=7)
+
+        for name in ('train', 'val', 'test'):
+            serial = load_split(serial_dir, name).load_arrays()
+            parallel = load_split(parallel_dir, name).load_arrays()
+            assert np.array_equal(serial['inputs'], parallel['inputs'])
+            assert np.array_equal(serial['targets'], parallel['targets'])
+        print("✓ In-process and 3-worker datasets are identical")
+
+        other_dir = os.path.join(serial_dir, 'other_seed')
+        generate_dataset(num_trajectories=6, output_dir=other_dir, batch_size=2,
+                         num_workers=0, seed=8)
+        assert not np.array_equal(load_split(serial_dir, 'train')[0][1],
+                                  load_split(other_dir, 'train')[0][1])
+        print("✓ A different seed gives a different dataset")
+    print()
+
+
+def test_sharded_dataset():
+    """Test incremental shard writing and memory-mapped reading"""
+    print("=" * 60)
+    print("TEST: Sharded Dataset Format")
+    print("=" * 60)
+
+    rng = np.random.default_rng(0)
+    inputs = rng.normal(size=(25, 10, 13)).astype(np.float32)
+    targets = rng.normal(size=(25, 6)).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        writer = ShardWriter(output_dir, sequence_length=10, shard_size=8)
+        for start in range(0, 25, 7):
+            writer.append('train', inputs[start:start + 7], targets[start:start + 7])
+        writer.close({'seed': 0})
+
+        manifest = load_manifest(output_dir)
+        shards = manifest['splits']['train']['shards']
+        assert manifest['splits']['train']['num_samples'] == 25
+        assert [shard['num_samples'] for shard in shards] == [8, 8, 8, 1]
+        assert [shard['start'] for shard in shards] == [0, 8, 16, 24]
+        assert manifest['splits']['val']['num_samples'] == 0 and manifest['seed'] == 0
+        print(f"✓ 25 samples written as {len(shards)} shards")
+
+        split = load_split(output_dir, 'train')
+        assert len(split) == 25
+        for idx in (0, 7, 8, 23, 24, -1):
+            x, y = split[idx]
+            assert np.array_equal(x, inputs[idx]) and np.array_equal(y, targets[idx])
+        x, _ = split[9]
+        assert isinstance(x, np.memmap)
+        assert np.array_equal(split.load_arrays()['inputs'], inputs)
+        print("✓ Memory-mapped samples match across shard boundaries")
+
+        try:
+            split[25]
+            assert False, "Expected IndexError"
+        except IndexError:
+            pass
+        print("✓ Out-of-range index raises IndexError")
+    print()
+
+
+def test_trajectory_layout():
+    """Test lazily sliced windows against materialized sequences"""
+    print("=" * 60)
+    print("TEST: Trajectory Layout With Lazy Windows")
+    print("=" * 60)
+
+    trajectories = [sample_trajectory(), sample_trajectory(max_time=0.5), sample_trajectory(max_time=8.0)]
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        writer = TrajectoryShardWriter(output_dir, sequence_length=10, shard_size=100)
+        for trajectory in trajectories:
+            writer.append('train', featurize_trajectory(trajectory))
+        manifest = writer.close()
+        assert manifest['layout'] == 'trajectories'
+        assert manifest['splits']['train']['num_trajectories'] == 3
+        assert len(manifest['splits']['train']['shards']) == 2
+        print(f"✓ {manifest['splits']['train']['num_timesteps']} timesteps stored once")
+
+        for sequence_length in (10, 4):
+            split = load_split(output_dir, 'train', sequence_length)
+            expected = [create_training_sequences(trajectory, sequence_length)
+                        for trajectory in trajectories]
+            expected_inputs = np.concatenate([inputs for inputs, _ in expected])
+            expected_targets = np.concatenate([targets for _, targets in expected])
+            assert len(split) == len(expected_inputs)
+
+            arrays = split.load_arrays()
+            assert np.array_equal(arrays['inputs'], expected_inputs)
+            assert np.array_equal(arrays['targets'], expected_targets)
+            print(f"✓ {len(split)} windows of length {sequence_length} match create_training_sequences")
+
+        x, _ = split[0]
+        assert isinstance(x, np.memmap) and np.shares_memory(split[0][0], split[1][0])
+        print("✓ Windows are views into the memory-mapped features")
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        writer = ShardWriter(output_dir, sequence_length=10)
+        writer.close()
+        try:
+            load_split(output_dir, 'train', sequence_length=4)
+            assert False, "Expected ValueError"
+        except ValueError:
+            pass
+        print("✓ Windows layout rejects a different sequence length")
+    print()
+
+
+def test_running_stats():
+    """Test merged streaming statistics against numpy over the full array"""
+    print("=" * 60)
+    print("TEST: Mergeable Running Statistics")
+    print("=" * 60)
+
+    rng = np.random.default_rng(1)
+    values = rng.normal(5.0, 3.0, size=(1000, 6))
+
+    left = RunningStats(6)
+    for start in range(0, 600, 128):
+        left.update(values[start:min(start + 128, 600)])
+    right = RunningStats(6)
+    right.update(values[600:])
+    restored = RunningStats.from_dict(left.to_dict())
+    restored.merge(right)
+
+    assert restored.count == 1000
+    assert np.allclose(restored.mean, values.mean(axis=0))
+    assert np.allclose(restored.std, values.std(axis=0))
+    print("✓ Chunked and merged statistics match numpy")
+    print()
+
+
+def test_manifest_normalization():
+    """Test that streamed per-feature statistics match numpy over the training split"""
+    print("=" * 60)
+    print("TEST: Streaming Feature Normalization")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        generate_dataset(num_trajectories=8, output_dir=output_dir, batch_size=3,
+                         num_workers=2, seed=5, layout='trajectories')
+        normalization = load_manifest(output_dir)['normalization']
+        train = load_split(output_dir, 'train')
+        features = np.concatenate([train.trajectory(i)
+                                   for i in range(len(train.trajectory_lengths))])
+        targets = np.concatenate([train.trajectory(i)[10:, :6]
+                                  for i in range(len(train.trajectory_lengths))])
+
+        assert len(normalization['input_mean']) == 13 and len(normalization['target_mean']) == 6
+        assert np.allclose(normalization['input_mean'], features.mean(axis=0), atol=1e-4)
+        assert np.allclose(normalization['input_std'], features.std(axis=0), atol=1e-4)
+        assert np.allclose(normalization['target_mean'], targets.mean(axis=0), atol=1e-4)
+        assert np.allclose(normalization['target_std'], targets.std(axis=0), atol=1e-4)
+        print("✓ Manifest statistics of all 13 features and 6 targets match numpy")
+    print()
+
+
+def test_resume_and_append():
+    """Test that resumed and appended datasets equal a single run"""
+    print("=" * 60)
+    print("TEST: Resumable, Append-Only Generation")
+    print("=" * 60)
+
+    def load_all(data_dir):
+        return {name: load_split(data_dir, name).load_arrays() for name in ('train', 'val', 'test')}
+
+    def assert_same(expected, actual):
+        for name in expected:
+            assert np.array_equal(expected[name]['inputs'], actual[name]['inputs'])
+            assert np.array_equal(expected[name]['targets'], actual[name]['targets'])
+
+    with tempfile.TemporaryDirectory() as root:
+        full_dir = os.path.join(root, 'full')
+        generate_dataset(num_trajectories=6, output_dir=full_dir, batch_size=2,
+                         num_workers=0, seed=3, shard_size=500)
+        full = load_all(full_dir)
+        full_manifest = load_manifest(full_dir)
+        assert full_manifest['complete'] and full_manifest['num_chunks'] == 3
+
+        # Appending to a smaller dataset gives the same samples
+        append_dir = os.path.join(root, 'append')
+        generate_dataset(num_trajectories=4, output_dir=append_dir, batch_size=2,
+                         num_workers=0, seed=3, shard_size=500)
+        generate_dataset(num_trajectories=2, output_dir=append_dir, num_workers=0, append=True)
+        assert_same(full, load_all(append_dir))
+        append_manifest = load_manifest(append_dir)
+        assert append_manifest['num_trajectories'] == 6
+        assert np.allclose(append_manifest['target_stats']['mean'],
+                           full_manifest['target_stats']['mean'])
+        assert np.allclose(append_manifest['target_stats']['m2'],
+                           full_manifest['target_stats']['m2'])
+        print("✓ 4 + appended 2 trajectories equal a 6-trajectory run, statistics included")
+
+        # Simulate a run interrupted after 4 of 6 trajectories
+        resume_dir = os.path.join(root, 'resume')
+        generate_dataset(num_trajectories=4, output_dir=resume_dir, batch_size=2,
+                         num_workers=0, seed=3, shard_size=500)
+        manifest = load_manifest(resume_dir)
+        manifest['target_trajectories'] = 6
+        manifest['complete'] = False
+        write_manifest(resume_dir, manifest)
+        try:
+            generate_dataset(num_trajectories=1, output_dir=resume_dir, append=True)
+            assert False, "Expected ValueError"
+        except ValueError:
+            pass
+        generate_dataset(output_dir=resume_dir, num_workers=2, resume=True)
+        assert_same(full, load_all(resume_dir))
+        assert load_manifest(resume_dir)['complete']
+        print("✓ Resumed run equals an uninterrupted one")
+    print()
+
+
+def test_csv_export():
+    """Test that the CSV export follows the manifest's sequence length"""
+    print("=" * 60)
+    print("TEST: CSV Export Sequence Length")
+    print("=" * 60)
+
+    try:
+        import pandas as pd
+    except ImportError:
+        print("⚠ pandas not installed - skipped")
+        print()
+        return
+    from export_dataset_to_csv import export_dataset_to_csv
+
+    with tempfile.TemporaryDirectory() as root:
+        windows_dir = os.path.join(root, 'windows')
+        generate_dataset(num_trajectories=4, output_dir=windows_dir, batch_size=2,
+                         num_workers=0, seed=2, sequence_length=6)
+        csv_dir = os.path.join(root, 'csv')
+        export_dataset_to_csv(windows_dir, csv_dir)
+        train = pd.read_csv(os.path.join(csv_dir, 'train_data.csv'))
+        expected = load_split(windows_dir, 'train').load_arrays()
+        assert train.shape == (len(expected['inputs']), 6 * 13 + 6)
+        assert train.columns[-7] == 't5_dist_to_wp'
+        assert np.allclose(train.values[:, :6 * 13], expected['inputs'].reshape(len(train), -1))
+        print("✓ Default export uses the manifest's sequence length")
+
+        try:
+            export_dataset_to_csv(windows_dir, csv_dir, sequence_length=10)
+            assert False, "Expected ValueError"
+        except ValueError:
+            pass
+        print("✓ Mismatched --sequence_length is rejected")
+
+        trajectories_dir = os.path.join(root, 'trajectories')
+        generate_dataset(num_trajectories=4, output_dir=trajectories_dir, batch_size=2,
+                         num_workers=0, seed=2, layout='trajectories')
+        export_dataset_to_csv(trajectories_dir, csv_dir, sequence_length=4)
+        train = pd.read_csv(os.path.join(csv_dir, 'train_data.csv'))
+        assert train.shape[1] == 4 * 13 + 6
+        print("✓ Trajectory layout exports other window lengths")
+    print()
+
+
+def run_all_tests():
+    """Run all tests"""
+    print("\n" + "=" * 60)
+    print("DATA PIPELINE - TEST SUITE")
+    print("=" * 60 + "\n")
+
+    try:
+        test_create_training_sequences()
+        test_sharded_dataset()
+        test_trajectory_layout()
+        test_generate_dataset_worker_invariance()
+        test_running_stats()
+        test_manifest_normalization()
+        test_resume_and_append()
+        test_csv_export()
+
+        print("=" * 60)
+        print("✓ ALL TESTS PASSED")
+        print("=" * 60)
+        return True
+
+    except Exception as e:
+        print("\n" + "=" * 60)
+        print("✗ TEST FAILED")
+        print("=" * 60)
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
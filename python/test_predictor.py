@@ -0,0 +1,460 @@
+"""
+Test script for TrajectoryPredictor inference modes
+"""
+import json
+import numpy as np
+import os
+import subprocess
+import sys
+import tempfile
+import torch
+import tracemalloc
+from benchmark_inference import synthetic_states
+from ml_model import DroneTrajectoryLSTM, FeatureHistory, FeatureNormalization, TrajectoryPredictor
+
+
+def make_predictor(**kwargs):
+    """Predictor with fixed random weights"""
+    torch.manual_seed(0)
+    return TrajectoryPredictor(device='cpu', **kwargs)
+
+
+def test_model_step():
+    """Test the cell-wise single step against nn.LSTM"""
+    print("=" * 60)
+    print("TEST: Single LSTM Step")
+    print("=" * 60)
+
+    model = make_predictor().model
+    x = torch.randn(4, 7, 13)
+    with torch.no_grad():
+        _, hidden = model(x[:, :6])
+        expected, expected_hidden = model(x[:, 6:], hidden)
+        output, step_hidden = model.step(x[:, 6], hidden)
+
+    assert torch.allclose(output, expected, atol=1e-5)
+    for a, b in zip(step_hidden, expected_hidden):
+        assert torch.allclose(a, b, atol=1e-5)
+    print("✓ step() matches forward() on one timestep")
+    print()
+
+
+def test_streaming_prediction():
+    """Test predict_step against full-window predict"""
+    print("=" * 60)
+    print("TEST: Streaming Inference")
+    print("=" * 60)
+
+    states = synthetic_states(40)
+    target = np.array([20.0, -10.0, 8.0])
+    window = 10
+
+    # Re-syncing on every call is exactly predict()
+    predictor = make_predictor(resync_interval=0)
+    for i, state in enumerate(states):
+        streamed = predictor.predict_step(state, target)
+        full = predictor.predict(states[max(0, i + 1 - window):i + 1], target)
+        assert np.allclose(streamed['position'], full['position'], atol=1e-5)
+        assert np.allclose(streamed['velocity'], full['velocity'], atol=1e-5)
+    print("✓ resync_interval=0 reproduces predict()")
+
+    # The window fills at state 9; the next 5 steps continue from that
+    # re-sync, so the carried state has seen every state from the start
+    predictor = make_predictor(resync_interval=5)
+    outputs = [predictor.predict_step(state, target)['position'] for state in states[:16]]
+    for i in (9, 14):
+        features = np.stack([predictor.state_features(s, target) for s in states[:i + 1]])
+        with torch.no_grad():
+            output, _ = predictor.model(torch.from_numpy(features).unsqueeze(0))
+        expected = predictor.normalization.denormalize_targets(output.numpy()[0])[:3]
+        assert np.allclose(outputs[i], expected, atol=1e-4)
+    print("✓ Streaming steps continue the last re-sync window")
+
+    # After resync_interval steps the state is rebuilt from the window
+    assert not np.allclose(outputs[14], predictor.predict(states[5:15], target)['position'])
+    assert np.allclose(outputs[15], predictor.predict(states[6:16], target)['position'],
+                       atol=1e-5)
+    print("✓ Re-sync after resync_interval steps")
+
+    # A new waypoint forces a re-sync
+    new_target = np.array([-5.0, 5.0, 3.0])
+    streamed = predictor.predict_step(states[16], new_target)
+    full = predictor.predict(states[17 - window:17], new_target)
+    assert np.allclose(streamed['position'], full['position'], atol=1e-5)
+    print("✓ Waypoint change re-syncs")
+
+    # Streams are independent per drone
+    predictor.reset_stream()
+    first = predictor.predict_step(states[0], target, drone_id='a')
+    predictor.predict_step(states[5], target, drone_id='b')
+    again = predictor.predict_step(states[0], target, drone_id='c')
+    assert np.allclose(first['position'], again['position'])
+    assert set(predictor.streams) == {'a', 'b', 'c'}
+    predictor.reset_stream('a')
+    assert set(predictor.streams) == {'b', 'c'}
+    print("✓ Per-drone streams")
+
+    # Targets float32 can't store exactly stay on the streaming path
+    fractional = np.array([20.1, -10.3, 8.7])
+    predictor = make_predictor(resync_interval=5)
+    syncs = []
+    for state in states:
+        predictor.predict_step(state, fractional)
+        syncs.append(predictor.streams[0].steps_since_sync == 0)
+    assert sum(syncs[window:]) == (len(states) - window) // 6
+    print(f"✓ Non-integer target streams between re-syncs "
+          f"({len(syncs) - window - sum(syncs[window:])} streaming steps)")
+
+    calls = []
+    set_target = predictor.history.set_target
+    predictor.history.set_target = lambda target: calls.append(target) or set_target(target)
+    for state in states:
+        predictor.push_state(state)
+        predictor.latest_input(fractional)
+    assert len(calls) == 1
+    print("✓ latest_input() sets a non-integer target once")
+    print()
+
+
+def reference_input(predictor, history, target):
+    """Per-state featurization with front padding, as prepare_input used to do"""
+    features = [predictor.state_features(state, target) for state in history]
+    features = [features[0]] * (predictor.sequence_length - len(features)) + features
+    return np.stack(features[-predictor.sequence_length:])
+
+
+def test_input_buffers():
+    """Test vectorized prepare_input and the ring buffer against per-state features"""
+    print("=" * 60)
+    print("TEST: Input Preparation")
+    print("=" * 60)
+
+    predictor = make_predictor()
+    states = synthetic_states(25)
+    target = np.array([20.0, -10.0, 8.0])
+    new_target = np.array([-5.0, 5.0, 3.0])
+
+    for length in (1, 4, 10, 25):
+        x = predictor.prepare_input(states[:length], target)
+        assert x.shape == (1, 10, 13)
+        assert np.allclose(x[0].numpy(), reference_input(predictor, states[:length], target), atol=1e-5)
+    assert np.shares_memory(x.numpy(), predictor.input_buffer)
+    print("✓ prepare_input matches per-state features, padded and shared with input_buffer")
+
+    for i, state in enumerate(states):
+        predictor.push_state(state)
+        history = states[:i + 1]
+        waypoint = target if i < 15 else new_target
+        x = predictor.latest_input(waypoint)
+        assert np.allclose(x[0].numpy(), reference_input(predictor, history, waypoint), atol=1e-5)
+        assert len(predictor.history) == min(i + 1, 10)
+    print("✓ Ring buffer matches prepare_input while filling, wrapping and changing waypoint")
+
+    # Steady-state pushes allocate no arrays: memory does not grow and the
+    # peak stays below a single window of temporaries
+    for state in states:
+        predictor.push_state(state)
+        predictor.latest_input(new_target)
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    for state in states:
+        predictor.push_state(state)
+        predictor.latest_input(new_target)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert current - baseline < 256 and peak - baseline < 4096, (current, peak)
+    print(f"✓ Steady state: {current - baseline} bytes retained, {peak - baseline} bytes peak")
+    print()
+
+
+def test_predict_batch():
+    """Test batched prediction against per-drone predict()"""
+    print("=" * 60)
+    print("TEST: Batched Inference")
+    print("=" * 60)
+
+    predictor = make_predictor()
+    rng = np.random.default_rng(1)
+    lengths = [1, 3, 10, 14, 7]
+    histories = [synthetic_states(n, seed=i) for i, n in enumerate(lengths)]
+    targets = rng.uniform(-20.0, 20.0, size=(len(histories), 3))
+    expected = [predictor.predict(history, target) for history, target in zip(histories, targets)]
+    expected_position = np.stack([e['position'] for e in expected])
+    expected_velocity = np.stack([e['velocity'] for e in expected])
+
+    batch = predictor.predict_batch(histories, targets)
+    assert batch['position'].shape == (len(histories), 3)
+    assert np.allclose(batch['position'], expected_position, atol=1e-4)
+    assert np.allclose(batch['velocity'], expected_velocity, atol=1e-4)
+    print(f"✓ Ragged state lists (lengths {lengths}) match predict()")
+
+    # Left-aligned padded array with per-drone lengths
+    array = np.full((len(histories), max(lengths), 9), np.nan, dtype=np.float32)
+    for i, history in enumerate(histories):
+        for t, state in enumerate(history):
+            array[i, t] = np.concatenate([state['position'], state['velocity'],
+                                          state['acceleration']])
+    batch = predictor.predict_batch(array, targets, lengths=lengths)
+    assert np.allclose(batch['position'], expected_position, atol=1e-4)
+    print("✓ Padded (N, T, 9) array with lengths matches predict()")
+
+    buffers = []
+    for history in histories:
+        buffer = FeatureHistory(predictor.sequence_length)
+        for state in history:
+            buffer.push(state)
+        buffers.append(buffer)
+    batch = predictor.predict_batch(buffers, targets)
+    assert np.allclose(batch['position'], expected_position, atol=1e-4)
+    print("✓ Per-drone FeatureHistory buffers match predict()")
+    print()
+
+
+def reference_rollout(predictor, history, waypoints, horizon, dt=0.1):
+    """Autoregressive rollout re-running the LSTM over the growing sequence"""
+    norm = predictor.normalization
+    index = 0
+    window = reference_input(predictor, history, waypoints[0])
+    sequence = [row for row in window]
+    position = np.asarray(history[-1]['position'], dtype=np.float32)
+    velocity = np.asarray(history[-1]['velocity'], dtype=np.float32)
+    positions, indices = [], []
+    for step in range(horizon):
+        if np.linalg.norm(waypoints[index] - position) < 0.5:
+            index = min(index + 1, len(waypoints) - 1)
+        with torch.no_grad():
+            output, _ = predictor.model(torch.from_numpy(np.stack(sequence)).unsqueeze(0))
+        prediction = norm.denormalize_targets(output.numpy()[0])
+        acceleration = (prediction[3:6] - velocity) / dt
+        position, velocity = prediction[:3], prediction[3:6]
+        positions.append(position)
+        indices.append(index)
+        target = waypoints[index]
+        row = np.concatenate([position, velocity, acceleration, target,
+                              [np.linalg.norm(target - position)]])
+        sequence.append(norm.normalize_inputs(row))
+    return np.stack(positions), np.array(indices)
+
+
+def test_rollout():
+    """Test multi-step rollout against a step-by-step reference"""
+    print("=" * 60)
+    print("TEST: Autoregressive Rollout")
+    print("=" * 60)
+
+    predictor = make_predictor()
+    rng = np.random.default_rng(2)
+    histories = [synthetic_states(n, seed=i) for i, n in enumerate([10, 4, 12])]
+    waypoints = rng.uniform(-10.0, 10.0, size=(3, 4, 3)).astype(np.float32)
+    # Drone 1 starts on its first waypoint and switches to the next at once
+    waypoints[1, 0] = histories[1][-1]['position']
+
+    result = predictor.rollout(histories, waypoints, horizon=8)
+    assert result['positions'].shape == (3, 8, 3)
+    assert result['waypoint_indices'].shape == (3, 8)
+    for i, history in enumerate(histories):
+        positions, indices = reference_rollout(predictor, history, waypoints[i], 8)
+        assert np.allclose(result['positions'][i], positions, atol=1e-3)
+        assert np.array_equal(result['waypoint_indices'][i], indices)
+    assert result['waypoint_indices'][1, 0] == 1
+    print("✓ Batched rollout matches the step-by-step reference")
+
+    # The first step is the ordinary next-state prediction
+    first = predictor.predict_batch(histories, waypoints[[0, 1, 2], [0, 0, 0]])
+    assert np.allclose(result['positions'][[0, 2], 0], first['position'][[0, 2]], atol=1e-5)
+    velocity = np.stack([h[-1]['velocity'] for h in histories])
+    assert np.allclose(result['accelerations'][:, 0],
+                       (result['velocities'][:, 0] - velocity) / 0.1, atol=1e-3)
+    print("✓ First step equals predict_batch; accelerations are finite differences")
+
+    # A single drone's state list with a (W, 3) route, ending on its last waypoint
+    single = predictor.rollout(histories[0], waypoints[0, :1], horizon=5)
+    assert single['positions'].shape == (5, 3)
+    assert np.all(single['waypoint_indices'] == 0)
+    print("✓ Single-drone rollout")
+    print()
+
+
+def legacy_normalization():
+    """Pre-FeatureNormalization checkpoint entry with non-trivial statistics"""
+    return {'pos_mean': np.array([5.0, -3.0, 10.0]), 'pos_std': np.array([20.0, 15.0, 4.0]),
+            'vel_mean': np.array([0.5, 0.2, -0.1]), 'vel_std': np.array([3.0, 2.0, 1.0])}
+
+
+def raw_prediction(model, history, target, sequence_length=10):
+    """The original predictor: raw features in, raw position and velocity out"""
+    features = [np.concatenate([state['position'], state['velocity'], state['acceleration'],
+                                target, [np.linalg.norm(target - state['position'])]])
+                for state in history]
+    features = [features[0]] * (sequence_length - len(features)) + features
+    x = torch.FloatTensor(np.stack(features[-sequence_length:])).unsqueeze(0)
+    with torch.no_grad():
+        output, _ = model(x)
+    return output[0].numpy()
+
+
+def test_legacy_checkpoint():
+    """Test that checkpoints with only pos/vel statistics predict as they used to"""
+    print("=" * 60)
+    print("TEST: Legacy Checkpoint")
+    print("=" * 60)
+
+    normalization = FeatureNormalization.from_dict(legacy_normalization())
+    identity = FeatureNormalization.identity()
+    for name in ('input_mean', 'input_std', 'target_mean', 'target_std'):
+        assert np.array_equal(getattr(normalization, name), getattr(identity, name))
+    print("✓ pos/vel-only entries map to identity normalization")
+
+    with tempfile.TemporaryDirectory() as root:
+        torch.manual_seed(0)
+        model = DroneTrajectoryLSTM().eval()
+        model_path = os.path.join(root, 'best_model.pth')
+        torch.save({'model_state_dict': model.state_dict(),
+                    'normalization': legacy_normalization()}, model_path)
+
+        predictor = TrajectoryPredictor(model_path, device='cpu')
+        states = synthetic_states(12)
+        target = np.array([20.0, -10.0, 8.0])
+        for length in (4, 12):
+            expected = raw_prediction(model, states[:length], target)
+            result = predictor.predict(states[:length], target)
+            assert np.allclose(result['position'], expected[:3], atol=1e-5)
+            assert np.allclose(result['velocity'], expected[3:], atol=1e-5)
+    print("✓ Legacy checkpoint predictions match the original predictor")
+    print()
+
+
+def test_onnx_backend():
+    """Test the ONNX Runtime backend against the PyTorch predictor"""
+    print("=" * 60)
+    print("TEST: ONNX Runtime Backend")
+    print("=" * 60)
+
+    try:
+        import onnx
+        import onnxruntime
+    except ImportError:
+        print("⚠ onnx/onnxruntime not installed - skipped")
+        print()
+        return
+    from export_to_onnx import export_to_onnx
+
+    with tempfile.TemporaryDirectory() as root:
+        torch.manual_seed(0)
+        rng = np.random.default_rng(3)
+        normalization = FeatureNormalization(rng.normal(0, 5, 13), rng.uniform(1, 20, 13),
+                                             rng.normal(0, 5, 6), rng.uniform(1, 20, 6))
+        model_path = os.path.join(root, 'model.pth')
+        onnx_path = os.path.join(root, 'model.onnx')
+        torch.save({'model_state_dict': DroneTrajectoryLSTM().state_dict(),
+                    'normalization': normalization.to_dict(),
+                    'sequence_length': 8}, model_path)
+        export_to_onnx(model_path, onnx_path)
+
+        reference = TrajectoryPredictor(model_path, device='cpu', resync_interval=0)
+        predictor = TrajectoryPredictor(onnx_path, backend='onnx', num_threads=1)
+        assert predictor.sequence_length == 8
+
+        def close(a, b):
+            return np.allclose(a, b, rtol=1e-4, atol=1e-3)
+
+        states = synthetic_states(12)
+        target = np.array([20.0, -10.0, 8.0])
+        for length in (3, 12):
+            expected = reference.predict(states[:length], target)
+            result = predictor.predict(states[:length], target)
+            assert close(result['position'], expected['position'])
+            assert close(result['velocity'], expected['velocity'])
+        print("✓ predict() matches PyTorch")
+
+        histories = [synthetic_states(n, seed=i) for i, n in enumerate([2, 8, 11])]
+        targets = rng.uniform(-20.0, 20.0, size=(3, 3))
+        for _ in range(2):
+            result = predictor.predict_batch(histories, targets)
+            assert close(result['position'], reference.predict_batch(histories, targets)['position'])
+        print("✓ predict_batch() matches PyTorch")
+
+        for state in states:
+            predictor.push_state(state)
+            reference.push_state(state)
+            assert close(predictor.predict_latest(target)['position'],
+                         reference.predict_latest(target)['position'])
+            assert close(predictor.predict_step(state, target)['position'],
+                         reference.predict_step(state, target)['position'])
+        print("✓ predict_latest() and predict_step() match PyTorch")
+
+        try:
+            predictor.rollout(states, target[None], horizon=3)
+            assert False, "rollout should need the PyTorch backend"
+        except NotImplementedError:
+            pass
+
+        # Deployments without PyTorch
+        array = np.stack([np.concatenate([state['position'], state['velocity'],
+                                          state['acceleration']]) for state in states])
+        np.save(os.path.join(root, 'states.npy'), array[None])
+        script = ("import sys; sys.modules['torch'] = None\n"
+                  "import numpy as np\n"
+                  "from ml_model import TrajectoryPredictor\n"
+                  f"p = TrajectoryPredictor({onnx_path!r}, backend='onnx')\n"
+                  f"states = np.load({os.path.join(root, 'states.npy')!r})\n"
+                  "print(p.predict_batch(states, [[20.0, -10.0, 8.0]])['position'][0].tolist())\n")
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+        assert output.returncode == 0, output.stderr
+        assert close(np.array(json.loads(output.stdout.strip().splitlines()[-1])),
+                     reference.predict(states, target)['position'])
+        print("✓ ONNX backend runs without PyTorch installed")
+
+        # Older exports: raw-feature graph, real pos/vel statistics in the text file
+        legacy_model = DroneTrajectoryLSTM().eval()
+        legacy_path = os.path.join(root, 'legacy.pth')
+        legacy_onnx = os.path.join(root, 'legacy.onnx')
+        torch.save({'model_state_dict': legacy_model.state_dict(),
+                    'normalization': legacy_normalization()}, legacy_path)
+        export_to_onnx(legacy_path, legacy_onnx)
+        with open(legacy_onnx.replace('.onnx', '_normalization.txt'), 'w') as f:
+            for name, values in legacy_normalization().items():
+                f.write(f"{name}: {' '.join(str(v) for v in values)}\n")
+        predictor = TrajectoryPredictor(legacy_onnx, backend='onnx', num_threads=1)
+        expected = raw_prediction(legacy_model, states, target)
+        result = predictor.predict(states, target)
+        assert close(result['position'], expected[:3])
+        assert close(result['velocity'], expected[3:])
+        print("✓ Legacy _normalization.txt predicts on raw features")
+    print()
+
+
+def run_all_tests():
+    """Run all tests"""
+    print("\n" + "=" * 60)
+    print("TRAJECTORY PREDICTOR - TEST SUITE")
+    print("=" * 60 + "\n")
+
+    try:
+        test_model_step()
+        test_streaming_prediction()
+        test_input_buffers()
+        test_predict_batch()
+        test_rollout()
+        test_legacy_checkpoint()
+        test_onnx_backend()
+
+        print("=" * 60)
+        print("✓ ALL TESTS PASSED")
+        print("=" * 60)
+        return True
+
+    except Exception as e:
+        print("\n" + "=" * 60)
+        print("✗ TEST FAILED")
+        print("=" * 60)
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
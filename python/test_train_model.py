@@ -0,0 +1,267 @@
+"""
+Test script for the training pipeline
+"""
+import json
+import numpy as np
+import os
+import socket
+import sys
+import tempfile
+import torch
+import torch.multiprocessing as mp
+from data_generator import generate_dataset
+from dataset_shards import load_manifest, load_split
+from ml_model import DroneTrajectoryLSTM, FeatureNormalization
+from checkpointing import rolling_checkpoints
+from train_model import TrajectoryDataset, TensorBatchLoader, train_epoch, train_model
+from training_metrics import PHASES, TrainingMonitor
+
+
+def make_datasets(root):
+    """Generate a small dataset in each layout"""
+    data_dirs = {}
+    for layout in ('windows', 'trajectories'):
+        data_dirs[layout] = os.path.join(root, layout)
+        generate_dataset(num_trajectories=6, output_dir=data_dirs[layout], batch_size=3,
+                         num_workers=0, seed=11, layout=layout)
+    return data_dirs
+
+
+def test_tensor_batch_loader():
+    """Test index-sliced batches against per-sample TrajectoryDataset items"""
+    print("=" * 60)
+    print("TEST: Pre-Tensorized Batch Loader")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as root:
+        for layout, data_dir in make_datasets(root).items():
+            check_tensor_batch_loader(layout, data_dir)
+    print()
+
+
+def check_tensor_batch_loader(layout, data_dir):
+    """Compare TensorBatchLoader with TrajectoryDataset on one dataset"""
+    normalization = FeatureNormalization.from_dict(load_manifest(data_dir)['normalization'])
+    samples = load_split(data_dir, 'train')
+    dataset = TrajectoryDataset(samples, normalization)
+    expected_x = torch.stack([dataset[i][0] for i in range(len(dataset))])
+    expected_y = torch.stack([dataset[i][1] for i in range(len(dataset))])
+
+    loader = TensorBatchLoader(samples, normalization, batch_size=100)
+    assert len(loader) == (len(samples) + 99) // 100
+    batches = list(loader)
+    assert torch.equal(torch.cat([x for x, _ in batches]), expected_x)
+    assert torch.equal(torch.cat([y for _, y in batches]), expected_y)
+    print(f"✓ {layout}: {len(batches)} ordered batches match TrajectoryDataset")
+
+    shuffled = TensorBatchLoader(samples, normalization, batch_size=100, shuffle=True, seed=0)
+    x = torch.cat([x for x, _ in shuffled])
+    assert not torch.equal(x, expected_x)
+    order = torch.randperm(len(samples), generator=torch.Generator().manual_seed(0))
+    assert torch.equal(x, expected_x[order])
+    print(f"✓ {layout}: shuffled batches are a permutation of the split")
+
+
+def test_tensor_batch_loader_replicas():
+    """Test that ranks iterate equal, disjoint parts of the same permutation"""
+    print("=" * 60)
+    print("TEST: Distributed Batch Sharding")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as root:
+        data_dir = make_datasets(root)['trajectories']
+        normalization = FeatureNormalization.identity()
+        samples = load_split(data_dir, 'train')
+
+        for num_replicas in (2, 3):
+            loaders = [TensorBatchLoader(samples, normalization, batch_size=64, shuffle=True,
+                                         seed=4, rank=rank, num_replicas=num_replicas)
+                       for rank in range(num_replicas)]
+            for epoch in (0, 1):
+                targets = []
+                for loader in loaders:
+                    loader.set_epoch(epoch)
+                    targets.append(torch.cat([y for _, y in loader]))
+                assert len({len(y) for y in targets}) == 1
+                assert len({len(loader) for loader in loaders}) == 1
+                assert len(targets[0]) == -(-len(samples) // num_replicas)
+
+                # Interleaving the ranks restores the padded epoch permutation
+                full = TensorBatchLoader(samples, normalization, batch_size=len(samples),
+                                         shuffle=True, seed=4)
+                full.set_epoch(epoch)
+                _, expected = next(iter(full))
+                interleaved = torch.stack(targets, dim=1).reshape(-1, 6)
+                assert torch.equal(interleaved[:len(samples)], expected)
+            print(f"✓ {num_replicas} replicas cover every sample once per epoch")
+    print()
+
+
+def test_training_monitor():
+    """Test step timing reports and the profiler window"""
+    print("=" * 60)
+    print("TEST: Training Instrumentation")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as root:
+        data_dir = make_datasets(root)['windows']
+        normalization = FeatureNormalization.from_dict(load_manifest(data_dir)['normalization'])
+        samples = load_split(data_dir, 'train')
+        loader = TensorBatchLoader(samples, normalization, batch_size=32, shuffle=True)
+
+        model = DroneTrajectoryLSTM()
+        optimizer = torch.optim.Adam(model.parameters())
+        log_path = os.path.join(root, 'metrics.jsonl')
+        monitor = TrainingMonitor(log_path, log_interval=4, profile_steps=(2, 5))
+        for epoch in range(2):
+            monitor.start_epoch(epoch)
+            train_epoch(model, loader, torch.nn.MSELoss(), optimizer, 'cpu', monitor)
+            monitor.end_epoch(train_loss=0.0)
+        monitor.close()
+
+        with open(log_path) as f:
+            records = [json.loads(line) for line in f]
+        epochs = [r for r in records if r['event'] == 'epoch']
+        intervals = [r for r in records if r['event'] == 'steps']
+        profiles = [r for r in records if r['event'] == 'profile']
+
+        assert [r['epoch'] for r in epochs] == [0, 1]
+        for report in epochs:
+            assert report['steps'] == len(loader)
+            assert report['samples'] == len(samples)
+            assert set(report['phase_seconds']) == set(PHASES)
+            assert 0.0 <= report['data_wait_fraction'] <= 1.0
+            assert report['num_threads'] == torch.get_num_threads()
+        print(f"✓ Epoch reports cover {len(loader)} steps and {len(samples)} samples")
+
+        assert len(intervals) == 2 * (len(loader) // 4)
+        assert all(r['steps'] == 4 for r in intervals)
+        print(f"✓ {len(intervals)} interval reports of 4 steps")
+
+        assert len(profiles) == 1
+        assert (profiles[0]['start_step'], profiles[0]['stop_step']) == (2, 5)
+        with open(profiles[0]['trace_path']) as f:
+            assert 'traceEvents' in json.load(f)
+        print("✓ Profiler trace recorded for steps [2, 5)")
+    print()
+
+
+def test_resume_training():
+    """Test that an interrupted and resumed run matches an uninterrupted one"""
+    print("=" * 60)
+    print("TEST: Resumable Checkpoints")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as root:
+        data_dir = make_datasets(root)['trajectories']
+        options = dict(data_dir=data_dir, batch_size=32, device='cpu', pipeline='tensor',
+                       log_interval=0, keep_checkpoints=2)
+
+        full_dir = os.path.join(root, 'full')
+        torch.manual_seed(0)
+        train_model(model_dir=full_dir, num_epochs=4, **options)
+
+        resumed_dir = os.path.join(root, 'resumed')
+        torch.manual_seed(0)
+        train_model(model_dir=resumed_dir, num_epochs=2, **options)
+        torch.manual_seed(123)
+        train_model(model_dir=resumed_dir, num_epochs=4, resume=True, **options)
+
+        assert [os.path.basename(p) for p in rolling_checkpoints(resumed_dir)] == \
+            ['checkpoint_epoch0002.pth', 'checkpoint_epoch0003.pth']
+        print("✓ Only the last 2 rolling checkpoints are kept")
+
+        full = torch.load(os.path.join(full_dir, 'checkpoint_epoch0003.pth'), weights_only=False)
+        resumed = torch.load(os.path.join(resumed_dir, 'checkpoint_epoch0003.pth'),
+                             weights_only=False)
+        assert full['train_losses'] == resumed['train_losses']
+        assert full['val_losses'] == resumed['val_losses']
+        for name, value in full['model_state_dict'].items():
+            assert torch.equal(value, resumed['model_state_dict'][name]), name
+        print("✓ Resumed run reproduces the uninterrupted run")
+
+        for model_dir in (full_dir, resumed_dir):
+            assert not [f for f in os.listdir(model_dir) if f.endswith('.tmp')]
+            final = torch.load(os.path.join(model_dir, 'final_model.pth'), weights_only=False)
+            assert final['epoch'] == 4
+        print("✓ Final models written without temporary files")
+    print()
+
+
+def _resume_worker(rank, world_size, port, model_dirs, options):
+    """One process of a distributed train_model run, each rank with its own model_dir"""
+    os.environ.update(MASTER_ADDR='127.0.0.1', MASTER_PORT=str(port),
+                      RANK=str(rank), WORLD_SIZE=str(world_size))
+    torch.manual_seed(rank)
+    train_model(model_dir=model_dirs[rank], distributed=True, num_threads=1, **options)
+
+
+def _run_distributed(model_dirs, **options):
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    mp.spawn(_resume_worker, nprocs=len(model_dirs), join=True,
+             args=(len(model_dirs), port, model_dirs, options))
+
+
+def test_distributed_resume():
+    """Test that every rank resumes from rank 0's checkpoint without a shared model_dir"""
+    print("=" * 60)
+    print("TEST: Distributed Resume")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as root:
+        data_dir = make_datasets(root)['trajectories']
+        options = dict(data_dir=data_dir, batch_size=32, pipeline='tensor', log_interval=0)
+
+        full_dir = os.path.join(root, 'full')
+        _run_distributed([full_dir, os.path.join(root, 'full_rank1')], num_epochs=2, **options)
+
+        # Rank 1's model_dir never holds a checkpoint, as on separate nodes
+        resumed_dir = os.path.join(root, 'resumed')
+        _run_distributed([resumed_dir, os.path.join(root, 'resumed_rank1')],
+                         num_epochs=1, **options)
+        _run_distributed([resumed_dir, os.path.join(root, 'resumed_rank1_again')],
+                         num_epochs=2, resume=True, **options)
+
+        full = torch.load(os.path.join(full_dir, 'checkpoint_epoch0001.pth'), weights_only=False)
+        resumed = torch.load(os.path.join(resumed_dir, 'checkpoint_epoch0001.pth'),
+                             weights_only=False)
+        assert full['train_losses'] == resumed['train_losses']
+        for name, value in full['model_state_dict'].items():
+            assert torch.equal(value, resumed['model_state_dict'][name]), name
+        print("✓ Ranks resume together from rank 0's checkpoint")
+    print()
+
+
+def run_all_tests():
+    """Run all tests"""
+    print("\n" + "=" * 60)
+    print("TRAINING PIPELINE - TEST SUITE")
+    print("=" * 60 + "\n")
+
+    try:
+        test_tensor_batch_loader()
+        test_tensor_batch_loader_replicas()
+        test_training_monitor()
+        test_resume_training()
+        test_distributed_resume()
+
+        print("=" * 60)
+        print("✓ ALL TESTS PASSED")
+        print("=" * 60)
+        return True
+
+    except Exception as e:
+        print("\n" + "=" * 60)
+        print("✗ TEST FAILED")
+        print("=" * 60)
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
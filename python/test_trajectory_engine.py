@@ -0,0 +1,500 @@
+"""
+Test script for the trajectory generation engine (batched, buffered and streaming paths)
+"""
+import numpy as np
+import sys
+import tempfile
+from trajectory_generator import TrajectoryGenerator, DronePhysics, DroneState, Trajectory
+
+
+def random_missions(num_missions: int, max_waypoints: int = 6, seed: int = 0):
+    """Create random missions as padded arrays"""
+    rng = np.random.default_rng(seed)
+    initial_positions = rng.uniform(-5, 5, (num_missions, 3))
+    initial_velocities = rng.uniform(-2, 2, (num_missions, 3))
+    waypoints = rng.uniform(-40, 40, (num_missions, max_waypoints, 3))
+    waypoints[..., 2] = rng.uniform(2, 20, (num_missions, max_waypoints))
+    speeds = rng.uniform(5, 12, (num_missions, max_waypoints))
+    num_waypoints = rng.integers(1, max_waypoints + 1, num_missions)
+    return initial_positions, initial_velocities, waypoints, speeds, num_waypoints
+
+
+def mission_waypoints(waypoints, speeds, count):
+    """Convert one padded mission to the list format accepted by generate()"""
+    return [{'position': waypoints[k], 'speed': speeds[k]} for k in range(count)]
+
+
+def test_generate_batch_matches_generate():
+    """Test that lockstep batch generation reproduces generate() exactly"""
+    print("=" * 60)
+    print("TEST: Batched Generation Matches Single Generation")
+    print("=" * 60)
+
+    generator = TrajectoryGenerator(dt=0.1)
+    positions, velocities, waypoints, speeds, counts = random_missions(20)
+
+    batch = generator.generate_batch(positions, velocities, waypoints, speeds, counts)
+    print(f"✓ Generated batch of {len(batch['lengths'])} trajectories, "
+          f"padded length {batch['positions'].shape[1]}")
+
+    for i, trajectory in enumerate(generator.split_batch(batch)):
+        expected = generator.generate(positions[i], velocities[i],
+                                      mission_waypoints(waypoints[i], speeds[i], counts[i]))
+        for key in ['positions', 'velocities', 'accelerations', 'times', 'waypoint_indices']:
+            assert np.array_equal(trajectory[key], expected[key]), f"{key} differs for drone {i}"
+    print("✓ All trajectories identical to generate()")
+
+    # Single drone batch
+    batch = generator.generate_batch(positions[:1], velocities[:1], waypoints[:1, :counts[0]],
+                                     speeds[:1, :counts[0]])
+    expected = generator.generate(positions[0], velocities[0],
+                                  mission_waypoints(waypoints[0], speeds[0], counts[0]))
+    assert batch['lengths'][0] == len(expected['positions'])
+    assert np.array_equal(batch['positions'][0], expected['positions'])
+    print("✓ N=1 batch identical to generate()")
+    print()
+
+
+def test_generate_buffers():
+    """Test that buffered generate() keeps the returned dict layout"""
+    print("=" * 60)
+    print("TEST: Preallocated Trajectory Buffers")
+    print("=" * 60)
+
+    generator = TrajectoryGenerator(dt=0.1)
+    waypoints = [np.array([10, 10, 10]), (np.array([20, 5, 15]), 8.0),
+                 {'position': [30, 20, 12], 'speed': 12.0}]
+    trajectory = generator.generate(np.array([0, 0, 5]), np.array([0, 0, 0]), waypoints)
+
+    num_steps = len(trajectory['positions'])
+    for key in ['velocities', 'accelerations']:
+        assert trajectory[key].shape == (num_steps, 3), f"Bad shape for {key}"
+    for key in ['times', 'waypoint_indices']:
+        assert trajectory[key].shape == (num_steps,), f"Bad shape for {key}"
+    assert np.allclose(trajectory['positions'][0], [0, 0, 5])
+    assert np.all(np.diff(trajectory['times']) > 0)
+    assert list(trajectory['waypoint_speeds']) == [10.0, 8.0, 12.0]
+    print(f"✓ {num_steps} steps recorded with expected shapes")
+
+    # Trimmed outputs own their memory rather than viewing the max_time buffers
+    for key in ['positions', 'velocities', 'accelerations', 'times', 'waypoint_indices']:
+        assert trajectory[key].base is None, f"{key} is a view into the buffer"
+    print("✓ Returned arrays are trimmed copies")
+
+    # Short max_time fills the buffer completely
+    short = generator.generate(np.array([0, 0, 5]), np.array([0, 0, 0]), waypoints, max_time=2.0)
+    assert len(short['positions']) == int(2.0 / 0.1) + 1
+    print(f"✓ Full buffer used when max_time is reached ({len(short['positions'])} steps)")
+    print()
+
+
+def test_drone_state():
+    """Test the array-backed DroneState and in-place physics update"""
+    print("=" * 60)
+    print("TEST: DroneState and update_into")
+    print("=" * 60)
+
+    state = DroneState([0, 0, 5], [1, 0, 0])
+    assert state.data.shape == (10,)
+    assert np.shares_memory(state.position, state.data)
+    assert state['velocity'] is state.velocity
+    print(f"✓ State views share one array: {state}")
+
+    physics = DronePhysics()
+    target = np.array([20.0, 10.0, 12.0])
+    state_dict = state.to_dict()
+    for _ in range(50):
+        state_dict = physics.update(state_dict, target, 8.0, 0.1)
+        physics.update_into(state, target, 8.0, 0.1)
+    assert np.array_equal(state.position, state_dict['position'])
+    assert np.array_equal(state.velocity, state_dict['velocity'])
+    assert np.array_equal(state.acceleration, state_dict['acceleration'])
+    assert abs(state.time - state_dict['time']) < 1e-12
+    print("✓ update_into matches dict update after 50 steps")
+
+    # The dict adapter must not touch its input
+    before = state.to_dict()
+    physics.update(before, target, 8.0, 0.1)
+    assert np.array_equal(before['position'], state.position)
+    print("✓ Dict update leaves its input unchanged")
+    print()
+
+
+def test_iter_states():
+    """Test lazy streaming generation"""
+    print("=" * 60)
+    print("TEST: Streaming Generation with iter_states")
+    print("=" * 60)
+
+    generator = TrajectoryGenerator(dt=0.1)
+    initial_pos = np.array([0, 0, 5])
+    initial_vel = np.array([0, 0, 0])
+    waypoints = [np.array([10, 10, 10]), np.array([20, 5, 15]), np.array([30, 20, 12])]
+    expected = generator.generate(initial_pos, initial_vel, waypoints)
+
+    # Per-step states
+    steps = list(generator.iter_states(initial_pos, initial_vel, waypoints))
+    assert len(steps) == len(expected['positions'])
+    assert np.array_equal(np.array([s.position for s, _ in steps]), expected['positions'])
+    assert [wp for _, wp in steps] == list(expected['waypoint_indices'])
+    print(f"✓ {len(steps)} streamed states match generate()")
+
+    # Chunked states
+    chunks = list(generator.iter_states(initial_pos, initial_vel, waypoints, chunk_size=64))
+    assert all(len(c['times']) <= 64 for c in chunks)
+    for key in ['positions', 'velocities', 'accelerations', 'times', 'waypoint_indices']:
+        assert np.array_equal(np.concatenate([c[key] for c in chunks]), expected[key])
+    print(f"✓ {len(chunks)} chunks concatenate to generate() output")
+
+    # Early cancellation
+    stream = generator.iter_states(initial_pos, initial_vel, waypoints)
+    first = [next(stream) for _ in range(5)]
+    stream.close()
+    assert first[-1][0].time > first[0][0].time
+    print("✓ Stream can be cancelled early")
+    print()
+
+
+def test_generate_adaptive():
+    """Test adaptive sub-stepping with event-accurate arrival"""
+    print("=" * 60)
+    print("TEST: Adaptive Integration")
+    print("=" * 60)
+
+    initial_pos = np.array([0, 0, 5])
+    initial_vel = np.array([0, 0, 0])
+    waypoints = [np.array([120, 0, 10]), np.array([120, 150, 15])]
+
+    generator = TrajectoryGenerator(dt=0.1)
+    adaptive = generator.generate_adaptive(initial_pos, initial_vel, waypoints,
+                                           max_time=200, tolerance=0.01)
+    fixed = generator.generate(initial_pos, initial_vel, waypoints, max_time=200)
+    reference = TrajectoryGenerator(dt=0.005).generate(initial_pos, initial_vel, waypoints,
+                                                       max_time=200)
+
+    # Output lives on the requested dt grid
+    assert np.allclose(np.diff(adaptive['times']), 0.1)
+    assert adaptive['positions'].shape == (len(adaptive['times']), 3)
+    assert np.allclose(adaptive['positions'][0], initial_pos)
+    print(f"✓ Resampled to {len(adaptive['times'])} samples on the 0.1s grid")
+
+    # Closer to the small-step limit than the fixed 0.1s run
+    adaptive_error = abs(adaptive['times'][-1] - reference['times'][-1])
+    fixed_error = abs(fixed['times'][-1] - reference['times'][-1])
+    assert adaptive_error < fixed_error
+    print(f"✓ Mission time error {adaptive_error:.2f}s (adaptive) vs {fixed_error:.2f}s (fixed dt)")
+    print(f"✓ {adaptive['integration_steps']} adaptive steps vs "
+          f"{len(reference['times']) - 1} fixed steps at dt=0.005")
+
+    # Waypoint index switches where the drone enters the arrival radius
+    switch = np.argmax(adaptive['waypoint_indices'] == 1)
+    distance = np.linalg.norm(adaptive['positions'][switch - 1] - waypoints[0])
+    assert distance < 1.5
+    print(f"✓ Waypoint switch {distance:.2f}m from the first waypoint")
+    print()
+
+
+def test_cruise_fast_path():
+    """Test closed-form cruise segments against step-by-step integration"""
+    print("=" * 60)
+    print("TEST: Cruise Fast Path")
+    print("=" * 60)
+
+    initial_pos = np.array([0, 0, 5])
+    initial_vel = np.array([0, 0, 0])
+    waypoints = [np.array([200, 0, 10]), (np.array([200, 300, 20]), 5.0), np.array([0, 0, 5])]
+
+    stepped = TrajectoryGenerator(dt=0.1).generate(initial_pos, initial_vel, waypoints, max_time=400)
+    fast_generator = TrajectoryGenerator(dt=0.1, cruise_fast_path=True)
+    fast = fast_generator.generate(initial_pos, initial_vel, waypoints, max_time=400)
+
+    assert len(fast['times']) == len(stepped['times'])
+    assert np.array_equal(fast['waypoint_indices'], stepped['waypoint_indices'])
+    position_error = np.abs(fast['positions'] - stepped['positions']).max()
+    velocity_error = np.abs(fast['velocities'] - stepped['velocities']).max()
+    assert position_error < 1e-2 and velocity_error < 1e-2
+    print(f"✓ {len(fast['times'])} steps, max deviation {position_error:.2e}m / {velocity_error:.2e}m/s")
+
+    # Streaming expands cruise blocks into the same states
+    chunks = list(fast_generator.iter_states(initial_pos, initial_vel, waypoints,
+                                             max_time=400, chunk_size=100))
+    assert np.array_equal(np.concatenate([c['positions'] for c in chunks]), fast['positions'])
+    print("✓ iter_states output matches generate() with the fast path enabled")
+    print()
+
+
+def test_segment_memoization():
+    """Test leg memoization in regenerate_from_current"""
+    print("=" * 60)
+    print("TEST: Incremental Re-planning")
+    print("=" * 60)
+
+    generator = TrajectoryGenerator(dt=0.1)
+    waypoints = [np.array([40, 0, 10]), np.array([40, 40, 12]), np.array([0, 40, 15]),
+                 np.array([0, 0, 10]), np.array([30, 20, 8])]
+    current_pos = np.array([5.0, 1.0, 6.0])
+    current_vel = np.array([2.0, 0.5, 0.2])
+
+    expected = generator.generate(current_pos, current_vel, waypoints, max_time=120)
+    replanned = generator.regenerate_from_current(current_pos, current_vel, waypoints,
+                                                  max_time=120)
+    for key in ['positions', 'velocities', 'accelerations', 'waypoint_indices']:
+        assert np.array_equal(replanned[key], expected[key]), f"{key} differs"
+    assert np.allclose(replanned['times'], expected['times'])
+    assert generator.segment_cache_misses == len(waypoints)
+    print(f"✓ Segmented re-plan matches generate() ({len(waypoints)} legs cached)")
+
+    # Editing the last waypoint reuses every earlier leg
+    edited = list(waypoints)
+    edited[-1] = np.array([35, 25, 9])
+    hits_before = generator.segment_cache_hits
+    replanned = generator.regenerate_from_current(current_pos, current_vel, edited,
+                                                  max_time=120)
+    expected = generator.generate(current_pos, current_vel, edited, max_time=120)
+    assert generator.segment_cache_hits - hits_before == len(waypoints) - 1
+    assert np.array_equal(replanned['positions'], expected['positions'])
+    print(f"✓ Edit of the final waypoint reused {len(waypoints) - 1} legs")
+
+    # Editing a middle waypoint re-integrates the later legs by default
+    edited = list(waypoints)
+    edited[1] = np.array([42, 36, 12])
+    replanned = generator.regenerate_from_current(current_pos, current_vel, edited,
+                                                  max_time=120)
+    expected = generator.generate(current_pos, current_vel, edited, max_time=120)
+    assert generator.segment_cache_splices == 0
+    assert np.array_equal(replanned['positions'], expected['positions'])
+    print("✓ Mid-route edit without splicing matches generate()")
+
+    # With splicing, later legs splice back onto their cached paths
+    generator.clear_segment_cache()
+    generator.splice_position_tolerance = 0.25
+    generator.splice_velocity_tolerance = 0.2
+    generator.regenerate_from_current(current_pos, current_vel, waypoints, max_time=120)
+    hits_before = generator.segment_cache_hits
+    misses_before = generator.segment_cache_misses
+    replanned = generator.regenerate_from_current(current_pos, current_vel, edited,
+                                                  max_time=120)
+    expected = generator.generate(current_pos, current_vel, edited, max_time=120)
+    hits = generator.segment_cache_hits - hits_before
+    misses = generator.segment_cache_misses - misses_before
+    assert hits + misses == len(waypoints)
+    assert generator.segment_cache_splices >= 1
+    # Leg 0 plus the splice and the exact hits after it
+    assert hits >= 3, f"only {hits} legs reused"
+    assert np.allclose(np.diff(replanned['times']), 0.1)
+    assert replanned['waypoint_indices'][-1] == len(waypoints) - 1
+    assert np.linalg.norm(replanned['positions'][-1] - edited[-1]) < 0.5
+    steps = min(len(replanned['positions']), len(expected['positions']))
+    assert abs(len(replanned['positions']) - len(expected['positions'])) <= 2
+    assert np.abs(replanned['positions'][:steps] - expected['positions'][:steps]).max() < 1.0
+    assert np.abs(replanned['velocities'][:steps] - expected['velocities'][:steps]).max() < 1.0
+    # Accelerations follow the blended velocities
+    assert np.allclose(np.diff(replanned['velocities'], axis=0) / 0.1,
+                       replanned['accelerations'][1:])
+    print(f"✓ Mid-route edit reused {hits} of {len(waypoints)} legs "
+          f"({generator.segment_cache_splices} spliced), within 1 m of generate()")
+
+    # Re-planning in flight from a state of the current plan reuses the rest of it
+    plan = generator.regenerate_from_current(current_pos, current_vel, waypoints, max_time=120)
+    for step in (25, 140):
+        wp_idx = plan['waypoint_indices'][step]
+        hits_before = generator.segment_cache_hits
+        misses_before = generator.segment_cache_misses
+        replanned = generator.regenerate_from_current(plan['positions'][step],
+                                                      plan['velocities'][step], waypoints,
+                                                      current_waypoint_idx=wp_idx, max_time=120)
+        expected = generator.generate(plan['positions'][step], plan['velocities'][step],
+                                      waypoints[wp_idx:], max_time=120)
+        assert generator.segment_cache_misses == misses_before
+        assert generator.segment_cache_hits - hits_before == len(waypoints) - wp_idx
+        assert len(replanned['positions']) == len(expected['positions'])
+        assert np.allclose(replanned['positions'], expected['positions'], atol=1e-4)
+        print(f"✓ In-flight re-plan at step {step} reused all {len(waypoints) - wp_idx} legs")
+
+    generator.clear_segment_cache()
+    assert generator.segment_cache_hits == 0 and generator.segment_cache_splices == 0
+    assert not generator._segment_cache
+    print("✓ Cache cleared")
+
+    # Waypoints closer together than the arrival radius, and a duplicate
+    close = [np.array([20, 0, 10]), np.array([20.3, 0.2, 10.1]), np.array([20.3, 0.2, 10.1]),
+             np.array([20, 25, 12]), np.array([20.4, 25, 12.2])]
+    for start in (np.array([0.0, 0.0, 8.0]), np.array([20.1, 0.1, 10.0])):
+        generator = TrajectoryGenerator(dt=0.1)
+        replanned = generator.regenerate_from_current(start, np.zeros(3), close, max_time=60)
+        expected = generator.generate(start, np.zeros(3), close, max_time=60)
+        for key in ['positions', 'velocities', 'accelerations', 'waypoint_indices']:
+            assert np.array_equal(replanned[key], expected[key]), f"{key} differs"
+    print("✓ Close and duplicate waypoints match generate()")
+    print()
+
+
+def test_trajectory_cache():
+    """Test the content-addressed trajectory cache"""
+    print("=" * 60)
+    print("TEST: Trajectory Cache")
+    print("=" * 60)
+
+    from trajectory_cache import TrajectoryCache
+    from trajectory_templates import TrajectoryTemplates
+
+    generator = TrajectoryGenerator(dt=0.1)
+    waypoints = TrajectoryTemplates.get_template('square', center=(0, 0, 10), side_length=30)
+    initial_pos = np.array([0, 0, 5])
+    initial_vel = np.array([0, 0, 0])
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = TrajectoryCache(cache_dir=cache_dir)
+        first = cache.generate(generator, initial_pos, initial_vel, waypoints)
+        second = cache.generate(generator, initial_pos, initial_vel, waypoints)
+        expected = generator.generate(initial_pos, initial_vel, waypoints)
+        assert np.array_equal(second['positions'], expected['positions'])
+        assert cache.hits == 1 and cache.misses == 1
+        print(f"✓ Second request served from memory: {cache.stats()}")
+
+        # Returned arrays are independent of the cached entry
+        second['positions'][:] = 0
+        third = cache.generate(generator, initial_pos, initial_vel, waypoints)
+        assert np.array_equal(third['positions'], first['positions'])
+        print("✓ Callers get their own copies")
+
+        # A fresh cache finds the entry on disk
+        disk_cache = TrajectoryCache(cache_dir=cache_dir)
+        loaded = disk_cache.generate(generator, initial_pos, initial_vel, waypoints)
+        assert disk_cache.disk_hits == 1 and disk_cache.misses == 0
+        assert np.array_equal(loaded['positions'], expected['positions'])
+        print("✓ Disk tier hit from a new cache instance")
+
+        # Changing physics parameters invalidates the memory tier
+        generator.physics.max_acceleration = 4.0
+        changed = cache.generate(generator, initial_pos, initial_vel, waypoints)
+        assert cache.invalidations == 1 and cache.misses == 2
+        assert not np.array_equal(changed['positions'][:len(first['positions'])],
+                                  first['positions'][:len(changed['positions'])])
+        print("✓ Physics change invalidated cached trajectories")
+
+    # Byte budget evicts least recently used entries
+    small_cache = TrajectoryCache(max_bytes=40000)
+    for height in [5, 6, 7]:
+        small_cache.generate(generator, [0, 0, height], initial_vel, waypoints)
+    assert small_cache.current_bytes <= 40000 and len(small_cache._entries) < 3
+    print(f"✓ LRU budget respected ({small_cache.current_bytes} bytes in "
+          f"{len(small_cache._entries)} entries)")
+    print()
+
+
+def test_trajectory_lookup():
+    """Test time-indexed interpolated lookup"""
+    print("=" * 60)
+    print("TEST: Time-Indexed Trajectory")
+    print("=" * 60)
+
+    waypoints = [np.array([10, 10, 10]), np.array([20, 5, 15]), np.array([30, 20, 12])]
+    fine = TrajectoryGenerator(dt=0.01).generate(np.array([0, 0, 5]), np.array([0, 0, 0]), waypoints)
+    fine_trajectory = Trajectory(fine)
+    coarse = fine_trajectory.resample(0.2)
+    assert np.allclose(np.diff(coarse.times), 0.2)
+    print(f"✓ Resampled {len(fine_trajectory)} samples to {len(coarse)} at 0.2s")
+
+    # Sample times return the samples themselves
+    state = fine_trajectory.state_at(fine['times'][123])
+    assert np.allclose(state.position, fine['positions'][123])
+    assert np.allclose(state.velocity, fine['velocities'][123])
+    print(f"✓ state_at on a sample time: {state.position}")
+
+    # Hermite beats linear interpolation between coarse samples
+    query_times = fine['times'][5:-5:7]
+    hermite = coarse.states_at(query_times)['positions']
+    linear = coarse.states_at(query_times, method='linear')['positions']
+    truth = fine['positions'][5:-5:7]
+    hermite_error = np.abs(hermite - truth).max()
+    linear_error = np.abs(linear - truth).max()
+    assert hermite_error < linear_error
+    print(f"✓ Max error from 0.2s samples: hermite {hermite_error:.4f}m, linear {linear_error:.4f}m")
+
+    # Vectorized lookup agrees with scalar lookup and clamps out-of-range times
+    states = coarse.states_at(np.array([-1.0, 3.33, 1e6]))
+    assert np.allclose(states['positions'][1], coarse.state_at(3.33).position)
+    assert np.allclose(states['positions'][0], coarse.positions[0])
+    assert np.allclose(states['positions'][2], coarse.positions[-1])
+    print("✓ states_at matches state_at and clamps to the time range")
+    print()
+
+
+def test_physics_sweep():
+    """Test the process-parallel physics sweep"""
+    print("=" * 60)
+    print("TEST: Physics Parameter Sweep")
+    print("=" * 60)
+
+    import json
+    import os
+    from physics_sweep import parameter_grid, random_missions as sweep_missions, run_sweep
+
+    parameter_sets = parameter_grid({'max_speed': [10.0, 15.0], 'max_acceleration': [3.0, 5.0]})
+    assert len(parameter_sets) == 4
+    missions = sweep_missions(6, seed=1)
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        results = {}
+        for num_workers in [0, 2]:
+            path = os.path.join(output_dir, f'sweep_{num_workers}.jsonl')
+            summary = run_sweep(parameter_sets, missions, path, num_workers=num_workers,
+                                seed=3, perturbation=0.5, max_time=20.0, chunksize=2)
+            assert summary['num_tasks'] == 24
+            with open(path, 'r') as f:
+                records = sorted((json.loads(line) for line in f), key=lambda r: r['task_id'])
+            for record in records:
+                record.pop('generate_seconds')
+            results[num_workers] = records
+        print(f"✓ {summary['num_tasks']} tasks streamed at {summary['tasks_per_second']:.0f} tasks/s")
+
+        assert results[0] == results[2]
+        assert len(set(r['seed'] for r in results[0])) == 24
+        print("✓ Results identical in-process and with 2 workers")
+
+    record = results[0][0]
+    for key in ['completed', 'time_to_complete', 'max_acceleration', 'mean_arrival_error',
+                'max_arrival_error']:
+        assert key in record, f"Missing metric {key}"
+    assert record['params'] == parameter_sets[0]
+    print(f"✓ Metrics recorded: {record}")
+    print()
+
+
+def run_all_tests():
+    """Run all tests"""
+    print("\n" + "=" * 60)
+    print("TRAJECTORY ENGINE - TEST SUITE")
+    print("=" * 60 + "\n")
+
+    try:
+        test_drone_state()
+        test_generate_buffers()
+        test_generate_batch_matches_generate()
+        test_iter_states()
+        test_generate_adaptive()
+        test_cruise_fast_path()
+        test_segment_memoization()
+        test_trajectory_cache()
+        test_trajectory_lookup()
+        test_physics_sweep()
+
+        print("=" * 60)
+        print("✓ ALL TESTS PASSED")
+        print("=" * 60)
+        return True
+
+    except Exception as e:
+        print("\n" + "=" * 60)
+        print("✗ TEST FAILED")
+        print("=" * 60)
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+if __name__ == '__main__':
+    success = run_all_tests()
+    sys.exit(0 if success else 1)
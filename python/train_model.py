@@ -1,15 +1,24 @@
 """
 Train the LSTM trajectory prediction model
+
+Data-parallel training on CPUs across processes or nodes uses torchrun:
+
+    torchrun --nproc_per_node=8 train_model.py --distributed
 """
 import torch
+import torch.distributed as dist
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import Dataset, DataLoader
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import Dataset, DataLoader, DistributedSampler
 import numpy as np
-import pickle
 import os
-from typing import Dict, List
-from ml_model import DroneTrajectoryLSTM
+import time
+from typing import Dict, List, Tuple
+from ml_model import DroneTrajectoryLSTM, FeatureNormalization
+from dataset_shards import TrajectorySplit, load_manifest, load_split
+from training_metrics import PHASES, TrainingMonitor, thread_info
+from checkpointing import CheckpointWriter, latest_checkpoint, rng_states, set_rng_states
 from tqdm import tqdm
 import matplotlib.pyplot as plt
 
@@ -17,37 +26,134 @@ import matplotlib.pyplot as plt
 class TrajectoryDataset(Dataset):
     """PyTorch dataset for trajectory data"""
     
-    def __init__(self, samples: List[Dict]):
+    def __init__(self, samples, normalization: FeatureNormalization = None):
+        """
+        Args:
+            samples: Memory-mapped dataset split (see dataset_shards.load_split)
+                     yielding (input, target) pairs of shape
+                     (sequence_length, 13) and (6,)
+            normalization: Applied to inputs and targets (default: none)
+        """
         self.samples = samples
+        self.normalization = normalization or FeatureNormalization.identity()
         
     def __len__(self):
         return len(self.samples)
     
     def __getitem__(self, idx):
-        sample = self.samples[idx]
-        x = torch.FloatTensor(sample['input_sequence'])
-        y = torch.FloatTensor(sample['target'])
-        return x, y
+        x, y = self.samples[idx]
+        # Normalizing also copies out of the read-only memory map
+        x = self.normalization.normalize_inputs(x)
+        y = self.normalization.normalize_targets(y)
+        return torch.from_numpy(x), torch.from_numpy(y)
+
+
+class TensorBatchLoader:
+    """
+    In-memory replacement for DataLoader over a dataset split
+    
+    The split is normalized and converted to tensors once. Each batch is a
+    slice of a shuffled index permutation gathered with one indexing
+    operation, so there is no per-sample Python and no worker IPC. Splits in
+    the 'trajectories' layout keep only their timesteps in memory and gather
+    windows per batch.
+    """
+    
+    def __init__(self, samples, normalization: FeatureNormalization, batch_size: int,
+                 shuffle: bool = False, device: str = 'cpu', seed: int = 0,
+                 rank: int = 0, num_replicas: int = 1):
+        """
+        Args:
+            samples: Dataset split (see dataset_shards.load_split)
+            normalization: Applied to inputs and targets
+            batch_size: Samples per batch
+            shuffle: Draw a new permutation every epoch
+            device: Device holding the tensors
+            seed: Seed of the shuffling permutation
+            rank: Index of this process among num_replicas
+            num_replicas: Processes sharing the split, each iterating an
+                          equal-sized, disjoint part of every permutation
+                          (padded like DistributedSampler)
+        """
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.device = device
+        self.seed = seed
+        self.epoch = 0
+        self.rank = rank
+        self.num_replicas = num_replicas
+        self.sequence_length = samples.sequence_length
+        
+        if isinstance(samples, TrajectorySplit):
+            features, window_rows = samples.load_features()
+            self.features = torch.from_numpy(normalization.normalize_inputs(features)).to(device)
+            self.targets = torch.from_numpy(
+                normalization.normalize_targets(features[:, :6])).to(device)
+            self.window_rows = torch.from_numpy(window_rows).to(device)
+            self.offsets = torch.arange(self.sequence_length, device=device)
+            self.inputs = None
+        else:
+            arrays = samples.load_arrays()
+            self.inputs = torch.from_numpy(normalization.normalize_inputs(arrays['inputs'])).to(device)
+            self.targets = torch.from_numpy(
+                normalization.normalize_targets(arrays['targets'])).to(device)
+        self.num_samples = len(samples)
+        self.samples_per_replica = -(-self.num_samples // num_replicas)
+    
+    def __len__(self) -> int:
+        return (self.samples_per_replica + self.batch_size - 1) // self.batch_size
+    
+    def set_epoch(self, epoch: int):
+        """Select the permutation of an epoch (iterating also advances it)"""
+        self.epoch = epoch
+    
+    def __iter__(self):
+        if self.shuffle:
+            generator = torch.Generator().manual_seed(self.seed + self.epoch)
+            order = torch.randperm(self.num_samples, generator=generator)
+        else:
+            order = torch.arange(self.num_samples)
+        self.epoch += 1
+        
+        if self.num_replicas > 1:
+            padding = self.samples_per_replica * self.num_replicas - self.num_samples
+            order = torch.cat([order, order[:padding]])[self.rank::self.num_replicas]
+        order = order.to(self.device)
+        
+        for start in range(0, len(order), self.batch_size):
+            idx = order[start:start + self.batch_size]
+            if self.inputs is not None:
+                yield self.inputs[idx], self.targets[idx]
+            else:
+                rows = self.window_rows[idx]
+                yield (self.features[rows[:, None] + self.offsets],
+                       self.targets[rows + self.sequence_length])
 
 
 def train_epoch(model: nn.Module, dataloader: DataLoader, 
                 criterion: nn.Module, optimizer: optim.Optimizer,
-                device: str) -> float:
-    """Train for one epoch"""
+                device: str, monitor: TrainingMonitor = None) -> float:
+    """Train for one epoch, timing each step's phases if a monitor is given"""
     model.train()
     total_loss = 0.0
+    mark = monitor.mark if monitor is not None else (lambda phase: None)
+    end_step = monitor.end_step if monitor is not None else (lambda num_samples: None)
     
     for batch_x, batch_y in dataloader:
         batch_x = batch_x.to(device)
         batch_y = batch_y.to(device)
+        mark('data')
         
         optimizer.zero_grad()
         output, _ = model(batch_x)
         loss = criterion(output, batch_y)
+        mark('forward')
         loss.backward()
+        mark('backward')
         optimizer.step()
         
         total_loss += loss.item()
+        end_step(len(batch_x))
     
     return total_loss / len(dataloader)
 
@@ -70,12 +176,41 @@ def validate(model: nn.Module, dataloader: DataLoader,
     return total_loss / len(dataloader)
 
 
+def init_distributed() -> Tuple[int, int]:
+    """
+    Join the gloo process group described by torchrun's environment variables
+    
+    Returns:
+        rank, world_size
+    """
+    if not dist.is_initialized():
+        dist.init_process_group(backend='gloo')
+    return dist.get_rank(), dist.get_world_size()
+
+
+def average_across_ranks(value: float) -> float:
+    """Mean of a scalar over all processes (the value itself when not distributed)"""
+    if not dist.is_initialized():
+        return value
+    total = torch.tensor([value], dtype=torch.float64)
+    dist.all_reduce(total)
+    return total.item() / dist.get_world_size()
+
+
 def train_model(data_dir: str = '../data', 
                 model_dir: str = '../models',
                 num_epochs: int = 50,
                 batch_size: int = 64,
                 learning_rate: float = 0.001,
-                device: str = None):
+                device: str = None,
+                sequence_length: int = None,
+                pipeline: str = 'dataloader',
+                distributed: bool = False,
+                num_threads: int = None,
+                log_interval: int = 100,
+                profile_steps: Tuple[int, int] = None,
+                resume: bool = False,
+                keep_checkpoints: int = 3):
     """
     Train the trajectory prediction model
     
@@ -86,37 +221,91 @@ def train_model(data_dir: str = '../data',
         batch_size: Batch size
         learning_rate: Learning rate
         device: Device to train on
+        sequence_length: Input window length (default: the dataset's); datasets
+                         in the 'trajectories' layout accept any length
+        pipeline: 'dataloader' streams samples from the memory-mapped shards
+                  through DataLoader workers; 'tensor' loads each split into
+                  memory once and batches by index slicing (TensorBatchLoader)
+        distributed: Run as one process of a torchrun job: CPU training with
+                     DistributedDataParallel over gloo, each process taking a
+                     disjoint part of every epoch with batches of batch_size.
+                     Only rank 0 logs and writes checkpoints.
+        num_threads: Intra-op threads per process (default: the CPUs of this
+                     node divided among its processes)
+        log_interval: Steps between timing reports in training_metrics.jsonl
+                      (0 reports epochs only)
+        profile_steps: (start, stop) global steps to record with torch.profiler;
+                       the trace is saved next to the metrics file
+        resume: Continue from the latest rolling checkpoint in model_dir,
+                restoring the model, optimizer, scheduler, epoch, random
+                number generators and loss history. When distributed,
+                rank 0 reads its model_dir and sends the checkpoint to
+                every rank, so other nodes need no copy of it
+        keep_checkpoints: Rolling per-epoch checkpoints to retain (0 keeps all).
+                          Checkpoints are written from a background thread.
     """
+    if distributed:
+        rank, world_size = init_distributed()
+        device = 'cpu'
+    else:
+        rank, world_size = 0, 1
+    is_main = rank == 0
+    log = print if is_main else (lambda *args, **kwargs: None)
+    
+    if num_threads is None and distributed:
+        local_world_size = int(os.environ.get('LOCAL_WORLD_SIZE', world_size))
+        num_threads = max(1, (os.cpu_count() or 1) // local_world_size)
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    
     # Setup device
     if device is None:
         device = 'cuda' if torch.cuda.is_available() else 'cpu'
-    print(f"Training on device: {device}")
+    log(f"Training on device: {device}")
+    if distributed:
+        log(f"Distributed: {world_size} processes (gloo), {torch.get_num_threads()} threads each")
     
     # Create model directory
     os.makedirs(model_dir, exist_ok=True)
     
     # Load data
-    print("Loading data...")
-    with open(os.path.join(data_dir, 'train_data.pkl'), 'rb') as f:
-        train_samples = pickle.load(f)
-    
-    with open(os.path.join(data_dir, 'val_data.pkl'), 'rb') as f:
-        val_samples = pickle.load(f)
+    log("Loading data...")
+    train_samples = load_split(data_dir, 'train', sequence_length)
+    val_samples = load_split(data_dir, 'val', sequence_length)
+    sequence_length = train_samples.sequence_length
     
-    with open(os.path.join(data_dir, 'normalization.pkl'), 'rb') as f:
-        normalization = pickle.load(f)
+    normalization = FeatureNormalization.from_dict(load_manifest(data_dir)['normalization'])
     
-    print(f"Training samples: {len(train_samples)}")
-    print(f"Validation samples: {len(val_samples)}")
+    log(f"Sequence length: {sequence_length}")
+    log(f"Training samples: {len(train_samples)}")
+    log(f"Validation samples: {len(val_samples)}")
     
     # Create datasets and dataloaders
-    train_dataset = TrajectoryDataset(train_samples)
-    val_dataset = TrajectoryDataset(val_samples)
-    
-    train_loader = DataLoader(train_dataset, batch_size=batch_size, 
-                             shuffle=True, num_workers=4, pin_memory=True)
-    val_loader = DataLoader(val_dataset, batch_size=batch_size,
-                           shuffle=False, num_workers=4, pin_memory=True)
+    train_sampler = None
+    if pipeline == 'tensor':
+        train_loader = TensorBatchLoader(train_samples, normalization, batch_size,
+                                         shuffle=True, device=device,
+                                         rank=rank, num_replicas=world_size)
+        val_loader = TensorBatchLoader(val_samples, normalization, batch_size,
+                                       shuffle=False, device=device,
+                                       rank=rank, num_replicas=world_size)
+    elif pipeline == 'dataloader':
+        train_dataset = TrajectoryDataset(train_samples, normalization)
+        val_dataset = TrajectoryDataset(val_samples, normalization)
+        
+        if distributed:
+            train_sampler = DistributedSampler(train_dataset, shuffle=True)
+            val_sampler = DistributedSampler(val_dataset, shuffle=False)
+        else:
+            val_sampler = None
+        train_loader = DataLoader(train_dataset, batch_size=batch_size, 
+                                 shuffle=train_sampler is None, sampler=train_sampler,
+                                 num_workers=4, pin_memory=True)
+        val_loader = DataLoader(val_dataset, batch_size=batch_size,
+                               shuffle=False, sampler=val_sampler,
+                               num_workers=4, pin_memory=True)
+    else:
+        raise ValueError(f"Unknown training pipeline: {pipeline}")
     
     # Create model
     model = DroneTrajectoryLSTM(
@@ -126,9 +315,9 @@ def train_model(data_dir: str = '../data',
         output_size=6
     ).to(device)
     
-    print(f"\nModel architecture:")
-    print(model)
-    print(f"\nTotal parameters: {sum(p.numel() for p in model.parameters())}")
+    log(f"\nModel architecture:")
+    log(model)
+    log(f"\nTotal parameters: {sum(p.numel() for p in model.parameters())}")
     
     # Loss and optimizer
     criterion = nn.MSELoss()
@@ -136,48 +325,147 @@ def train_model(data_dir: str = '../data',
     scheduler = optim.lr_scheduler.ReduceLROnPlateau(optimizer, mode='min', 
                                                       factor=0.5, patience=5)
     
-    # Training loop
-    print(f"\nStarting training for {num_epochs} epochs...")
     train_losses = []
     val_losses = []
     best_val_loss = float('inf')
+    start_epoch = 0
+    global_step = 0
+    
+    if resume:
+        # Only rank 0 writes checkpoints, so only its model_dir is sure to hold
+        # them: it loads the latest one and every rank resumes from its copy
+        checkpoint_path = latest_checkpoint(model_dir) if is_main else None
+        checkpoint = None
+        if checkpoint_path is not None:
+            checkpoint = torch.load(checkpoint_path, map_location=device, weights_only=False)
+        if distributed:
+            shared = [checkpoint_path, checkpoint]
+            dist.broadcast_object_list(shared, src=0)
+            checkpoint_path, checkpoint = shared
+        
+        if checkpoint is None:
+            log(f"No checkpoint to resume from in {model_dir}, starting from scratch")
+        else:
+            if checkpoint['sequence_length'] != sequence_length:
+                raise ValueError(f"Checkpoint was trained on sequences of length "
+                                 f"{checkpoint['sequence_length']}, not {sequence_length}")
+            model.load_state_dict(checkpoint['model_state_dict'])
+            optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
+            scheduler.load_state_dict(checkpoint['scheduler_state_dict'])
+            rank_states = checkpoint.get('rank_rng_states')
+            if rank_states is not None and len(rank_states) == world_size:
+                set_rng_states(rank_states[rank])
+            else:
+                set_rng_states(checkpoint['rng_states'])
+            train_losses = checkpoint['train_losses']
+            val_losses = checkpoint['val_losses']
+            best_val_loss = checkpoint['best_val_loss']
+            start_epoch = checkpoint['epoch'] + 1
+            global_step = checkpoint['global_step']
+            log(f"Resumed from {checkpoint_path} at epoch {start_epoch + 1}")
+    
+    # Gradients are averaged across processes; checkpoints hold the bare model.
+    # Wrapping after the resume keeps DDP's initial broadcast of rank 0's
+    # weights consistent with the restored optimizer state.
+    raw_model = model
+    if distributed:
+        model = DistributedDataParallel(model)
+    
+    # Every process reports its own step timings
+    metrics_name = f'training_metrics_rank{rank}.jsonl' if distributed else 'training_metrics.jsonl'
+    monitor = TrainingMonitor(os.path.join(model_dir, metrics_name), log_interval,
+                              profile_steps, device, rank, global_step)
+    monitor.write('config', device=str(device), pipeline=pipeline, batch_size=batch_size,
+                  world_size=world_size, sequence_length=sequence_length,
+                  train_samples=len(train_samples), torch_version=torch.__version__,
+                  start_epoch=start_epoch, **thread_info())
     
-    for epoch in range(num_epochs):
-        train_loss = train_epoch(model, train_loader, criterion, optimizer, device)
-        val_loss = validate(model, val_loader, criterion, device)
+    checkpoints = CheckpointWriter(model_dir, keep_checkpoints) if is_main else None
+    
+    # Training loop
+    log(f"\nStarting training for {num_epochs} epochs...")
+    
+    for epoch in range(start_epoch, num_epochs):
+        if pipeline == 'tensor':
+            train_loader.set_epoch(epoch)
+        elif train_sampler is not None:
+            train_sampler.set_epoch(epoch)
+        
+        monitor.start_epoch(epoch)
+        train_loss = average_across_ranks(
+            train_epoch(model, train_loader, criterion, optimizer, device, monitor))
+        val_start = time.perf_counter()
+        val_loss = average_across_ranks(validate(model, val_loader, criterion, device))
+        val_seconds = time.perf_counter() - val_start
         
         train_losses.append(train_loss)
         val_losses.append(val_loss)
         
+        report = monitor.end_epoch(train_loss=train_loss, val_loss=val_loss,
+                                   val_seconds=val_seconds,
+                                   learning_rate=optimizer.param_groups[0]['lr'])
         scheduler.step(val_loss)
         
-        print(f"Epoch [{epoch+1}/{num_epochs}] "
-              f"Train Loss: {train_loss:.6f}, Val Loss: {val_loss:.6f}")
+        phases = report['phase_seconds']
+        busy = sum(phases.values()) or 1.0
+        log(f"Epoch [{epoch+1}/{num_epochs}] "
+            f"Train Loss: {train_loss:.6f}, Val Loss: {val_loss:.6f}, "
+            f"{report['samples_per_second'] * world_size:.0f} samples/s")
+        log("  " + ", ".join(f"{phase} {phases[phase] / busy:.0%}" for phase in PHASES)
+            + (f", peak RSS {report['peak_rss_mb']:.0f} MiB" if report['peak_rss_mb'] else ""))
         
-        # Save best model
-        if val_loss < best_val_loss:
+        is_best = val_loss < best_val_loss
+        if is_best:
             best_val_loss = val_loss
+        
+        # Each rank's generators drive its own dropout, so all are saved
+        states = rng_states()
+        if distributed:
+            rank_states = [None] * world_size if is_main else None
+            dist.gather_object(states, rank_states, dst=0)
+        
+        # Save the rolling checkpoint and best model in the background
+        if is_main:
             checkpoint = {
                 'epoch': epoch,
-                'model_state_dict': model.state_dict(),
+                'model_state_dict': raw_model.state_dict(),
                 'optimizer_state_dict': optimizer.state_dict(),
+                'scheduler_state_dict': scheduler.state_dict(),
                 'train_loss': train_loss,
                 'val_loss': val_loss,
-                'normalization': normalization
+                'normalization': normalization.to_dict(),
+                'sequence_length': sequence_length,
+                'train_losses': list(train_losses),
+                'val_losses': list(val_losses),
+                'best_val_loss': best_val_loss,
+                'global_step': monitor.global_step,
+                'rng_states': states
             }
-            torch.save(checkpoint, os.path.join(model_dir, 'best_model.pth'))
-            print(f"  -> Saved best model (val_loss: {val_loss:.6f})")
+            if distributed:
+                checkpoint['rank_rng_states'] = rank_states
+            checkpoints.save(checkpoint, epoch=epoch)
+            if is_best:
+                checkpoints.save(checkpoint, 'best_model.pth')
+                print(f"  -> Saved best model (val_loss: {val_loss:.6f})")
+    
+    monitor.close()
+    if distributed:
+        dist.destroy_process_group()
+    if not is_main:
+        return
     
     # Save final model
     checkpoint = {
         'epoch': num_epochs,
-        'model_state_dict': model.state_dict(),
+        'model_state_dict': raw_model.state_dict(),
         'optimizer_state_dict': optimizer.state_dict(),
         'train_loss': train_losses[-1],
         'val_loss': val_losses[-1],
-        'normalization': normalization
+        'normalization': normalization.to_dict(),
+        'sequence_length': sequence_length
     }
-    torch.save(checkpoint, os.path.join(model_dir, 'final_model.pth'))
+    checkpoints.save(checkpoint, 'final_model.pth')
+    checkpoints.close()
     
     # Plot training curves
     plt.figure(figsize=(10, 6))
@@ -194,13 +482,55 @@ def train_model(data_dir: str = '../data',
     print(f"\nTraining complete!")
     print(f"Best validation loss: {best_val_loss:.6f}")
     print(f"Models saved to: {model_dir}")
+    print(f"Timing reports saved to: {monitor.log_path}")
 
 
 if __name__ == '__main__':
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='Train the LSTM trajectory prediction model')
+    parser.add_argument('--data_dir', type=str, default='../data',
+                       help='Directory containing training data')
+    parser.add_argument('--model_dir', type=str, default='../models',
+                       help='Directory to save trained model')
+    parser.add_argument('--num_epochs', type=int, default=50,
+                       help='Number of training epochs')
+    parser.add_argument('--batch_size', type=int, default=64,
+                       help='Batch size')
+    parser.add_argument('--learning_rate', type=float, default=0.001,
+                       help='Learning rate')
+    parser.add_argument('--sequence_length', type=int, default=None,
+                       help='Input window length (default: the dataset\'s)')
+    parser.add_argument('--pipeline', type=str, default='dataloader', choices=['dataloader', 'tensor'],
+                       help='Stream samples through DataLoader or batch from in-memory tensors')
+    parser.add_argument('--distributed', action='store_true',
+                       help='Data-parallel CPU training; launch with torchrun')
+    parser.add_argument('--num_threads', type=int, default=None,
+                       help='Intra-op threads per process')
+    parser.add_argument('--log_interval', type=int, default=100,
+                       help='Steps between timing reports (0: per epoch only)')
+    parser.add_argument('--profile_steps', type=int, nargs=2, default=None,
+                       metavar=('START', 'STOP'),
+                       help='Record a torch.profiler trace over global steps [START, STOP)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue from the latest checkpoint in model_dir')
+    parser.add_argument('--keep_checkpoints', type=int, default=3,
+                       help='Rolling per-epoch checkpoints to retain (0: all)')
+    
+    args = parser.parse_args()
+    
     train_model(
-        data_dir='../data',
-        model_dir='../models',
-        num_epochs=50,
-        batch_size=64,
-        learning_rate=0.001
+        data_dir=args.data_dir,
+        model_dir=args.model_dir,
+        num_epochs=args.num_epochs,
+        batch_size=args.batch_size,
+        learning_rate=args.learning_rate,
+        sequence_length=args.sequence_length,
+        pipeline=args.pipeline,
+        distributed=args.distributed,
+        num_threads=args.num_threads,
+        log_interval=args.log_interval,
+        profile_steps=tuple(args.profile_steps) if args.profile_steps else None,
+        resume=args.resume,
+        keep_checkpoints=args.keep_checkpoints
     )
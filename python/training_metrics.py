@@ -0,0 +1,198 @@
+"""
+Throughput and stall instrumentation for the training loop
+"""
+import json
+import os
+import sys
+import time
+import torch
+from typing import Dict, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+PHASES = ('data', 'forward', 'backward', 'optimizer')
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MiB (None where unsupported)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    if sys.platform == 'darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def thread_info() -> Dict[str, int]:
+    """Effective PyTorch thread counts of this process"""
+    return {
+        'num_threads': torch.get_num_threads(),
+        'num_interop_threads': torch.get_num_interop_threads(),
+        'cpu_count': os.cpu_count()
+    }
+
+
+class PhaseTimes:
+    """Accumulated seconds per training step phase"""
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.steps = 0
+        self.samples = 0
+
+    def to_dict(self, elapsed: float) -> Dict:
+        """
+        Summarize the accumulated steps
+
+        Args:
+            elapsed: Wall-clock seconds the steps took
+        """
+        busy = sum(self.seconds.values())
+        return {
+            'steps': self.steps,
+            'samples': self.samples,
+            'elapsed_seconds': elapsed,
+            'samples_per_second': self.samples / elapsed if elapsed > 0 else 0.0,
+            'phase_seconds': dict(self.seconds),
+            'data_wait_fraction': self.seconds['data'] / busy if busy > 0 else 0.0
+        }
+
+
+class TrainingMonitor:
+    """
+    Times each training step by phase and writes JSON lines reports
+
+    The training loop calls mark() at the end of the data, forward and
+    backward phases and end_step() after the optimizer step; each phase is
+    charged the time since the previous mark. 'data' is the time spent
+    waiting on the loader plus the copy to the device. A report is written
+    every log_interval steps and at the end of every epoch.
+
+    Optionally a torch.profiler trace is recorded over a range of global
+    steps and saved as a Chrome trace next to the report.
+    """
+
+    def __init__(self, log_path: str, log_interval: int = 100,
+                 profile_steps: Tuple[int, int] = None, device: str = 'cpu',
+                 rank: int = 0, global_step: int = 0):
+        """
+        Args:
+            log_path: JSON lines report file
+            log_interval: Optimizer steps per interval report (0 disables them)
+            profile_steps: (start, stop) global steps to profile, stop exclusive
+            device: Training device; CUDA work is synchronized before each mark
+            rank: Process rank recorded with every report
+            global_step: Steps already taken; a resumed run appends to the
+                         existing report
+        """
+        self.log_path = log_path
+        self.log_interval = log_interval
+        self.profile_steps = profile_steps
+        self.synchronize = str(device).startswith('cuda')
+        self.rank = rank
+        self.global_step = global_step
+        self.epoch = 0
+        self.profiler = None
+        self.file = open(log_path, 'a' if global_step else 'w')
+        self._reset_epoch()
+
+    def _reset_epoch(self):
+        self.epoch_times = PhaseTimes()
+        self.interval_times = PhaseTimes()
+        self.epoch_start = self.interval_start = self.last_mark = time.perf_counter()
+
+    def write(self, event: str, **fields):
+        """Append one report line"""
+        record = {'event': event, 'rank': self.rank, 'time': time.time()}
+        record.update(fields)
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def start_epoch(self, epoch: int):
+        """Reset the epoch counters and start the step clock"""
+        self.epoch = epoch
+        self._reset_epoch()
+        self._maybe_start_profiler()
+
+    def mark(self, phase: str):
+        """Charge the time since the previous mark to a phase"""
+        if self.synchronize:
+            torch.cuda.synchronize()
+        now = time.perf_counter()
+        elapsed = now - self.last_mark
+        self.last_mark = now
+        self.epoch_times.seconds[phase] += elapsed
+        self.interval_times.seconds[phase] += elapsed
+
+    def end_step(self, num_samples: int):
+        """Close the optimizer phase of a step over num_samples samples"""
+        self.mark('optimizer')
+        for times in (self.epoch_times, self.interval_times):
+            times.steps += 1
+            times.samples += num_samples
+        self.global_step += 1
+
+        if self.profiler is not None:
+            self.profiler.step()
+            if self.global_step >= self.profile_steps[1]:
+                self._stop_profiler()
+        self._maybe_start_profiler()
+
+        if self.log_interval and self.interval_times.steps >= self.log_interval:
+            self.write('steps', epoch=self.epoch, step=self.global_step,
+                       peak_rss_mb=peak_rss_mb(),
+                       **self.interval_times.to_dict(self.last_mark - self.interval_start))
+            self.interval_times = PhaseTimes()
+            self.interval_start = time.perf_counter()
+            # Time spent writing is not charged to the next step
+            self.last_mark = self.interval_start
+
+    def end_epoch(self, **fields) -> Dict:
+        """
+        Write the epoch report
+
+        Args:
+            **fields: Extra values to record (losses, learning rate, ...)
+
+        Returns:
+            The report
+        """
+        report = dict(epoch=self.epoch, step=self.global_step, peak_rss_mb=peak_rss_mb(),
+                      **thread_info(),
+                      **self.epoch_times.to_dict(self.last_mark - self.epoch_start))
+        report.update(fields)
+        self.write('epoch', **report)
+        return report
+
+    def _maybe_start_profiler(self):
+        if self.profile_steps is None or self.profiler is not None:
+            return
+        start, stop = self.profile_steps
+        if start <= self.global_step < stop:
+            activities = [torch.profiler.ProfilerActivity.CPU]
+            if self.synchronize:
+                activities.append(torch.profiler.ProfilerActivity.CUDA)
+            self.profiler = torch.profiler.profile(activities=activities)
+            self.profiler.start()
+            self.profile_start = self.global_step
+
+    def _stop_profiler(self):
+        self.profiler.stop()
+        trace_path = os.path.splitext(self.log_path)[0] + '_trace.json'
+        self.profiler.export_chrome_trace(trace_path)
+        self.write('profile', start_step=self.profile_start, stop_step=self.global_step,
+                   trace_path=trace_path)
+        self.profiler = None
+        # The trace covers the range; don't start another
+        self.profile_steps = None
+
+    def close(self):
+        """Finish a profiling window cut short by the end of training"""
+        if self.profiler is not None:
+            self._stop_profiler()
+        self.file.close()
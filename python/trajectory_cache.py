@@ -0,0 +1,188 @@
+"""
+Content-addressed cache for generated trajectories
+"""
+import hashlib
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+from trajectory_generator import TrajectoryGenerator
+
+
+class TrajectoryCache:
+    """LRU cache in front of TrajectoryGenerator.generate with an optional on-disk tier"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, cache_dir: Optional[str] = None):
+        """
+        Initialize trajectory cache
+
+        Args:
+            max_bytes: Memory budget for cached trajectory arrays
+            cache_dir: Optional directory for persistent .npz entries
+        """
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()  # key -> (trajectory, size in bytes)
+        self._physics_signature = None
+        self.current_bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    @staticmethod
+    def physics_signature(generator: TrajectoryGenerator) -> tuple:
+        """Parameters of a generator that affect the generated trajectory"""
+        physics = generator.physics
+        return (generator.dt, generator.cruise_fast_path, generator.cruise_tolerance,
+                physics.max_speed, physics.max_acceleration, physics.max_vertical_speed,
+                physics.drag_coefficient, physics.slowdown_distance)
+
+    def make_key(self, generator: TrajectoryGenerator, initial_position: np.ndarray,
+                 initial_velocity: np.ndarray, waypoints: List, max_time: float) -> str:
+        """
+        Stable hash of everything that determines a generated trajectory
+
+        Args:
+            generator: Generator that would produce the trajectory
+            initial_position: Starting position [x, y, z]
+            initial_velocity: Starting velocity [vx, vy, vz]
+            waypoints: Waypoints in any format accepted by generate()
+            max_time: Maximum simulation time in seconds
+
+        Returns:
+            Hex digest identifying the trajectory
+        """
+        waypoint_positions, waypoint_speeds = generator._parse_waypoints(waypoints)
+
+        digest = hashlib.sha256()
+        # generate() starts from float32 initial conditions
+        digest.update(np.asarray(initial_position, dtype=np.float32).tobytes())
+        digest.update(np.asarray(initial_velocity, dtype=np.float32).tobytes())
+        digest.update(np.asarray(waypoint_positions, dtype=np.float64).reshape(-1, 3).tobytes())
+        digest.update(np.asarray(waypoint_speeds, dtype=np.float64).tobytes())
+        digest.update(repr((float(max_time), self.physics_signature(generator))).encode())
+        return digest.hexdigest()
+
+    def generate(self, generator: TrajectoryGenerator, initial_position: np.ndarray,
+                 initial_velocity: np.ndarray, waypoints: List,
+                 max_time: float = 60.0) -> Dict:
+        """
+        Cached equivalent of generator.generate()
+
+        Memory entries are dropped automatically when the generator's physics
+        parameters differ from those of the previous call.
+
+        Returns:
+            Trajectory dict with the same layout as generate(); arrays are
+            copies, so callers may modify them freely
+        """
+        signature = self.physics_signature(generator)
+        if self._physics_signature is not None and signature != self._physics_signature:
+            self.invalidate()
+        self._physics_signature = signature
+
+        key = self.make_key(generator, initial_position, initial_velocity, waypoints, max_time)
+        trajectory = self.get(key)
+        if trajectory is None:
+            self.misses += 1
+            trajectory = generator.generate(initial_position, initial_velocity, waypoints, max_time)
+            self.put(key, trajectory)
+        return self._copy(trajectory)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Look up a trajectory in memory, then on disk
+
+        Returns:
+            Cached trajectory (not copied) or None
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        path = self._disk_path(key)
+        if path is not None and os.path.exists(path):
+            try:
+                with np.load(path) as data:
+                    trajectory = {name: data[name] for name in data.files}
+                trajectory['dt'] = float(trajectory['dt'])
+            except Exception as e:
+                print(f"Error reading cached trajectory {path}: {e}")
+                return None
+            self.disk_hits += 1
+            self._store(key, trajectory)
+            return trajectory
+        return None
+
+    def put(self, key: str, trajectory: Dict):
+        """Store a trajectory in memory and, if configured, on disk"""
+        trajectory = self._copy(trajectory)
+        self._store(key, trajectory)
+
+        path = self._disk_path(key)
+        if path is not None and not os.path.exists(path):
+            # Write to a temp file first so readers never see partial entries
+            temp_path = path + '.tmp.npz'
+            np.savez(temp_path, **trajectory)
+            os.replace(temp_path, path)
+
+    def invalidate(self, include_disk: bool = False):
+        """
+        Drop cached trajectories
+
+        Args:
+            include_disk: Also delete the on-disk entries
+        """
+        self._entries.clear()
+        self.current_bytes = 0
+        self.invalidations += 1
+
+        if include_disk and self.cache_dir and os.path.exists(self.cache_dir):
+            for filename in os.listdir(self.cache_dir):
+                if filename.endswith('.npz'):
+                    os.remove(os.path.join(self.cache_dir, filename))
+
+    def stats(self) -> Dict:
+        """Hit/miss counters and memory usage"""
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            'entries': len(self._entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+            'invalidations': self.invalidations
+        }
+
+    def _store(self, key: str, trajectory: Dict):
+        """Insert into the memory tier and evict least recently used entries"""
+        size = sum(v.nbytes for v in trajectory.values() if isinstance(v, np.ndarray))
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self.current_bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (trajectory, size)
+        self.current_bytes += size
+
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+
+    def _disk_path(self, key: str) -> Optional[str]:
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    @staticmethod
+    def _copy(trajectory: Dict) -> Dict:
+        return {name: value.copy() if isinstance(value, np.ndarray) else value
+                for name, value in trajectory.items()}
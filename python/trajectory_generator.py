@@ -2,31 +2,239 @@
 Physics-based drone trajectory generator
 Generates realistic trajectories given initial conditions and waypoints
 """
+import math
 import numpy as np
-from typing import List, Dict, Tuple
-from utils import normalize_vector, distance_3d, limit_acceleration
+from collections import OrderedDict
+from typing import List, Dict, Tuple, Iterator, Optional
+from utils import normalize_vector, distance_3d, limit_acceleration, row_norms, hermite_interpolate
+
+
+class DroneState:
+    """
+    Compact drone state backed by one contiguous float array
+    
+    Layout: position (0:3), velocity (3:6), acceleration (6:9), time (9).
+    position, velocity and acceleration are views into the array, so
+    in-place updates never allocate. Key lookups like state['position']
+    are supported so code written for state dicts can consume it directly.
+    """
+    
+    __slots__ = ('data', 'position', 'velocity', 'acceleration')
+    
+    _KEYS = ('position', 'velocity', 'acceleration', 'time')
+    
+    def __init__(self, position: np.ndarray = None, velocity: np.ndarray = None,
+                 acceleration: np.ndarray = None, time: float = 0.0):
+        """
+        Args:
+            position: Position [x, y, z]
+            velocity: Velocity [vx, vy, vz]
+            acceleration: Acceleration [ax, ay, az]
+            time: Time in seconds
+        """
+        self.data = np.zeros(10)
+        self.position = self.data[0:3]
+        self.velocity = self.data[3:6]
+        self.acceleration = self.data[6:9]
+        if position is not None:
+            self.position[:] = position
+        if velocity is not None:
+            self.velocity[:] = velocity
+        if acceleration is not None:
+            self.acceleration[:] = acceleration
+        self.data[9] = time
+    
+    @property
+    def time(self) -> float:
+        return float(self.data[9])
+    
+    @time.setter
+    def time(self, value: float):
+        self.data[9] = value
+    
+    def __getitem__(self, key: str):
+        if key not in self._KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def __repr__(self) -> str:
+        return (f"DroneState(position={self.position}, velocity={self.velocity}, "
+                f"acceleration={self.acceleration}, time={self.time})")
+    
+    @classmethod
+    def from_array(cls, data: np.ndarray) -> 'DroneState':
+        """Create a state from a packed 10-element array (copied)"""
+        state = cls()
+        state.data[:] = data
+        return state
+    
+    def copy(self) -> 'DroneState':
+        """Return an independent copy of this state"""
+        state = DroneState()
+        state.data[:] = self.data
+        return state
+    
+    @classmethod
+    def from_dict(cls, state: Dict) -> 'DroneState':
+        """Create a state from a dict with 'position', 'velocity' and optional 'acceleration', 'time'"""
+        return cls(state['position'], state['velocity'],
+                   state.get('acceleration'), state.get('time', 0.0))
+    
+    def to_dict(self) -> Dict:
+        """Return the state as a dict of independent arrays"""
+        return {
+            'position': self.position.copy(),
+            'velocity': self.velocity.copy(),
+            'acceleration': self.acceleration.copy(),
+            'time': self.time
+        }
+
+
+class Trajectory:
+    """
+    Time-indexed trajectory with interpolated state lookup
+    
+    Wraps the arrays of a trajectory dict. Lookups by time use binary search
+    on 'times', so any time can be queried in O(log n) without callers
+    tracking integer steps.
+    """
+    
+    def __init__(self, trajectory: Dict):
+        """
+        Args:
+            trajectory: Trajectory dict from TrajectoryGenerator
+        """
+        self.positions = np.asarray(trajectory['positions'], dtype=np.float64)
+        self.velocities = np.asarray(trajectory['velocities'], dtype=np.float64)
+        self.accelerations = np.asarray(trajectory['accelerations'], dtype=np.float64)
+        self.times = np.asarray(trajectory['times'], dtype=np.float64)
+        self.waypoint_indices = np.asarray(trajectory['waypoint_indices'])
+        self.waypoints = trajectory.get('waypoints')
+        self.waypoint_speeds = trajectory.get('waypoint_speeds')
+        self.dt = trajectory.get('dt')
+    
+    def __len__(self) -> int:
+        return len(self.times)
+    
+    @property
+    def duration(self) -> float:
+        return float(self.times[-1] - self.times[0])
+    
+    def index_at(self, t: float) -> int:
+        """Index of the first sample at or after time t (clamped to the trajectory)"""
+        return int(min(np.searchsorted(self.times, t, side='left'), len(self.times) - 1))
+    
+    def state_at(self, t: float, method: str = 'hermite') -> DroneState:
+        """
+        Interpolated state at time t
+        
+        Args:
+            t: Time in seconds, clamped to the trajectory time range
+            method: 'hermite' (cubic position from velocity) or 'linear'
+            
+        Returns:
+            DroneState at time t
+        """
+        states = self.states_at(np.array([t], dtype=np.float64), method)
+        return DroneState(states['positions'][0], states['velocities'][0],
+                          states['accelerations'][0], states['times'][0])
+    
+    def states_at(self, query_times: np.ndarray, method: str = 'hermite') -> Dict:
+        """
+        Interpolated states at many times at once
+        
+        Args:
+            query_times: Times in seconds (M,), clamped to the trajectory time range
+            method: 'hermite' (cubic position from velocity) or 'linear'
+            
+        Returns:
+            Dict with 'positions', 'velocities', 'accelerations' (M, 3),
+            'times' and 'waypoint_indices' (M,)
+        """
+        query_times = np.clip(np.asarray(query_times, dtype=np.float64),
+                              self.times[0], self.times[-1])
+        
+        if method == 'hermite':
+            positions = hermite_interpolate(self.times, self.positions, self.velocities, query_times)
+        elif method == 'linear':
+            positions = self._interp_columns(query_times, self.positions)
+        else:
+            raise ValueError(f"Unknown interpolation method: {method}")
+        
+        # Each sample takes the waypoint index of the step that produced it
+        indices = np.minimum(np.searchsorted(self.times, query_times, side='left'),
+                             len(self.times) - 1)
+        
+        return {
+            'positions': positions,
+            'velocities': self._interp_columns(query_times, self.velocities),
+            'accelerations': self._interp_columns(query_times, self.accelerations),
+            'times': query_times,
+            'waypoint_indices': self.waypoint_indices[indices]
+        }
+    
+    def resample(self, dt: float, method: str = 'hermite') -> 'Trajectory':
+        """
+        Resample onto a uniform time grid starting at the first sample
+        
+        Args:
+            dt: New time step in seconds
+            method: 'hermite' or 'linear'
+            
+        Returns:
+            New Trajectory with samples every dt seconds
+        """
+        num_samples = int(self.duration / dt + 1e-9) + 1
+        trajectory = self.states_at(self.times[0] + np.arange(num_samples) * dt, method)
+        trajectory.update({
+            'waypoints': self.waypoints,
+            'waypoint_speeds': self.waypoint_speeds,
+            'dt': dt
+        })
+        return Trajectory(trajectory)
+    
+    def to_dict(self) -> Dict:
+        """Return the trajectory in the dict layout of TrajectoryGenerator.generate()"""
+        return {
+            'positions': self.positions,
+            'velocities': self.velocities,
+            'accelerations': self.accelerations,
+            'times': self.times,
+            'waypoint_indices': self.waypoint_indices,
+            'waypoints': self.waypoints,
+            'waypoint_speeds': self.waypoint_speeds,
+            'dt': self.dt
+        }
+    
+    def _interp_columns(self, query_times: np.ndarray, values: np.ndarray) -> np.ndarray:
+        return np.column_stack([np.interp(query_times, self.times, values[:, i])
+                                for i in range(values.shape[1])])
 
 
 class DronePhysics:
     """Physical model of drone dynamics"""
     
     def __init__(self, max_speed: float = 15.0, max_acceleration: float = 5.0,
-                 max_vertical_speed: float = 5.0):
+                 max_vertical_speed: float = 5.0, drag_coefficient: float = 0.1):
         """
         Args:
             max_speed: Maximum horizontal speed (m/s)
             max_acceleration: Maximum acceleration (m/s^2)
             max_vertical_speed: Maximum vertical speed (m/s)
+            drag_coefficient: Quadratic drag coefficient (1/m)
         """
         self.max_speed = max_speed
         self.max_acceleration = max_acceleration
         self.max_vertical_speed = max_vertical_speed
-        self.drag_coefficient = 0.1
+        self.drag_coefficient = drag_coefficient
+        self.slowdown_distance = 3.0  # Start slowing down 3m from target
         
     def update(self, state: Dict, target_waypoint: np.ndarray, target_speed: float, dt: float) -> Dict:
         """
         Update drone state for one timestep
         
+        Dict adapter around update_into(); the input state is not modified.
+        
         Args:
             state: Current state dict with 'position', 'velocity', 'acceleration'
             target_waypoint: Target position to move towards
@@ -36,12 +244,32 @@ class DronePhysics:
         Returns:
             Updated state dict
         """
-        position = state['position']
-        velocity = state['velocity']
+        new_state = DroneState.from_dict(state)
+        self.update_into(new_state, target_waypoint, target_speed, dt)
+        return new_state.to_dict()
+    
+    def update_into(self, state: DroneState, target_waypoint: np.ndarray,
+                    target_speed: float, dt: float) -> DroneState:
+        """
+        Update drone state for one timestep in place
+        
+        Args:
+            state: Current state, overwritten with the new state
+            target_waypoint: Target position to move towards
+            target_speed: Desired speed for this waypoint (m/s)
+            dt: Time step in seconds
+            
+        Returns:
+            The updated state (same object)
+        """
+        position = state.position
+        velocity = state.velocity
         
         # Calculate desired direction
+        # (math.sqrt of the dot product is what np.linalg.norm computes for a
+        # single vector, without its per-call overhead)
         to_target = target_waypoint - position
-        distance = np.linalg.norm(to_target)
+        distance = math.sqrt(to_target.dot(to_target))
         
         if distance < 0.1:  # Reached waypoint
             target_velocity = np.zeros(3)
@@ -50,7 +278,7 @@ class DronePhysics:
             
             # Use waypoint-specific speed, limited by max speed
             # Slow down near target for smooth approach
-            slowdown_distance = 3.0  # Start slowing down 3m from target
+            slowdown_distance = self.slowdown_distance
             if distance < slowdown_distance:
                 desired_speed = min(target_speed, distance / slowdown_distance * target_speed)
             else:
@@ -59,46 +287,160 @@ class DronePhysics:
             target_velocity = direction * desired_speed
             
             # Limit vertical speed
-            target_velocity[2] = np.clip(target_velocity[2], 
-                                         -self.max_vertical_speed, 
-                                         self.max_vertical_speed)
+            target_velocity[2] = min(max(target_velocity[2], -self.max_vertical_speed),
+                                     self.max_vertical_speed)
         
         # Apply acceleration limits
         velocity_change = target_velocity - velocity
         max_change = self.max_acceleration * dt
-        if np.linalg.norm(velocity_change) > max_change:
+        change_norm = math.sqrt(velocity_change.dot(velocity_change))
+        if change_norm > max_change:
             velocity_change = normalize_vector(velocity_change) * max_change
         
         new_velocity = velocity + velocity_change
         
         # Apply drag
-        drag = -self.drag_coefficient * new_velocity * np.linalg.norm(new_velocity)
+        drag = -self.drag_coefficient * new_velocity * math.sqrt(new_velocity.dot(new_velocity))
         new_velocity += drag * dt
         
         # Calculate acceleration
-        acceleration = (new_velocity - velocity) / dt
+        np.subtract(new_velocity, velocity, out=state.acceleration)
+        state.acceleration /= dt
+        
+        # Update position (two steps keep the same rounding as p + v*dt + 0.5*a*dt^2)
+        position += new_velocity * dt
+        position += 0.5 * state.acceleration * dt**2
+        
+        velocity[:] = new_velocity
+        state.data[9] += dt
+        return state
+    
+    def update_extrapolated(self, state: DroneState, target_waypoint: np.ndarray,
+                            target_speed: float, dt: float) -> Tuple[DroneState, float]:
+        """
+        Take one step with a local error estimate (step doubling)
+        
+        The step is computed once with dt and once as two dt/2 steps.
+        Richardson extrapolation of the two gives a second-order accurate
+        state, and their difference estimates the local error.
+        
+        Args:
+            state: Current state (not modified)
+            target_waypoint: Target position to move towards
+            target_speed: Desired speed for this waypoint (m/s)
+            dt: Time step in seconds
+            
+        Returns:
+            Tuple of (new state, estimated local error in meters)
+        """
+        full = self.update_into(state.copy(), target_waypoint, target_speed, dt)
+        half = self.update_into(state.copy(), target_waypoint, target_speed, dt / 2)
+        self.update_into(half, target_waypoint, target_speed, dt / 2)
+        
+        # Velocity error is weighted by dt so both terms are in meters
+        error = max(np.linalg.norm(full.position - half.position),
+                    np.linalg.norm(full.velocity - half.velocity) * dt)
+        
+        half.data[:9] = 2 * half.data[:9] - full.data[:9]
+        return half, error
+    
+    def update_batch(self, positions: np.ndarray, velocities: np.ndarray,
+                     targets: np.ndarray, target_speeds: np.ndarray,
+                     dt: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Update N drones for one timestep with (N, 3) array math
+        
+        Performs the same operations as update() in the same order, so each
+        row matches the single-drone result exactly.
+        
+        Args:
+            positions: Current positions (N, 3)
+            velocities: Current velocities (N, 3)
+            targets: Target waypoint of each drone (N, 3)
+            target_speeds: Desired speed of each drone (N,)
+            dt: Time step in seconds
+            
+        Returns:
+            Tuple of new positions, velocities and accelerations, each (N, 3)
+        """
+        # Calculate desired direction
+        to_target = targets - positions
+        distance = row_norms(to_target)
+        
+        # Drones within 0.1m of their target aim for zero velocity
+        target_velocity = np.zeros_like(to_target)
+        moving = distance >= 0.1
+        if moving.any():
+            dist = distance[moving]
+            speeds = target_speeds[moving]
+            direction = to_target[moving] / dist[:, None]
+            
+            desired_speed = np.where(
+                dist < self.slowdown_distance,
+                np.minimum(speeds, dist / self.slowdown_distance * speeds),
+                np.minimum(speeds, self.max_speed)
+            )
+            
+            moving_velocity = direction * desired_speed[:, None]
+            moving_velocity[:, 2] = np.clip(moving_velocity[:, 2],
+                                            -self.max_vertical_speed,
+                                            self.max_vertical_speed)
+            target_velocity[moving] = moving_velocity
+        
+        # Apply acceleration limits (normalize_vector leaves tiny vectors as-is)
+        velocity_change = target_velocity - velocities
+        max_change = self.max_acceleration * dt
+        change_norm = row_norms(velocity_change)
+        limited = change_norm > max_change
+        if limited.any():
+            scale = np.where(change_norm[limited] < 1e-6, 1.0, change_norm[limited])
+            velocity_change[limited] = velocity_change[limited] / scale[:, None] * max_change
+        
+        new_velocities = velocities + velocity_change
+        
+        # Apply drag
+        drag = -self.drag_coefficient * new_velocities * row_norms(new_velocities)[:, None]
+        new_velocities += drag * dt
+        
+        # Calculate acceleration
+        accelerations = (new_velocities - velocities) / dt
         
         # Update position
-        new_position = position + new_velocity * dt + 0.5 * acceleration * dt**2
+        new_positions = positions + new_velocities * dt + 0.5 * accelerations * dt**2
         
-        return {
-            'position': new_position,
-            'velocity': new_velocity,
-            'acceleration': acceleration,
-            'time': state['time'] + dt
-        }
+        return new_positions, new_velocities, accelerations
 
 
 class TrajectoryGenerator:
     """Generate complete drone trajectories"""
     
-    def __init__(self, dt: float = 0.1):
+    def __init__(self, dt: float = 0.1, cruise_fast_path: bool = False,
+                 cruise_tolerance: float = 1e-6, physics: DronePhysics = None):
         """
         Args:
             dt: Time step in seconds (default 100ms)
+            cruise_fast_path: Fill steady straight-line cruise segments in closed
+                              form instead of stepping them one by one
+            cruise_tolerance: Largest per-step velocity change (m/s) and heading
+                              misalignment for a segment to count as steady
+            physics: Drone physics model (default DronePhysics())
         """
         self.dt = dt
-        self.physics = DronePhysics()
+        self.physics = physics if physics is not None else DronePhysics()
+        self.cruise_fast_path = cruise_fast_path
+        self.cruise_tolerance = cruise_tolerance
+        
+        # Memoized route segments used by regenerate_from_current
+        self.segment_tolerance = 1e-3  # Entry state rounding (m, m/s)
+        # Splicing re-planned legs onto cached ones is approximate, so opt-in
+        # (e.g. 0.25 m and 0.2 m/s); 0 disables it
+        self.splice_position_tolerance = 0.0  # Largest state mismatch at a splice (m)
+        self.splice_velocity_tolerance = 0.0  # (m/s)
+        self.max_cached_segments = 256
+        self._segment_cache = OrderedDict()
+        self.segment_cache_hits = 0
+        self.segment_cache_splices = 0
+        self.segment_cache_misses = 0
         self.waypoints = []  # Current waypoints (position, speed tuples)
         self.current_waypoint_idx = 0  # Current waypoint being targeted
         
@@ -119,14 +461,229 @@ class TrajectoryGenerator:
         Returns:
             Dict with trajectory data including positions, velocities, accelerations, times
         """
-        state = {
-            'position': np.array(initial_position, dtype=np.float32),
-            'velocity': np.array(initial_velocity, dtype=np.float32),
-            'acceleration': np.zeros(3, dtype=np.float32),
-            'time': 0.0
+        waypoint_positions, waypoint_speeds = self._parse_waypoints(waypoints)
+        
+        # Preallocated storage for trajectory
+        max_steps = int(max_time / self.dt)
+        positions = np.empty((max_steps + 1, 3))
+        velocities = np.empty((max_steps + 1, 3))
+        accelerations = np.empty((max_steps + 1, 3))
+        times = np.empty(max_steps + 1)
+        waypoint_indices = np.empty(max_steps + 1, dtype=np.int64)
+        
+        num_recorded = 0
+        state = self._initial_state(initial_position, initial_velocity)
+        for data, current_wp_idx in self._integrate(state, waypoint_positions,
+                                                    waypoint_speeds, max_steps):
+            if data.ndim == 1:
+                positions[num_recorded] = data[0:3]
+                velocities[num_recorded] = data[3:6]
+                accelerations[num_recorded] = data[6:9]
+                times[num_recorded] = data[9]
+                waypoint_indices[num_recorded] = current_wp_idx
+                num_recorded += 1
+            else:
+                # Closed-form cruise block
+                end = num_recorded + len(data)
+                positions[num_recorded:end] = data[:, 0:3]
+                velocities[num_recorded:end] = data[:, 3:6]
+                accelerations[num_recorded:end] = data[:, 6:9]
+                times[num_recorded:end] = data[:, 9]
+                waypoint_indices[num_recorded:end] = current_wp_idx
+                num_recorded = end
+        
+        # Copy the used rows so the returned arrays don't keep the
+        # max_time-sized buffers alive
+        return {
+            'positions': positions[:num_recorded].copy(),
+            'velocities': velocities[:num_recorded].copy(),
+            'accelerations': accelerations[:num_recorded].copy(),
+            'times': times[:num_recorded].copy(),
+            'waypoint_indices': waypoint_indices[:num_recorded].copy(),
+            'waypoints': np.array(waypoint_positions),
+            'waypoint_speeds': np.array(waypoint_speeds),
+            'dt': self.dt
         }
+    
+    def iter_states(self, initial_position: np.ndarray, initial_velocity: np.ndarray,
+                    waypoints: List, max_time: float = 60.0,
+                    chunk_size: int = None) -> Iterator:
+        """
+        Lazily generate a trajectory, yielding states as they are integrated
+        
+        Integration only advances when the consumer asks for the next item,
+        so a slow consumer naturally throttles generation. Stop early by
+        breaking out of the loop or calling close() on the iterator.
+        
+        Args:
+            initial_position: Starting position [x, y, z]
+            initial_velocity: Starting velocity [vx, vy, vz]
+            waypoints: List of waypoints in any format accepted by generate()
+            max_time: Maximum simulation time in seconds
+            chunk_size: If None, yield one (DroneState, waypoint_index) tuple per
+                        step. Otherwise yield dicts with 'positions', 'velocities',
+                        'accelerations', 'times' and 'waypoint_indices' arrays of up
+                        to chunk_size steps each.
+            
+        Yields:
+            Per-step state tuples or chunk dicts (see chunk_size). The concatenated
+            output equals the corresponding arrays of generate().
+        """
+        waypoint_positions, waypoint_speeds = self._parse_waypoints(waypoints)
+        max_steps = int(max_time / self.dt)
+        state = self._initial_state(initial_position, initial_velocity)
+        states = self._integrate(state, waypoint_positions, waypoint_speeds, max_steps)
+        
+        if chunk_size is None:
+            for data, current_wp_idx in states:
+                for row in data.reshape(-1, 10):
+                    yield DroneState.from_array(row), current_wp_idx
+            return
+        
+        chunk = None
+        for data, current_wp_idx in states:
+            for row in data.reshape(-1, 10):
+                if chunk is None:
+                    chunk = np.empty((chunk_size, 10))
+                    chunk_wp_indices = np.empty(chunk_size, dtype=np.int64)
+                    num_in_chunk = 0
+                chunk[num_in_chunk] = row
+                chunk_wp_indices[num_in_chunk] = current_wp_idx
+                num_in_chunk += 1
+                if num_in_chunk == chunk_size:
+                    yield self._chunk_dict(chunk, chunk_wp_indices, num_in_chunk)
+                    chunk = None
+        
+        if chunk is not None:
+            yield self._chunk_dict(chunk, chunk_wp_indices, num_in_chunk)
+    
+    @staticmethod
+    def _chunk_dict(chunk: np.ndarray, waypoint_indices: np.ndarray, length: int) -> Dict:
+        """Split a block of packed DroneState rows into trajectory arrays"""
+        return {
+            'positions': chunk[:length, 0:3],
+            'velocities': chunk[:length, 3:6],
+            'accelerations': chunk[:length, 6:9],
+            'times': chunk[:length, 9],
+            'waypoint_indices': waypoint_indices[:length]
+        }
+    
+    @staticmethod
+    def _initial_state(initial_position: np.ndarray, initial_velocity: np.ndarray) -> DroneState:
+        """Initial state of a trajectory, taken at float32 precision"""
+        return DroneState(np.array(initial_position, dtype=np.float32),
+                          np.array(initial_velocity, dtype=np.float32))
+    
+    def _integrate(self, state: DroneState, waypoint_positions: List[np.ndarray],
+                   waypoint_speeds: List[float], max_steps: int,
+                   check_first_arrival: bool = True) -> Iterator[Tuple[np.ndarray, int]]:
+        """
+        Step a drone through its waypoints
+        
+        The given state is advanced in place and used as the working state.
+        Yields (data, current waypoint index) for the initial state and after
+        every physics step, where data is the packed 10-element DroneState
+        array. It is a view of a state that is overwritten by the next step, so
+        callers must copy what they keep. With the cruise fast path enabled,
+        data may instead be an (M, 10) block of M closed-form cruise steps.
+        
+        Arrival is checked once per step, before it. With check_first_arrival
+        False the first step skips the check: the state has just arrived at
+        the previous waypoint, and the whole route takes that step towards
+        the first waypoint without checking it (see _segment).
+        """
+        previous_velocity = np.empty(3)
+        
+        current_wp_idx = 0
+        yield state.data, current_wp_idx
+        
+        check_arrival = check_first_arrival
+        steps_left = max_steps
+        while steps_left > 0:
+            # Get current target waypoint
+            if current_wp_idx < len(waypoint_positions):
+                target = waypoint_positions[current_wp_idx]
+                target_speed = waypoint_speeds[current_wp_idx]
+                
+                # Check if reached current waypoint
+                if check_arrival and distance_3d(state.position, target) < 0.5:
+                    current_wp_idx += 1
+                    if current_wp_idx >= len(waypoint_positions):
+                        # Reached all waypoints
+                        break
+                    target = waypoint_positions[current_wp_idx]
+                    target_speed = waypoint_speeds[current_wp_idx]
+            else:
+                break
+            check_arrival = True
+            
+            # Update physics with target speed
+            if self.cruise_fast_path:
+                previous_velocity[:] = state.velocity
+            self.physics.update_into(state, target, target_speed, self.dt)
+            steps_left -= 1
+            yield state.data, current_wp_idx
+            
+            # Early termination if stationary at final waypoint
+            if (current_wp_idx >= len(waypoint_positions) - 1 and 
+                np.linalg.norm(state.velocity) < 0.1):
+                break
+            
+            if self.cruise_fast_path:
+                block = self._cruise_block(state, previous_velocity, target, steps_left)
+                if block is not None:
+                    state.data[:] = block[-1]
+                    steps_left -= len(block)
+                    yield block, current_wp_idx
+    
+    def _cruise_block(self, state: DroneState, previous_velocity: np.ndarray,
+                      target: np.ndarray, max_block: int) -> np.ndarray:
+        """
+        Closed-form states for a steady cruise segment, or None if not cruising
+        
+        Once the velocity stops changing and points straight at the target,
+        every following step repeats the same displacement until the drone
+        reaches the slowdown zone, so those steps can be written in one block.
+        """
+        velocity = state.velocity
+        if np.linalg.norm(velocity - previous_velocity) > self.cruise_tolerance:
+            return None
+        
+        to_target = target - state.position
+        distance = np.linalg.norm(to_target)
+        speed = np.linalg.norm(velocity)
+        if speed == 0 or distance == 0:
+            return None
+        if np.linalg.norm(velocity / speed - to_target / distance) > self.cruise_tolerance:
+            return None
+        
+        # Stop one step short of the slowdown zone
+        displacement = velocity * self.dt + 0.5 * state.acceleration * self.dt**2
+        num_steps = int((distance - self.physics.slowdown_distance) /
+                        np.linalg.norm(displacement)) - 1
+        num_steps = min(num_steps, max_block)
+        if num_steps < 2:
+            return None
+        
+        steps = np.arange(1, num_steps + 1)
+        block = np.empty((num_steps, 10))
+        block[:, 0:3] = state.position + steps[:, None] * displacement
+        block[:, 3:6] = velocity
+        block[:, 6:9] = state.acceleration
+        block[:, 9] = state.time + steps * self.dt
+        return block
+    
+    @staticmethod
+    def _parse_waypoints(waypoints: List) -> Tuple[List[np.ndarray], List[float]]:
+        """
+        Parse waypoints to extract positions and speeds
         
-        # Parse waypoints to extract positions and speeds
+        Args:
+            waypoints: List of waypoints in any format accepted by generate()
+            
+        Returns:
+            Tuple of (waypoint positions, waypoint speeds)
+        """
         waypoint_positions = []
         waypoint_speeds = []
         
@@ -144,66 +701,295 @@ class TrajectoryGenerator:
                 waypoint_positions.append(np.array(wp))
                 waypoint_speeds.append(10.0)  # Default speed
         
-        # Storage for trajectory
-        positions = [state['position'].copy()]
-        velocities = [state['velocity'].copy()]
-        accelerations = [state['acceleration'].copy()]
-        times = [state['time']]
-        current_waypoint_idx = [0]
+        return waypoint_positions, waypoint_speeds
+    
+    def generate_adaptive(self, initial_position: np.ndarray, initial_velocity: np.ndarray,
+                          waypoints: List, max_time: float = 60.0,
+                          tolerance: float = 0.01, max_dt: float = 2.0,
+                          min_dt: float = None) -> Dict:
+        """
+        Generate trajectory with adaptive step size and event-accurate waypoint arrival
+        
+        Step sizes come from step-doubling error control, so long straight legs
+        take large steps while waypoint approaches and hard accelerations are
+        refined automatically. Arrival is located at the moment the drone
+        enters the 0.5m waypoint radius instead of at the next step boundary.
+        The result is resampled onto the generator's dt grid.
+        
+        The adaptive integrator converges to the small-step limit of the physics
+        model, so results differ from generate() at the same dt by the
+        fixed-step discretization error.
+        
+        Args:
+            initial_position: Starting position [x, y, z]
+            initial_velocity: Starting velocity [vx, vy, vz]
+            waypoints: List of waypoints in any format accepted by generate()
+            max_time: Maximum simulation time in seconds
+            tolerance: Allowed local error per step in meters
+            max_dt: Largest step size in seconds
+            min_dt: Smallest step size in seconds (default dt / 16)
+            
+        Returns:
+            Dict with the same layout as generate(), plus 'integration_steps'
+            giving the number of adaptive steps taken
+        """
+        waypoint_positions, waypoint_speeds = self._parse_waypoints(waypoints)
+        if min_dt is None:
+            min_dt = self.dt / 16
+        
+        state = self._initial_state(initial_position, initial_velocity)
+        knots = [state.data.copy()]
+        knot_wp_indices = [0]
         
         current_wp_idx = 0
+        step_size = self.dt
+        integration_steps = 0
+        
+        while current_wp_idx < len(waypoint_positions) and state.time < max_time - 1e-9:
+            target = waypoint_positions[current_wp_idx]
+            target_speed = waypoint_speeds[current_wp_idx]
+            
+            distance = distance_3d(state.position, target)
+            if distance < 0.5:
+                current_wp_idx += 1
+                continue
+            
+            # Never step further than the remaining distance to the waypoint
+            step_size = min(step_size, max_time - state.time)
+            speed = np.linalg.norm(state.velocity)
+            if speed > 0:
+                step_size = min(step_size, max(min_dt, distance / speed))
+            
+            new_state, error = self.physics.update_extrapolated(
+                state, target, target_speed, step_size
+            )
+            if error > tolerance and step_size > min_dt:
+                # Reject and retry with a smaller step
+                step_size = max(min_dt, step_size * max(0.2, 0.9 * (tolerance / error) ** (1 / 3)))
+                continue
+            integration_steps += 1
+            
+            # Locate the arrival event inside the step and stop there
+            arrived = distance_3d(new_state.position, target) < 0.5
+            if arrived:
+                fraction = self._arrival_fraction(state, new_state, target, step_size)
+                if fraction < 1.0:
+                    new_state, _ = self.physics.update_extrapolated(
+                        state, target, target_speed, step_size * fraction
+                    )
+            
+            state = new_state
+            knots.append(state.data.copy())
+            knot_wp_indices.append(current_wp_idx)
+            
+            if arrived:
+                current_wp_idx += 1
+                if current_wp_idx >= len(waypoint_positions):
+                    # Reached all waypoints
+                    break
+            
+            # Early termination if stationary at final waypoint
+            if (current_wp_idx >= len(waypoint_positions) - 1 and 
+                np.linalg.norm(state.velocity) < 0.1):
+                break
+            
+            # Grow the step for the next attempt
+            if error == 0:
+                growth = 4.0
+            else:
+                growth = min(4.0, 0.9 * (tolerance / error) ** (1 / 3))
+            step_size = min(max_dt, step_size * growth)
+        
+        # Resample onto the requested dt grid
+        knots = np.array(knots)
+        integrated = Trajectory({
+            'positions': knots[:, 0:3],
+            'velocities': knots[:, 3:6],
+            'accelerations': knots[:, 6:9],
+            'times': knots[:, 9],
+            'waypoint_indices': np.array(knot_wp_indices),
+            'waypoints': np.array(waypoint_positions),
+            'waypoint_speeds': np.array(waypoint_speeds)
+        })
+        trajectory = integrated.resample(self.dt).to_dict()
+        trajectory['integration_steps'] = integration_steps
+        return trajectory
+    
+    @staticmethod
+    def _arrival_fraction(start: DroneState, end: DroneState, target: np.ndarray,
+                          step_size: float, radius: float = 0.5) -> float:
+        """
+        Fraction of a step at which the drone enters the waypoint radius
+        
+        Bisects the cubic Hermite path between the two states; start must be
+        outside the radius and end inside it.
+        """
+        times = np.array([0.0, step_size])
+        positions = np.array([start.position, end.position])
+        velocities = np.array([start.velocity, end.velocity])
+        
+        low, high = 0.0, 1.0
+        for _ in range(30):
+            mid = 0.5 * (low + high)
+            point = hermite_interpolate(times, positions, velocities, np.array([mid * step_size]))[0]
+            if distance_3d(point, target) < radius:
+                high = mid
+            else:
+                low = mid
+        return high
+    
+    def generate_batch(self, initial_positions: np.ndarray, initial_velocities: np.ndarray,
+                       waypoints: np.ndarray, speeds: np.ndarray = None,
+                       num_waypoints: np.ndarray = None,
+                       max_time: float = 60.0) -> Dict:
+        """
+        Generate N trajectories in lockstep
+        
+        All drones are advanced together with DronePhysics.update_batch, and
+        per-drone masks track waypoint arrival and termination. Each drone
+        follows exactly the same rules as generate(), so a batch of one
+        reproduces generate() for the same inputs.
+        
+        Args:
+            initial_positions: Starting positions (N, 3)
+            initial_velocities: Starting velocities (N, 3)
+            waypoints: Waypoint positions (N, K, 3), padded for drones
+                       with fewer than K waypoints
+            speeds: Waypoint speeds (N, K), default 10 m/s
+            num_waypoints: Number of valid waypoints per drone (N,),
+                           default K for every drone
+            max_time: Maximum simulation time in seconds
+            
+        Returns:
+            Dict with padded 'positions', 'velocities', 'accelerations' (N, T, 3),
+            'times' and 'waypoint_indices' (N, T), plus 'lengths' (N,) giving
+            the number of valid steps of each drone. Entries past a drone's
+            length are zero.
+        """
+        # Match generate(): initial state is taken at float32 precision
+        positions = np.asarray(initial_positions, dtype=np.float32).astype(np.float64)
+        velocities = np.asarray(initial_velocities, dtype=np.float32).astype(np.float64)
+        waypoints = np.asarray(waypoints, dtype=np.float64)
+        
+        num_drones, max_waypoints = waypoints.shape[:2]
+        if speeds is None:
+            speeds = np.full((num_drones, max_waypoints), 10.0)
+        speeds = np.asarray(speeds, dtype=np.float64)
+        if num_waypoints is None:
+            num_waypoints = np.full(num_drones, max_waypoints)
+        num_waypoints = np.asarray(num_waypoints, dtype=np.int64)
+        
         max_steps = int(max_time / self.dt)
+        out_positions = np.zeros((num_drones, max_steps + 1, 3))
+        out_velocities = np.zeros((num_drones, max_steps + 1, 3))
+        out_accelerations = np.zeros((num_drones, max_steps + 1, 3))
+        out_times = np.zeros((num_drones, max_steps + 1))
+        out_wp_indices = np.zeros((num_drones, max_steps + 1), dtype=np.int64)
+        out_positions[:, 0] = positions
+        out_velocities[:, 0] = velocities
+        
+        lengths = np.ones(num_drones, dtype=np.int64)
+        wp_idx = np.zeros(num_drones, dtype=np.int64)
+        active = num_waypoints > 0
+        time = 0.0
         
         for step in range(max_steps):
-            # Get current target waypoint
-            if current_wp_idx < len(waypoint_positions):
-                target = waypoint_positions[current_wp_idx]
-                target_speed = waypoint_speeds[current_wp_idx]
-                
-                # Check if reached current waypoint
-                if distance_3d(state['position'], target) < 0.5:
-                    current_wp_idx += 1
-                    if current_wp_idx >= len(waypoint_positions):
-                        # Reached all waypoints
-                        break
-                    target = waypoint_positions[current_wp_idx]
-                    target_speed = waypoint_speeds[current_wp_idx]
-            else:
+            drones = np.flatnonzero(active)
+            if drones.size == 0:
                 break
             
-            # Update physics with target speed
-            state = self.physics.update(state, target, target_speed, self.dt)
+            # Check which drones reached their current waypoint
+            targets = waypoints[drones, wp_idx[drones]]
+            arrived = row_norms(targets - positions[drones]) < 0.5
+            if arrived.any():
+                wp_idx[drones[arrived]] += 1
+                
+                # Drones that reached all waypoints stop without another step
+                finished = wp_idx[drones] >= num_waypoints[drones]
+                active[drones[finished]] = False
+                drones = drones[~finished]
+                if drones.size == 0:
+                    break
+                targets = waypoints[drones, wp_idx[drones]]
+            
+            target_speeds = speeds[drones, wp_idx[drones]]
+            new_pos, new_vel, new_acc = self.physics.update_batch(
+                positions[drones], velocities[drones], targets, target_speeds, self.dt
+            )
+            positions[drones] = new_pos
+            velocities[drones] = new_vel
+            time += self.dt
             
             # Store data
-            positions.append(state['position'].copy())
-            velocities.append(state['velocity'].copy())
-            accelerations.append(state['acceleration'].copy())
-            times.append(state['time'])
-            current_waypoint_idx.append(current_wp_idx)
+            out_positions[drones, step + 1] = new_pos
+            out_velocities[drones, step + 1] = new_vel
+            out_accelerations[drones, step + 1] = new_acc
+            out_times[drones, step + 1] = time
+            out_wp_indices[drones, step + 1] = wp_idx[drones]
+            lengths[drones] = step + 2
             
             # Early termination if stationary at final waypoint
-            if (current_wp_idx >= len(waypoint_positions) - 1 and 
-                np.linalg.norm(state['velocity']) < 0.1):
-                break
+            stationary = ((wp_idx[drones] >= num_waypoints[drones] - 1) &
+                          (row_norms(new_vel) < 0.1))
+            active[drones[stationary]] = False
         
+        max_length = lengths.max()
         return {
-            'positions': np.array(positions),
-            'velocities': np.array(velocities),
-            'accelerations': np.array(accelerations),
-            'times': np.array(times),
-            'waypoint_indices': np.array(current_waypoint_idx),
-            'waypoints': np.array(waypoint_positions),
-            'waypoint_speeds': np.array(waypoint_speeds),
+            'positions': out_positions[:, :max_length],
+            'velocities': out_velocities[:, :max_length],
+            'accelerations': out_accelerations[:, :max_length],
+            'times': out_times[:, :max_length],
+            'waypoint_indices': out_wp_indices[:, :max_length],
+            'lengths': lengths,
+            'waypoints': waypoints,
+            'waypoint_speeds': speeds,
+            'num_waypoints': num_waypoints,
             'dt': self.dt
         }
     
+    @staticmethod
+    def split_batch(batch: Dict) -> List[Dict]:
+        """
+        Split the output of generate_batch() into per-drone trajectory dicts
+        
+        Args:
+            batch: Dict returned by generate_batch()
+            
+        Returns:
+            List of trajectory dicts with the same layout as generate()
+        """
+        trajectories = []
+        for i, length in enumerate(batch['lengths']):
+            num_wp = batch['num_waypoints'][i]
+            trajectories.append({
+                'positions': batch['positions'][i, :length],
+                'velocities': batch['velocities'][i, :length],
+                'accelerations': batch['accelerations'][i, :length],
+                'times': batch['times'][i, :length],
+                'waypoint_indices': batch['waypoint_indices'][i, :length],
+                'waypoints': batch['waypoints'][i, :num_wp],
+                'waypoint_speeds': batch['waypoint_speeds'][i, :num_wp],
+                'dt': batch['dt']
+            })
+        return trajectories
+    
     def add_noise(self, trajectory: Dict, position_noise: float = 0.1,
-                  velocity_noise: float = 0.05) -> Dict:
-        """Add realistic noise to trajectory for training data augmentation"""
+                  velocity_noise: float = 0.05, rng: np.random.Generator = None) -> Dict:
+        """
+        Add realistic noise to trajectory for training data augmentation
+        
+        Args:
+            trajectory: Trajectory dict
+            position_noise: Position noise std (m)
+            velocity_noise: Velocity noise std (m/s)
+            rng: Random generator (default: global np.random state)
+        """
+        if rng is None:
+            rng = np.random
         noisy_traj = trajectory.copy()
         
-        pos_noise = np.random.normal(0, position_noise, trajectory['positions'].shape)
-        vel_noise = np.random.normal(0, velocity_noise, trajectory['velocities'].shape)
+        pos_noise = rng.normal(0, position_noise, trajectory['positions'].shape)
+        vel_noise = rng.normal(0, velocity_noise, trajectory['velocities'].shape)
         
         noisy_traj['positions'] = trajectory['positions'] + pos_noise
         noisy_traj['velocities'] = trajectory['velocities'] + vel_noise
@@ -240,9 +1026,230 @@ class TrajectoryGenerator:
         if not filtered_waypoints:
             filtered_waypoints = waypoints
         
-        # Generate trajectory from current state
-        return self.generate(current_position, current_velocity, 
-                           filtered_waypoints, max_time)
+        # Generate trajectory from current state, reusing unchanged segments
+        return self._generate_segmented(current_position, current_velocity,
+                                        filtered_waypoints, max_time)
+    
+    def clear_segment_cache(self):
+        """Drop all memoized route segments"""
+        self._segment_cache.clear()
+        self.segment_cache_hits = 0
+        self.segment_cache_splices = 0
+        self.segment_cache_misses = 0
+    
+    def _generate_segmented(self, initial_position: np.ndarray, initial_velocity: np.ndarray,
+                            waypoints: List, max_time: float = 60.0) -> Dict:
+        """
+        Generate a trajectory one waypoint leg at a time with memoized legs
+        
+        Legs are reused from the cache instead of re-integrated where
+        possible (see _segment). Legs up to an edited waypoint are exact
+        hits, and a re-plan from a state on a previously planned leg reuses
+        the rest of that leg; both give the same trajectory as generate().
+        Legs after an edit are re-integrated unless splicing is enabled
+        (splice_position_tolerance and splice_velocity_tolerance): then a
+        later leg converges onto its cached path and is spliced onto it, so
+        the legs after it are exact hits again. A spliced trajectory is an
+        approximation: the drone reaches later waypoints a step earlier or
+        later than a full integration would, which moves states by up to
+        about one step of motion (under 1 m and 1 m/s at 10 m/s).
+        """
+        waypoint_positions, waypoint_speeds = self._parse_waypoints(waypoints)
+        max_steps = int(max_time / self.dt)
+        
+        state = self._initial_state(initial_position, initial_velocity)
+        blocks = [state.data[None, :].copy()]
+        block_wp_indices = [np.zeros(1, dtype=np.int64)]
+        steps_left = max_steps
+        
+        for wp_idx in range(len(waypoint_positions)):
+            if steps_left == 0:
+                break
+            # Like generate(), a leg entered on arrival steps once before
+            # checking arrival at its own waypoint
+            block, continues = self._segment(state, waypoint_positions[wp_idx:],
+                                             waypoint_speeds[wp_idx:], steps_left,
+                                             check_first_arrival=wp_idx == 0)
+            if len(block) > 0:
+                blocks.append(block)
+                block_wp_indices.append(np.full(len(block), wp_idx, dtype=np.int64))
+                state.data[:] = block[-1]
+                steps_left -= len(block)
+            if not continues:
+                break
+        
+        states = np.concatenate(blocks)
+        return {
+            'positions': states[:, 0:3].copy(),
+            'velocities': states[:, 3:6].copy(),
+            'accelerations': states[:, 6:9].copy(),
+            'times': states[:, 9].copy(),
+            'waypoint_indices': np.concatenate(block_wp_indices),
+            'waypoints': np.array(waypoint_positions),
+            'waypoint_speeds': np.array(waypoint_speeds),
+            'dt': self.dt
+        }
+    
+    def _segment(self, entry: DroneState, waypoint_positions: List[np.ndarray],
+                 waypoint_speeds: List[float], max_steps: int,
+                 check_first_arrival: bool = True) -> Tuple[np.ndarray, bool]:
+        """
+        States of one leg, from an entry state until the first waypoint is reached
+        
+        Cached legs towards the same waypoint (same speed, physics and
+        settings) are reused in three ways:
+        
+        - Exact hit: the entry state matches a state of a cached leg within
+          segment_tolerance, either its entry (an unchanged leg) or a later
+          state (a re-plan from a position on a previously planned leg).
+          The rest of that leg is reused as is.
+        - Splice (when enabled): otherwise the leg is integrated, and once a
+          state comes within splice_position_tolerance and
+          splice_velocity_tolerance of a cached state, the rest of the
+          cached leg is appended with the position and velocity mismatch
+          blended out linearly over its steps (accelerations follow the
+          blended velocities). This happens after
+          an upstream edit: the drone enters the leg a little off the cached
+          path and settles onto it. The spliced states differ from a fully
+          integrated leg by about the tolerances, and the leg ends exactly
+          where the cached leg ends, so later legs are exact hits again.
+        - Miss: the leg is integrated and cached.
+        
+        Args:
+            entry: State at the start of the leg (not modified)
+            waypoint_positions: Remaining waypoints, the first being the leg target
+            waypoint_speeds: Speeds of the remaining waypoints
+            max_steps: Step budget left for the trajectory
+            check_first_arrival: Check arrival before the first step; False
+                                 for legs entered on arrival at the previous
+                                 waypoint (see _integrate)
+            
+        Returns:
+            Tuple of (states after the entry state (M, 10), whether the route
+            continues with the next waypoint after this leg)
+        """
+        physics = self.physics
+        leg_key = (
+            tuple(np.asarray(waypoint_positions[0], dtype=np.float64)),
+            float(waypoint_speeds[0]),
+            len(waypoint_positions) == 1,
+            self.dt, self.cruise_fast_path, self.cruise_tolerance,
+            physics.max_speed, physics.max_acceleration, physics.max_vertical_speed,
+            physics.drag_coefficient, physics.slowdown_distance
+        )
+        # Only a leg's entry depends on check_first_arrival; its later states
+        # were all checked and not arrived, so they match either kind of entry
+        key = (leg_key, check_first_arrival,
+               tuple(np.round(entry.data[0:6] / self.segment_tolerance).astype(np.int64)))
+        
+        candidates = [cache_key for cache_key in self._segment_cache if cache_key[0] == leg_key]
+        if key in self._segment_cache:
+            match = key, 0
+        else:
+            match = self._match_leg(candidates, entry.data, self.segment_tolerance,
+                                    self.segment_tolerance)
+        if match is not None:
+            self._segment_cache.move_to_end(match[0])
+            self.segment_cache_hits += 1
+            return self._reuse_leg(match[0], match[1], entry.data, max_steps, splice=False)
+        
+        splicing = (candidates and self.splice_position_tolerance > 0 and
+                    self.splice_velocity_tolerance > 0)
+        
+        # Integrate the leg with times relative to the entry state
+        state = entry.copy()
+        state.time = 0.0
+        rows = [state.data[None, :].copy()]
+        continues = False
+        spliced = None
+        states = self._integrate(state, waypoint_positions, waypoint_speeds, max_steps,
+                                 check_first_arrival)
+        next(states)  # Entry state
+        for data, current_wp_idx in states:
+            if current_wp_idx != 0:
+                # First step of the next leg; it is recomputed there
+                continues = True
+                break
+            rows.append(data.reshape(-1, 10).copy())
+            if splicing:
+                match = self._match_leg(candidates, rows[-1][-1], self.splice_position_tolerance,
+                                        self.splice_velocity_tolerance)
+                if match is not None:
+                    steps_left = max_steps - sum(len(block) for block in rows[1:])
+                    spliced = self._reuse_leg(match[0], match[1], rows[-1][-1], steps_left,
+                                              splice=True)
+                    break
+        states.close()
+        
+        # The cached path starts with the entry state, so later states can be matched
+        path = np.concatenate(rows)
+        
+        if spliced is not None:
+            self._segment_cache.move_to_end(match[0])
+            self.segment_cache_hits += 1
+            self.segment_cache_splices += 1
+            tail, continues = spliced
+            block = np.concatenate([path[1:], tail])
+            block[:, 9] += entry.time
+            return block, continues
+        self.segment_cache_misses += 1
+        
+        # Legs cut short by the step budget are not complete, so not cached
+        if continues or len(path) - 1 < max_steps:
+            self._segment_cache[key] = (path, continues)
+            if len(self._segment_cache) > self.max_cached_segments:
+                self._segment_cache.popitem(last=False)
+        
+        block = path[1:].copy()
+        block[:, 9] += entry.time
+        return block, continues
+    
+    def _match_leg(self, candidates: List[Tuple], data: np.ndarray, position_tolerance: float,
+                   velocity_tolerance: float) -> Optional[Tuple[Tuple, int]]:
+        """
+        Closest state to a packed state on the given cached legs
+        
+        Only states strictly inside a leg are matched: its entry depends on
+        how the leg was entered (see _segment), and its last state is the
+        arrival, which an entry that skips the arrival check steps past.
+        
+        Returns:
+            (cache key, row of the matched state in the leg's path), or None
+            if no state is within both tolerances
+        """
+        best = None
+        best_score = np.inf
+        for key in candidates:
+            inner = self._segment_cache[key][0][1:-1]
+            if len(inner) == 0:
+                continue
+            score = np.maximum(row_norms(inner[:, 0:3] - data[0:3]) / position_tolerance,
+                               row_norms(inner[:, 3:6] - data[3:6]) / velocity_tolerance)
+            row = int(np.argmin(score))
+            if score[row] <= 1.0 and score[row] < best_score:
+                best, best_score = (key, row + 1), score[row]
+        return best
+    
+    def _reuse_leg(self, key: Tuple, row: int, data: np.ndarray, max_steps: int,
+                   splice: bool) -> Tuple[np.ndarray, bool]:
+        """
+        States after path[row] of a cached leg, continuing from a packed state
+        
+        With splice, the position and velocity difference between the state
+        and path[row] is blended out so the last state equals the cached
+        leg's, and accelerations are recomputed from the blended velocities
+        as in DronePhysics.update_into.
+        """
+        path, continues = self._segment_cache[key]
+        block = path[row + 1:row + 1 + max_steps].copy()
+        block[:, 9] += data[9] - path[row, 9]
+        remaining = len(path) - 1 - row
+        if splice and len(block) > 0:
+            weights = 1.0 - np.arange(1, len(block) + 1) / remaining
+            block[:, 0:6] += weights[:, None] * (data[0:6] - path[row, 0:6])
+            velocities = np.concatenate([data[None, 3:6], block[:, 3:6]])
+            block[:, 6:9] = np.diff(velocities, axis=0) / self.dt
+        return block, continues and remaining <= max_steps
     
     def add_waypoint_at_index(self, waypoint: np.ndarray, index: int = -1):
         """
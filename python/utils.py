@@ -18,6 +18,46 @@ def distance_3d(p1: np.ndarray, p2: np.ndarray) -> float:
     return np.linalg.norm(p2 - p1)
 
 
+def row_norms(v: np.ndarray) -> np.ndarray:
+    """
+    Euclidean norm of each row of an (N, 3) array
+    
+    Uses a stacked matmul so every row is reduced with the same dot kernel
+    as np.linalg.norm on a single vector, giving bit-identical results.
+    """
+    return np.sqrt((v[:, None, :] @ v[:, :, None])[:, 0, 0])
+
+
+def hermite_interpolate(times: np.ndarray, positions: np.ndarray,
+                        velocities: np.ndarray, query_times: np.ndarray) -> np.ndarray:
+    """
+    Cubic Hermite interpolation of positions using velocities as tangents
+    
+    Args:
+        times: Sample times, strictly increasing (T,)
+        positions: Positions at sample times (T, 3)
+        velocities: Velocities at sample times (T, 3)
+        query_times: Times to evaluate (M,), clamped to the sampled range
+        
+    Returns:
+        Interpolated positions (M, 3)
+    """
+    query_times = np.clip(query_times, times[0], times[-1])
+    if len(times) < 2:
+        return np.repeat(positions[:1], len(query_times), axis=0)
+    
+    i = np.clip(np.searchsorted(times, query_times, side='right') - 1, 0, len(times) - 2)
+    h = (times[i + 1] - times[i])[:, None]
+    s = (query_times - times[i])[:, None] / h
+    s2 = s * s
+    s3 = s2 * s
+    
+    return ((2 * s3 - 3 * s2 + 1) * positions[i] +
+            (s3 - 2 * s2 + s) * h * velocities[i] +
+            (-2 * s3 + 3 * s2) * positions[i + 1] +
+            (s3 - s2) * h * velocities[i + 1])
+
+
 def interpolate_waypoints(waypoints: List[np.ndarray], num_points: int) -> np.ndarray:
     """Interpolate between waypoints to create smooth path"""
     if len(waypoints) < 2: